@@ -9,12 +9,27 @@ Date: 10/01/2024
 
 from flask import Flask
 from flask_cors import CORS
+from .commands import register_commands
 from .extensions import db
 from .routes.controller import controller
+from .service.dedup_service import DEDUP_ENABLED, ensure_dedup_index
+from .service.log_service import warm_up_log_queries
+from .models.log_record_model import LOG_PARTITIONED
+from .service.metrics_service import InstrumentedQueuePool
+from .service.migration_service import add_missing_log_columns
+from .service.partition_service import ensure_default_partition
+from .service.search_service import ensure_search_index
+from .service.version_service import ensure_data_version
 from flasgger import Swagger
 from os import environ
 
 
+WEB_WORKERS = int(environ.get("WEB_WORKERS", 1))
+DB_CONNECTION_BUDGET = int(environ.get("DB_CONNECTION_BUDGET", 20))
+DB_POOL_TIMEOUT = float(environ.get("DB_POOL_TIMEOUT", 30))
+DB_POOL_RECYCLE = int(environ.get("DB_POOL_RECYCLE", 1800))
+
+
 def create_app() -> Flask:
     """
     Creates and configures the Flask application.
@@ -30,6 +45,7 @@ def create_app() -> Flask:
         initiate_database(app)
         initiate_blueprints(app)
 
+    initiate_commands(app)
     swag = initiate_swagger(app)
     return app
 
@@ -38,6 +54,11 @@ def initiate_database(app: Flask):
     """
     Configures the database connection for the Flask application.
 
+    Every serving process has its own connection pool, so the DB_CONNECTION_BUDGET connections
+    the database can give to the application are split between the WEB_WORKERS processes.
+    Connections are checked before use and replaced after DB_POOL_RECYCLE seconds, so the
+    ones closed by the database or a proxy are not handed to a request.
+
     Parameters:
         app (Flask): The Flask application instance.
 
@@ -47,11 +68,70 @@ def initiate_database(app: Flask):
     app.config[
         "SQLALCHEMY_DATABASE_URI"
     ] = environ.get("DB_URL")
-    app.config["SQLALCHEMY_POOL_SIZE"] = 20
-    app.config["SQLALCHEMY_MAX_OVERFLOW"] = 0
+
+    if not is_in_memory_sqlite(app.config["SQLALCHEMY_DATABASE_URI"]):
+        app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
+            "poolclass": InstrumentedQueuePool,
+            "pool_size": worker_pool_size(),
+            "max_overflow": 0,
+            "pool_timeout": DB_POOL_TIMEOUT,
+            "pool_recycle": DB_POOL_RECYCLE,
+            "pool_pre_ping": True,
+        }
+
     db.init_app(app)
 
 
+def worker_pool_size() -> int:
+    """
+    Computes the size of the connection pool of one serving process.
+
+    Returns:
+        int: The share of DB_CONNECTION_BUDGET of each of the WEB_WORKERS processes, at least one.
+    """
+    return max(1, DB_CONNECTION_BUDGET // max(1, WEB_WORKERS))
+
+
+def warm_up(app: Flask):
+    """
+    Prepares a serving process before it accepts requests.
+
+    The connection pool is filled up to its size and the statements of the read endpoints
+    are compiled once, so the first requests do not pay for opening connections and
+    compiling queries.
+
+    Parameters:
+        app (Flask): The Flask application instance.
+
+    Returns:
+        None
+    """
+    engine_options = app.config.get("SQLALCHEMY_ENGINE_OPTIONS", {})
+
+    with app.app_context():
+        connections = [db.engine.connect() for _ in range(engine_options.get("pool_size", 1))]
+        for connection in connections:
+            connection.close()
+
+        warm_up_log_queries()
+
+
+def is_in_memory_sqlite(database_uri: str) -> bool:
+    """
+    Check if the database is an in-memory SQLite database, which can not use a connection queue.
+
+    Parameters:
+        database_uri (str): The database URI.
+
+    Returns:
+        bool: True for an in-memory SQLite database.
+    """
+    database_uri = database_uri or ""
+    return database_uri.startswith("sqlite") and (
+        database_uri.rstrip("/") in ("sqlite:", "sqlite:///:memory:") or "mode=memory" in database_uri
+    )
+
+
 def initiate_blueprints(app: Flask):
     """
     Registers the application's blueprints.
@@ -65,6 +145,19 @@ def initiate_blueprints(app: Flask):
     app.register_blueprint(controller)
 
 
+def initiate_commands(app: Flask):
+    """
+    Registers the application's maintenance CLI commands.
+
+    Parameters:
+        app (Flask): The Flask application instance.
+
+    Returns:
+        None
+    """
+    register_commands(app)
+
+
 def initiate_swagger(app: Flask):
     """
     Initializes and configures Swagger documentation for the Flask application.
@@ -82,6 +175,12 @@ def create_tables(app: Flask):
     """
     Creates database tables based on defined models.
 
+    Tables that already exist receive the columns and indexes they are missing. The values of
+    the new log record columns are filled by the backfill-logs command. The full-text index of
+    the log records is created as well, and the unique index used to skip duplicated records.
+    The data version of the log records is created, so their responses carry validators.
+    When the log records are partitioned, their default partition is created too.
+
     Parameters:
         app (Flask): The Flask application instance.
 
@@ -90,6 +189,21 @@ def create_tables(app: Flask):
     """
     with app.app_context():
         db.create_all()
+        add_missing_log_columns()
+
+        if LOG_PARTITIONED:
+            ensure_default_partition()
+
+        for table in db.metadata.tables.values():
+            for index in table.indexes:
+                index.create(bind=db.engine, checkfirst=True)
+
+        ensure_search_index()
+
+        if DEDUP_ENABLED:
+            ensure_dedup_index()
+
+        ensure_data_version()
 
 
 if __name__ == "__main__":
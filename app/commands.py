@@ -0,0 +1,139 @@
+"""
+Commands Module
+------------------------
+Responsible to define the maintenance commands available through the flask CLI.
+
+Author: Álef Ádonis dos Santos Carlos
+Date: 10/01/2024
+"""
+
+from flask import Flask
+from .service.dedup_service import ensure_dedup_index, remove_duplicate_log_records
+from .service.log_query import parse_date
+from .service.migration_service import backfill_log_records
+from .service.partition_service import (
+    LOG_PARTITIONED,
+    create_partitions_between,
+    drop_partitions_before,
+)
+from .service.rollup_service import rebuild_rollups
+from .service.sketch_service import rebuild_sketches
+from .service.watch_service import LogWatcher
+from datetime import datetime, time
+import click
+
+
+def register_commands(app: Flask):
+    """
+    Registers the maintenance commands in the application's CLI.
+
+    Parameters:
+        app (Flask): The Flask application instance.
+
+    Returns:
+        None
+    """
+
+    @app.cli.command("backfill-logs")
+    @click.option("--batch-size", type=int, default=None, help="Records updated per transaction.")
+    def backfill_logs_command(batch_size):
+        """Fill the timestamp and ip columns of records saved before they existed."""
+        updated = backfill_log_records(batch_size)
+        click.echo(f"{updated} log records backfilled")
+
+    @app.cli.command("rebuild-rollups")
+    @click.option("--batch-size", type=int, default=None, help="Records read at a time.")
+    def rebuild_rollups_command(batch_size):
+        """Recompute the rollup counters from the log records."""
+        counters = rebuild_rollups(batch_size)
+        click.echo(f"{counters} rollup counters rebuilt")
+
+    @app.cli.command("rebuild-sketches")
+    @click.option("--batch-size", type=int, default=None, help="Records read at a time.")
+    def rebuild_sketches_command(batch_size):
+        """Recompute the distinct count and top-k sketches from the log records."""
+        sketches = rebuild_sketches(batch_size)
+        click.echo(f"{sketches} sketches rebuilt")
+
+    @app.cli.command("dedup-logs")
+    def dedup_logs_command():
+        """Delete duplicated log records, create the unique index and rebuild the rollups and sketches."""
+        deleted = remove_duplicate_log_records()
+        click.echo(f"{deleted} duplicated log records deleted")
+
+        if ensure_dedup_index():
+            click.echo("Unique index created")
+
+        rebuild_rollups()
+        rebuild_sketches()
+
+    @app.cli.command("drop-log-partitions")
+    @click.option(
+        "--before",
+        required=True,
+        help="Date (dd-Mon-yyyy or yyyy-mm-dd) the records before are expired.",
+    )
+    def drop_log_partitions_command(before):
+        """Drop the log record partitions whose whole period is before a date."""
+        if not LOG_PARTITIONED:
+            raise click.ClickException("The log records are not partitioned, set LOG_PARTITIONING")
+
+        try:
+            cutoff = datetime.combine(parse_date(before), time.min)
+        except ValueError as error:
+            raise click.BadParameter(str(error), param_hint="--before")
+
+        for name in drop_partitions_before(cutoff):
+            click.echo(f"{name} dropped")
+
+    @app.cli.command("create-log-partitions")
+    @click.option(
+        "--from",
+        "from_",
+        required=True,
+        help="Date (dd-Mon-yyyy or yyyy-mm-dd) of the first period.",
+    )
+    @click.option(
+        "--to",
+        required=True,
+        help="Date (dd-Mon-yyyy or yyyy-mm-dd) of the last period.",
+    )
+    def create_log_partitions_command(from_, to):
+        """Create the log record partitions of the periods between two dates ahead of the ingestion."""
+        if not LOG_PARTITIONED:
+            raise click.ClickException("The log records are not partitioned, set LOG_PARTITIONING")
+
+        try:
+            start = datetime.combine(parse_date(from_), time.min)
+        except ValueError as error:
+            raise click.BadParameter(str(error), param_hint="--from")
+
+        try:
+            end = datetime.combine(parse_date(to), time.max)
+        except ValueError as error:
+            raise click.BadParameter(str(error), param_hint="--to")
+
+        for name in create_partitions_between(start, end):
+            click.echo(f"{name} created")
+
+    @app.cli.command("watch-logs")
+    @click.option("--interval", type=float, default=None, help="Seconds between two polls.")
+    @click.option("--commit-bytes", type=int, default=None, help="Appended bytes that start an extraction.")
+    @click.option("--commit-seconds", type=float, default=None, help="Maximum seconds a change waits.")
+    def watch_logs_command(interval, commit_bytes, commit_seconds):
+        """Ingest the lines appended to the log files continuously, until interrupted."""
+        watcher = LogWatcher(
+            interval=interval, commit_bytes=commit_bytes, commit_seconds=commit_seconds
+        )
+
+        def report(file_names, result):
+            click.echo(
+                f"{result['inserted']} log records saved from {len(file_names)} files "
+                f"in {result['seconds']}s"
+            )
+
+        click.echo(f"Watching {watcher.path}")
+        try:
+            watcher.run(on_flush=report)
+        except KeyboardInterrupt:
+            click.echo("Stopped, the next run resumes from the saved offsets")
@@ -8,6 +8,31 @@ Date: 10/01/2024
 """
 
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+import sqlite3
 
 
 db = SQLAlchemy()
+
+
+@event.listens_for(Engine, "connect")
+def disable_pysqlite_transaction_handling(dbapi_connection, connection_record):
+    """
+    Stop the sqlite3 driver from managing the transactions itself.
+
+    The driver only opens a transaction before a data modifying statement, so a savepoint
+    released at the start of a transaction would commit it. The transactions are opened by
+    begin_sqlite_transaction instead, and the database is switched to write-ahead logging so
+    the open read transactions do not block the writers.
+    """
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        dbapi_connection.isolation_level = None
+        dbapi_connection.execute("PRAGMA journal_mode=WAL")
+
+
+@event.listens_for(Engine, "begin")
+def begin_sqlite_transaction(connection):
+    """Open the SQLite transaction as soon as SQLAlchemy begins one."""
+    if connection.dialect.name == "sqlite":
+        connection.exec_driver_sql("BEGIN")
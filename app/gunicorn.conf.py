@@ -0,0 +1,53 @@
+"""
+Gunicorn Configuration Module
+------------------------
+Responsible to configure the production server of the application, started with
+`gunicorn --config gunicorn.conf.py app.wsgi:app` from this directory.
+
+The requests are served by WEB_WORKERS processes, one per core by default, each running
+WEB_THREADS threads. The worker count is passed to the application through the environment,
+so each process sizes its connection pool to its share of DB_CONNECTION_BUDGET.
+
+State kept in memory belongs to one process: the background jobs are only listed by the
+worker that started them, and the analytics columns are loaded by each worker. With more
+than one worker the response cache is disabled unless CACHE_BACKEND is set, since a change
+made through one worker would not invalidate the pages cached by the others.
+
+Author: Álef Ádonis dos Santos Carlos
+Date: 10/01/2024
+"""
+
+import multiprocessing
+import os
+
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 8080)}"
+workers = int(os.environ.get("WEB_WORKERS", multiprocessing.cpu_count()))
+threads = int(os.environ.get("WEB_THREADS", 4))
+worker_class = "gthread" if threads > 1 else "sync"
+timeout = int(os.environ.get("WEB_TIMEOUT", 120))
+graceful_timeout = int(os.environ.get("WEB_GRACEFUL_TIMEOUT", 30))
+keepalive = int(os.environ.get("WEB_KEEPALIVE", 5))
+max_requests = int(os.environ.get("WEB_MAX_REQUESTS", 0))
+max_requests_jitter = max_requests // 10
+pythonpath = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+accesslog = "-"
+
+os.environ["WEB_WORKERS"] = str(workers)
+
+if workers > 1 and not os.environ.get("CACHE_BACKEND"):
+    os.environ.setdefault("CACHE_ENABLED", "0")
+
+
+def on_starting(server):
+    """
+    Create the tables once in the master process, before the workers are started.
+    """
+    from app.app import create_app, create_tables
+    from app.extensions import db
+
+    app = create_app()
+    create_tables(app)
+
+    with app.app_context():
+        db.engine.dispose()
@@ -0,0 +1,51 @@
+"""
+Column Types Module
+------------------------
+Responsible to define the custom column types used by the ORM Objects
+
+Author: Álef Ádonis dos Santos Carlos
+Date: 10/01/2024
+"""
+from sqlalchemy.dialects.postgresql import INET
+from sqlalchemy.types import LargeBinary, TypeDecorator
+import ipaddress
+
+
+class IPAddress(TypeDecorator):
+    """
+    Stores an IP address as INET on PostgreSQL and as its packed bytes on the other dialects.
+
+    Values are bound and returned as strings, invalid addresses are stored as NULL.
+    """
+
+    impl = LargeBinary(16)
+    cache_ok = True
+
+    def load_dialect_impl(self, dialect):
+        if dialect.name == "postgresql":
+            return dialect.type_descriptor(INET())
+
+        return dialect.type_descriptor(LargeBinary(16))
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+
+        try:
+            address = ipaddress.ip_address(value)
+        except ValueError:
+            return None
+
+        if dialect.name == "postgresql":
+            return str(address)
+
+        return address.packed
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+
+        if dialect.name == "postgresql":
+            return str(value)
+
+        return str(ipaddress.ip_address(bytes(value)))
@@ -0,0 +1,63 @@
+"""
+Data Version Model Module
+------------------------
+Responsible to define the ORM Object holding the version of the data of a table
+
+Author: Álef Ádonis dos Santos Carlos
+Date: 10/01/2024
+"""
+from ..extensions import db
+from datetime import datetime
+
+
+class DataVersion(db.Model):
+    """
+    Represents the version of the data of a table stored in the 'data_versions' table.
+
+    Attributes:
+        - name (str): The name of the versioned table, e.g. log_records.
+        - version (int): Incremented by every transaction changing the data of the table.
+        - updated_at (datetime): The moment of the last change, in UTC.
+
+    Methods:
+        - __init__: Initializes a DataVersion object with the specified attributes.
+        - serialize: Serializes the object attributes into a dictionary.
+
+    """
+    __tablename__ = "data_versions"
+
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.BigInteger, nullable=False)
+    updated_at = db.Column(db.DateTime, nullable=False)
+
+    def __init__(self, name: str, version: int, updated_at: datetime) -> None:
+        """
+        Initializes a DataVersion object with the specified attributes.
+
+        Parameters:
+            - name (str): The name of the versioned table.
+            - version (int): The version of its data.
+            - updated_at (datetime): The moment of the last change, in UTC.
+
+        Returns:
+            None
+        """
+
+        self.name = name
+        self.version = version
+        self.updated_at = updated_at
+
+    def serialize(self) -> dict:
+        """
+        Serialize the object attributes values into a dictionary.
+
+        Returns:
+           dict: a dictionary containing the attributes values
+        """
+        data = {
+            "name": self.name,
+            "version": self.version,
+            "updated_at": self.updated_at.isoformat(),
+        }
+
+        return data
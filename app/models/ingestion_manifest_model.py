@@ -0,0 +1,87 @@
+"""
+Ingestion Manifest Model Module
+------------------------
+Responsible to define the ORM Object that keeps track of how much of each log file was already ingested
+
+Author: Álef Ádonis dos Santos Carlos
+Date: 10/01/2024
+"""
+from ..extensions import db
+
+
+class IngestionManifest(db.Model):
+    """
+    Represents the ingestion state of a log file stored in the 'ingestion_manifest' table.
+
+    Attributes:
+        - id (int): Primary key and unique identifier for the manifest entry.
+        - file_name (str): The name of the log file, the same value stored as origin_file in the log records.
+        - inode (int): The inode of the file when it was last read.
+        - size (int): The size in bytes of the file when it was last read.
+        - mtime_ns (int): The modification time in nanoseconds of the file when it was last read.
+        - fingerprint (str): A hash of the first bytes of the file, used to detect rotated files.
+        - offset (int): The byte offset already consumed from the file.
+
+    Methods:
+        - __init__: Initializes an IngestionManifest object with the specified attributes.
+        - serialize: Serializes the object attributes into a dictionary.
+
+    """
+    __tablename__ = "ingestion_manifest"
+
+    id = db.Column(db.Integer, primary_key=True, unique=True)
+    file_name = db.Column(db.String(255), nullable=False, unique=True)
+    inode = db.Column(db.BigInteger, nullable=False)
+    size = db.Column(db.BigInteger, nullable=False)
+    mtime_ns = db.Column(db.BigInteger, nullable=False)
+    fingerprint = db.Column(db.String(64), nullable=False)
+    offset = db.Column(db.BigInteger, nullable=False)
+
+    def __init__(
+        self,
+        file_name: str,
+        inode: int,
+        size: int,
+        mtime_ns: int,
+        fingerprint: str,
+        offset: int,
+    ) -> None:
+        """
+        Initializes an IngestionManifest object with the specified attributes.
+
+        Parameters:
+            - file_name (str): The name of the log file.
+            - inode (int): The inode of the file when it was last read.
+            - size (int): The size in bytes of the file when it was last read.
+            - mtime_ns (int): The modification time in nanoseconds of the file when it was last read.
+            - fingerprint (str): A hash of the first bytes of the file.
+            - offset (int): The byte offset already consumed from the file.
+
+        Returns:
+            None
+        """
+
+        self.file_name = file_name
+        self.inode = inode
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.fingerprint = fingerprint
+        self.offset = offset
+
+    def serialize(self) -> dict:
+        """
+        Serialize the object attributes values into a dictionary.
+
+        Returns:
+           dict: a dictionary containing the attributes values
+        """
+        data = {
+            "file_name": self.file_name,
+            "inode": self.inode,
+            "size": self.size,
+            "mtime_ns": self.mtime_ns,
+            "fingerprint": self.fingerprint,
+            "offset": self.offset,
+        }
+
+        return data
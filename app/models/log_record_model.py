@@ -7,6 +7,30 @@ Author: Álef Ádonis dos Santos Carlos
 Date: 10/01/2024
 """
 from ..extensions import db
+from .column_types import IPAddress
+from datetime import datetime
+import os
+
+
+LOG_PARTITIONING = os.environ.get("LOG_PARTITIONING", "").lower()
+LOG_PARTITIONED = LOG_PARTITIONING in ("month", "day") and os.environ.get(
+    "DB_URL", ""
+).startswith("postgresql")
+
+
+LOG_RECORD_COLUMNS = (
+    "ip_address",
+    "date",
+    "hour",
+    "software_name",
+    "version",
+    "log_id",
+    "title",
+    "description",
+    "origin_file",
+    "timestamp",
+    "ip",
+)
 
 
 class Log(db.Model):
@@ -24,6 +48,11 @@ class Log(db.Model):
         - title (str): A concise title or label describing the nature of the logged event.
         - description (str): A detailed description of the event, potentially containing additional information.
         - origin_file (str): The file from which the log record originated.
+        - timestamp (datetime): The moment the event occurred, parsed from date and hour.
+        - ip (str): The IP address stored in a compact indexable type, INET on PostgreSQL.
+
+    With LOG_PARTITIONING set to month or day on PostgreSQL, the table is partitioned by range
+    of timestamp, which becomes part of the primary key and can not be null.
 
     Methods:
         - __init__: Initializes a Log object with the specified attributes.
@@ -31,8 +60,23 @@ class Log(db.Model):
 
     """
     __tablename__ = "log_records"
+    __table_args__ = (
+        db.Index("ix_log_records_software_name_id", "software_name", "id"),
+        db.Index("ix_log_records_version_id", "version", "id"),
+        db.Index("ix_log_records_origin_file_id", "origin_file", "id"),
+        db.Index("ix_log_records_timestamp", "timestamp"),
+        db.Index("ix_log_records_software_name_timestamp", "software_name", "timestamp"),
+        db.Index("ix_log_records_ip_timestamp", "ip", "timestamp"),
+        db.Index(
+            "ix_log_records_ip_address_without_ip",
+            "ip_address",
+            postgresql_where=db.text("ip IS NULL"),
+            sqlite_where=db.text("ip IS NULL"),
+        ),
+        {"postgresql_partition_by": "RANGE (timestamp)"} if LOG_PARTITIONED else {},
+    )
 
-    id = db.Column(db.Integer, primary_key=True, unique=True)
+    id = db.Column(db.Integer, primary_key=True, unique=not LOG_PARTITIONED, autoincrement=True)
     ip_address = db.Column(db.String(40), nullable=False)
     date = db.Column(db.String(12), nullable=False)
     hour = db.Column(db.String(15), nullable=False)
@@ -42,6 +86,10 @@ class Log(db.Model):
     title = db.Column(db.String(120), nullable=False)
     description = db.Column(db.String(400), nullable=False)
     origin_file = db.Column(db.String(80), nullable=False)
+    timestamp = db.Column(
+        db.DateTime, primary_key=LOG_PARTITIONED, nullable=not LOG_PARTITIONED
+    )
+    ip = db.Column(IPAddress, nullable=True)
 
     def __init__(
         self,
@@ -54,6 +102,8 @@ class Log(db.Model):
         title: str,
         description: str,
         origin_file: str,
+        timestamp: datetime = None,
+        ip: str = None,
     ) -> None:
         """
         Initializes a Log object with the specified attributes.
@@ -67,6 +117,9 @@ class Log(db.Model):
             - log_id (str): A unique identifier for the log entry.
             - title (str): A concise title or label describing the nature of the logged event.
             - description (str): A detailed description of the event, potentially containing additional information.
+            - origin_file (str): The file from which the log record originated.
+            - timestamp (datetime): The moment the event occurred, parsed from date and hour.
+            - ip (str): The IP address associated with the event, stored in a compact type.
 
         Returns:
             None
@@ -81,6 +134,8 @@ class Log(db.Model):
         self.title = title
         self.description = description
         self.origin_file = origin_file
+        self.timestamp = timestamp
+        self.ip = ip
 
     def serialize(self) -> dict:
         """
@@ -0,0 +1,69 @@
+"""
+Log Rollup Model Module
+------------------------
+Responsible to define the ORM Object holding the pre-aggregated log record counters
+
+Author: Álef Ádonis dos Santos Carlos
+Date: 10/01/2024
+"""
+from ..extensions import db
+
+
+class LogRollup(db.Model):
+    """
+    Represents a log record counter stored in the 'log_rollups' table.
+
+    Attributes:
+        - dimension (str): The aggregation the counter belongs to (software_version, day, hour or ip).
+        - key (str): The value counted within the dimension, e.g. a day or an IP address.
+        - count (int): The number of log records with that value.
+
+    The (dimension, count descending, key) index lets the largest counters of a dimension be
+    read in order without sorting the whole dimension.
+
+    Methods:
+        - __init__: Initializes a LogRollup object with the specified attributes.
+        - serialize: Serializes the object attributes into a dictionary.
+
+    """
+    __tablename__ = "log_rollups"
+
+    dimension = db.Column(db.String(20), primary_key=True)
+    key = db.Column(db.String(200), primary_key=True)
+    count = db.Column(db.BigInteger, nullable=False)
+
+    __table_args__ = (
+        db.Index("ix_log_rollups_dimension_count", "dimension", db.desc("count"), "key"),
+    )
+
+    def __init__(self, dimension: str, key: str, count: int) -> None:
+        """
+        Initializes a LogRollup object with the specified attributes.
+
+        Parameters:
+            - dimension (str): The aggregation the counter belongs to.
+            - key (str): The value counted within the dimension.
+            - count (int): The number of log records with that value.
+
+        Returns:
+            None
+        """
+
+        self.dimension = dimension
+        self.key = key
+        self.count = count
+
+    def serialize(self) -> dict:
+        """
+        Serialize the object attributes values into a dictionary.
+
+        Returns:
+           dict: a dictionary containing the attributes values
+        """
+        data = {
+            "dimension": self.dimension,
+            "key": self.key,
+            "count": self.count,
+        }
+
+        return data
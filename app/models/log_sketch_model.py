@@ -0,0 +1,85 @@
+"""
+Log Sketch Model Module
+------------------------
+Responsible to define the ORM Object holding the approximate summaries of the log records of a
+software on a day
+
+Author: Álef Ádonis dos Santos Carlos
+Date: 10/01/2024
+"""
+from ..extensions import db
+
+
+class LogSketch(db.Model):
+    """
+    Represents the sketches of the log records of a software on a day, stored in the 'log_sketches' table.
+
+    Attributes:
+        - software_name (str): The software name of the records.
+        - day (str): The day of the records, as yyyy-mm-dd.
+        - rows (int): The number of records summarized.
+        - distinct_ips (bytes): The serialized HyperLogLog of their IP addresses.
+        - top_ips (bytes): The serialized Space-Saving summary of their IP addresses.
+        - top_log_ids (bytes): The serialized Space-Saving summary of their log IDs.
+
+    Methods:
+        - __init__: Initializes a LogSketch object with the specified attributes.
+        - serialize: Serializes the object attributes into a dictionary.
+
+    """
+    __tablename__ = "log_sketches"
+
+    software_name = db.Column(db.String(80), primary_key=True)
+    day = db.Column(db.String(10), primary_key=True)
+    rows = db.Column(db.BigInteger, nullable=False)
+    distinct_ips = db.Column(db.LargeBinary, nullable=False)
+    top_ips = db.Column(db.LargeBinary, nullable=False)
+    top_log_ids = db.Column(db.LargeBinary, nullable=False)
+
+    __table_args__ = (db.Index("ix_log_sketches_day", "day"),)
+
+    def __init__(
+        self,
+        software_name: str,
+        day: str,
+        rows: int,
+        distinct_ips: bytes,
+        top_ips: bytes,
+        top_log_ids: bytes,
+    ) -> None:
+        """
+        Initializes a LogSketch object with the specified attributes.
+
+        Parameters:
+            - software_name (str): The software name of the records.
+            - day (str): The day of the records, as yyyy-mm-dd.
+            - rows (int): The number of records summarized.
+            - distinct_ips (bytes): The serialized HyperLogLog of their IP addresses.
+            - top_ips (bytes): The serialized Space-Saving summary of their IP addresses.
+            - top_log_ids (bytes): The serialized Space-Saving summary of their log IDs.
+
+        Returns:
+            None
+        """
+
+        self.software_name = software_name
+        self.day = day
+        self.rows = rows
+        self.distinct_ips = distinct_ips
+        self.top_ips = top_ips
+        self.top_log_ids = top_log_ids
+
+    def serialize(self) -> dict:
+        """
+        Serialize the object attributes values into a dictionary, without the sketches.
+
+        Returns:
+           dict: a dictionary containing the attributes values
+        """
+        data = {
+            "software_name": self.software_name,
+            "day": self.day,
+            "rows": self.rows,
+        }
+
+        return data
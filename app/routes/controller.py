@@ -6,29 +6,175 @@ Responsible to handle the request, his attributes and error handling.
 Author: Álef Ádonis dos Santos Carlos
 Date: 10/01/2024
 """
-from flask import Blueprint, jsonify, make_response
+from flask import (
+    Blueprint,
+    Response,
+    current_app,
+    g,
+    jsonify,
+    make_response,
+    request,
+    stream_with_context,
+)
 from ..service.log_service import (
+    ExtractionInProgressError,
     extract_log_records_from_files,
+    extraction_lock,
     save_records_in_database,
     get_log_by_id,
+    get_logs_by_ids,
     get_all_logs_from_database,
+    stream_logs_from_database,
     delete_all_log_records_from_database,
+    delete_log_records_in_batches,
     delete_log_record_by_id,
+    save_uploaded_log_file,
+)
+from ..service.analytics_service import (
+    AnalyticsUnavailableError,
+    analytics_engine,
+    parse_analytics_filters,
+    parse_group_by,
+)
+from ..service.cache_service import response_cache
+from ..service.job_service import TooManyJobsError, deletion_jobs, extraction_jobs
+from ..service.log_query import parse_log_filters, parse_page_size
+from ..service.metrics_service import (
+    PROFILING_ENABLED,
+    http_request_seconds,
+    metrics,
+    start_profile,
+    stop_profile,
+)
+from ..service.rollup_service import get_rollup
+from ..service.search_service import search_logs
+from ..service.sketch_service import (
+    count_distinct_ips,
+    get_top_values,
+    parse_sketch_filters,
+    parse_top_limit,
 )
+from ..service.version_service import (
+    build_entity_tag,
+    data_version_number,
+    get_data_version,
+    last_modified_at,
+)
+import time
 
 
 controller = Blueprint("controller", __name__)
 
 
+@controller.before_request
+def start_request_timer():
+    """
+    Start timing the request, and profiling it when PROFILING_ENABLED is set and the request
+    carries an X-Profile: 1 header.
+    """
+    g.request_started_at = time.perf_counter()
+    g.profiler = None
+
+    if PROFILING_ENABLED and request.headers.get("X-Profile") == "1":
+        g.profiler = start_profile()
+
+
+@controller.after_request
+def record_request_time(response: Response) -> Response:
+    """
+    Record the duration of the request in the latency histogram of its route, dumping its
+    profile if it was profiled and slow enough.
+    """
+    seconds = time.perf_counter() - g.request_started_at
+
+    if g.profiler is not None:
+        profile_path = stop_profile(g.profiler, request.endpoint or "request", seconds)
+        if profile_path is not None:
+            response.headers["X-Profile-File"] = profile_path
+
+    http_request_seconds.observe(
+        seconds,
+        route=request.url_rule.rule if request.url_rule else "unmatched",
+        method=request.method,
+        status=response.status_code,
+    )
+    return response
+
+
+def check_not_modified(data_version) -> Response:
+    """
+    Answer a conditional request whose validators still match the log records data version.
+
+    If-None-Match takes precedence over If-Modified-Since, as required by RFC 9110.
+
+    Parameters:
+        data_version (DataVersion): The data version read before the query, None if unknown.
+
+    Returns:
+        Response or None: An empty 304 response, None if the response has to be computed.
+    """
+    if data_version is None:
+        return None
+
+    if request.if_none_match:
+        if not request.if_none_match.contains_weak(build_entity_tag(data_version)):
+            return None
+    else:
+        modified_at = last_modified_at(data_version)
+        if (
+            request.if_modified_since is None
+            or modified_at is None
+            or modified_at > request.if_modified_since
+        ):
+            return None
+
+    return add_validators(make_response("", 304), data_version)
+
+
+def add_validators(response: Response, data_version) -> Response:
+    """
+    Add the ETag and Last-Modified derived from the log records data version to a response.
+
+    Last-Modified is left out while the change is in the current second, as assigning None
+    to it would stamp the response with the current date.
+
+    Parameters:
+        response (Response): The response computed from the data of that version.
+        data_version (DataVersion): The data version read before the query, None if unknown.
+
+    Returns:
+        Response: The same response.
+    """
+    if data_version is None:
+        return response
+
+    response.set_etag(build_entity_tag(data_version))
+
+    modified_at = last_modified_at(data_version)
+    if modified_at is not None:
+        response.last_modified = modified_at
+
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+
 @controller.route("/logs/extract", methods=["POST"])
 def extract_log():
     """
     Extract and save log files
 
-    Extract the log files from their directory and save them in the database.
+    Extract the log files from their directory and save them in the database. With async set,
+    the extraction is queued as a background job and its status is read from the job endpoint,
+    it waits for any extraction already running.
     ---
     tags:
     - Log Record
+    parameters:
+      - name: async
+        in: query
+        description: true to queue the extraction as a background job and return right away
+        required: false
+        type: boolean
     responses:
       200:
         description: List of all log records retrieved successfully
@@ -58,6 +204,16 @@ def extract_log():
                     type: string
                   version:
                     type: string
+            rows:
+              type: integer
+            inserted:
+              type: integer
+            skipped:
+              type: integer
+            seconds:
+              type: number
+            rows_per_second:
+              type: number
         examples:
           application/json:
             data:
@@ -70,6 +226,23 @@ def extract_log():
                 software_name: "Konklab"
                 title: "Customer-focused responsive installation"
                 version: "4.42"
+            rows: 27000
+            inserted: 26990
+            skipped: 10
+            seconds: 0.4312
+            rows_per_second: 62615.96
+      202:
+        description: Extraction job queued
+        schema:
+          type: object
+          properties:
+            data:
+              type: object
+        examples:
+          application/json:
+            data:
+              id: "3f1c2a9e5b7d4c0e8a6f1b2c3d4e5f60"
+              status: "queued"
       404:
         description: No logs to extract
         schema:
@@ -80,6 +253,16 @@ def extract_log():
         examples:
           application/json:
             message: "There was no logs to extract"
+      409:
+        description: Another extraction is running
+        schema:
+          type: object
+          properties:
+            message:
+              type: string
+        examples:
+          application/json:
+            message: "An extraction of the log directory is already running"
       500:
         description: Error retrieving log records
         schema:
@@ -92,26 +275,291 @@ def extract_log():
             message: "It was not possible to retrieve log records from the database {error}"
     """
 
-    try:
-        log_extracted = extract_log_records_from_files()
+    if request.args.get("async", "").lower() in ("1", "true", "yes"):
+        try:
+            job = extraction_jobs.submit(current_app._get_current_object())
+        except TooManyJobsError as error:
+            return make_response(jsonify({"message": str(error)}), 429)
 
-        if not log_extracted:
-            return make_response(
-                jsonify({"message": "There was no logs to extract"}), 404
-            )
-    except Exception as error:
-        print(error)
-        return make_response(
-            jsonify(
-                {"message": "It was not possible to extract log records from file."}
-            ),
-            500,
-        )
+        response = make_response(jsonify({"data": job.serialize()}), 202)
+        response.headers["Location"] = f"/logs/extract/jobs/{job.id}"
+        return response
 
     try:
-        response = save_records_in_database()
-        return make_response(jsonify({"data": response}), 200)
+        with extraction_lock():
+            try:
+                extraction = extract_log_records_from_files()
+
+                if not extraction:
+                    return make_response(
+                        jsonify({"message": "There was no logs to extract"}), 404
+                    )
+            except Exception as error:
+                print(error)
+                return make_response(
+                    jsonify(
+                        {"message": "It was not possible to extract log records from file."}
+                    ),
+                    500,
+                )
+
+            try:
+                response = save_records_in_database(extraction)
+                return make_response(jsonify(response), 200)
+
+            except Exception:
+                return make_response(
+                    jsonify(
+                        {"message": "It was not possible to save log records in the database"}
+                    ),
+                    500,
+                )
+    except ExtractionInProgressError as error:
+        return make_response(jsonify({"message": str(error)}), 409)
+
+
+@controller.route("/logs/extract/jobs", methods=["GET"])
+def list_extraction_jobs():
+    """
+    List the extraction jobs
+
+    List the queued, running and recently finished extraction jobs, newest first.
+    ---
+    tags:
+      - Extraction Job
+    responses:
+      200:
+        description: Extraction jobs retrieved successfully
+        schema:
+          type: object
+          properties:
+            data:
+              type: array
+              items:
+                type: object
+    """
+    jobs = [job.serialize() for job in extraction_jobs.list()]
+    return make_response(jsonify({"data": jobs}), 200)
+
+
+@controller.route("/logs/extract/jobs/<job_id>", methods=["GET"])
+def get_extraction_job(job_id: str):
+    """
+    Retrieve an extraction job
+
+    Retrieve the status and the progress of an extraction job.
+    ---
+    tags:
+      - Extraction Job
+    parameters:
+      - name: job_id
+        in: path
+        description: ID of the extraction job
+        required: true
+        type: string
+    responses:
+      200:
+        description: Extraction job retrieved successfully
+        schema:
+          type: object
+          properties:
+            data:
+              type: object
+              properties:
+                id:
+                  type: string
+                status:
+                  type: string
+                files_done:
+                  type: integer
+                files_total:
+                  type: integer
+                rows:
+                  type: integer
+                rows_per_second:
+                  type: number
+                eta_seconds:
+                  type: number
+                errors:
+                  type: array
+                  items:
+                    type: string
+        examples:
+          application/json:
+            data:
+              id: "3f1c2a9e5b7d4c0e8a6f1b2c3d4e5f60"
+              status: "running"
+              files_done: 12
+              files_total: 27
+              bytes_done: 1572864
+              bytes_total: 3538944
+              rows: 12000
+              inserted: 12000
+              skipped: 0
+              rows_per_second: 6100.5
+              eta_seconds: 2.4
+              errors: []
+      404:
+        description: Extraction job not found
+        schema:
+          type: object
+          properties:
+            message:
+              type: string
+        examples:
+          application/json:
+            message: "Extraction job not found"
+    """
+    job = extraction_jobs.get(job_id)
+
+    if job is None:
+        return make_response(jsonify({"message": "Extraction job not found"}), 404)
+
+    return make_response(jsonify({"data": job.serialize()}), 200)
+
+
+@controller.route("/logs/extract/jobs/<job_id>", methods=["DELETE"])
+def cancel_extraction_job(job_id: str):
+    """
+    Cancel an extraction job
+
+    Cancel a queued extraction job, or stop a running one after the batch being written. The
+    batches not committed yet are rolled back.
+    ---
+    tags:
+      - Extraction Job
+    parameters:
+      - name: job_id
+        in: path
+        description: ID of the extraction job
+        required: true
+        type: string
+    responses:
+      202:
+        description: Cancellation requested
+        schema:
+          type: object
+          properties:
+            data:
+              type: object
+      404:
+        description: Extraction job not found
+        schema:
+          type: object
+          properties:
+            message:
+              type: string
+        examples:
+          application/json:
+            message: "Extraction job not found"
+      409:
+        description: Extraction job already finished
+        schema:
+          type: object
+          properties:
+            message:
+              type: string
+        examples:
+          application/json:
+            message: "Extraction job already finished"
+    """
+    cancelled = extraction_jobs.cancel(job_id)
+
+    if cancelled is None:
+        return make_response(jsonify({"message": "Extraction job not found"}), 404)
+
+    if not cancelled:
+        return make_response(jsonify({"message": "Extraction job already finished"}), 409)
+
+    return make_response(jsonify({"data": extraction_jobs.get(job_id).serialize()}), 202)
+
+
+@controller.route("/logs/upload", methods=["POST"])
+def upload_log_file():
+    """
+    Upload and save a log file
 
+    Save the log records of an AccessLogs file sent as the raw request body, plain or
+    compressed with gzip, bzip2 or xz. The body is parsed and saved as it arrives, in constant
+    memory, and the records already saved are skipped.
+    ---
+    tags:
+    - Log Record
+    consumes:
+      - application/octet-stream
+    parameters:
+      - name: name
+        in: query
+        description: Name of the file, saved as the origin_file of its records
+        required: true
+        type: string
+      - name: body
+        in: body
+        description: Content of the log file, optionally compressed
+        required: true
+        schema:
+          type: string
+          format: binary
+    responses:
+      200:
+        description: Log records of the file saved successfully
+        schema:
+          type: object
+          properties:
+            data:
+              type: array
+              items:
+                type: object
+            file:
+              type: string
+            bytes:
+              type: integer
+            rows:
+              type: integer
+            inserted:
+              type: integer
+            skipped:
+              type: integer
+            seconds:
+              type: number
+            rows_per_second:
+              type: number
+        examples:
+          application/json:
+            data: []
+            file: "AccessLogs (17).log.gz"
+            bytes: 13120000
+            rows: 100000
+            inserted: 100000
+            skipped: 0
+            seconds: 1.9872
+            rows_per_second: 50322.06
+      400:
+        description: Invalid file name, malformed log file or corrupted compression
+        schema:
+          type: object
+          properties:
+            message:
+              type: string
+        examples:
+          application/json:
+            message: "The gzip stream ended before its last member was complete"
+      500:
+        description: Error saving the log records
+        schema:
+          type: object
+          properties:
+            message:
+              type: string
+        examples:
+          application/json:
+            message: "It was not possible to save log records in the database"
+    """
+    try:
+        response = save_uploaded_log_file(request.stream, request.args.get("name"))
+        return make_response(jsonify(response), 200)
+    except ValueError as error:
+        return make_response(jsonify({"message": str(error)}), 400)
     except Exception:
         return make_response(
             jsonify(
@@ -175,6 +623,8 @@ def get_log(id: str):
               software_name: "Konklab"
               title: "Customer-focused responsive installation"
               version: "4.42"
+      304:
+        description: The log records did not change since the ETag or date given in If-None-Match or If-Modified-Since
       404:
         description: No logs found
         schema:
@@ -198,12 +648,19 @@ def get_log(id: str):
 
     """
     try:
-        log_record = get_log_by_id(id)
+        data_version = get_data_version()
+        not_modified = check_not_modified(data_version)
+        if not_modified is not None:
+            return not_modified
+
+        log_record = get_log_by_id(id, data_version_number(data_version))
 
         if log_record is None:
-            return make_response(jsonify({"message": "Log record not found"}), 404)
+            return add_validators(
+                make_response(jsonify({"message": "Log record not found"}), 404), data_version
+            )
 
-        return make_response(jsonify({"data": log_record}), 200)
+        return add_validators(make_response(jsonify({"data": log_record}), 200), data_version)
     except Exception as error:
         return make_response(
             jsonify(
@@ -215,18 +672,32 @@ def get_log(id: str):
         )
 
 
-@controller.route("/logs", methods=["GET"])
-def get_all_logs():
+@controller.route("/logs/batch", methods=["POST"])
+def get_logs_batch():
     """
-    Retrieve all log records
+    Retrieve many log records by ID
 
-    Retrieve all log records from the database.
+    Retrieve up to 1000 log records in a single request, in the order of the given IDs. The
+    IDs not found are returned as null and listed in not_found.
     ---
     tags:
       - Log Record
+    parameters:
+      - name: body
+        in: body
+        required: true
+        schema:
+          type: object
+          properties:
+            ids:
+              type: array
+              items:
+                type: integer
+        example:
+          ids: [78331, 5, 999999999]
     responses:
       200:
-        description: List of all log records retrieved successfully
+        description: Log records retrieved successfully
         schema:
           type: object
           properties:
@@ -234,25 +705,10 @@ def get_all_logs():
               type: array
               items:
                 type: object
-                properties:
-                  date:
-                    type: string
-                  description:
-                    type: string
-                  hour:
-                    type: string
-                  id:
-                    type: string
-                  ip_address:
-                    type: string
-                  log_id:
-                    type: string
-                  software_name:
-                    type: string
-                  title:
-                    type: string
-                  version:
-                    type: string
+            not_found:
+              type: array
+              items:
+                type: string
         examples:
           application/json:
             data:
@@ -265,7 +721,18 @@ def get_all_logs():
                 software_name: "Konklab"
                 title: "Customer-focused responsive installation"
                 version: "4.42"
-
+              - null
+            not_found: ["999999999"]
+      400:
+        description: Invalid IDs
+        schema:
+          type: object
+          properties:
+            message:
+              type: string
+        examples:
+          application/json:
+            message: "At most 1000 ids can be retrieved at once"
       500:
         description: Error retrieving log records
         schema:
@@ -277,56 +744,939 @@ def get_all_logs():
           application/json:
             message: "It was not possible to retrieve log records from the database {error}"
     """
-
     try:
-        logs = get_all_logs_from_database()
-        return make_response(jsonify({"data": logs}), 200)
+        body = request.get_json(silent=True)
+        ids = body.get("ids") if isinstance(body, dict) else None
+        return make_response(jsonify(get_logs_by_ids(ids)), 200)
+    except ValueError as error:
+        return make_response(jsonify({"message": str(error)}), 400)
     except Exception as error:
         return make_response(
             jsonify(
                 {
-                    "message": f"It was not possible to retrieve log record from the database {error}"
+                    "message": f"It was not possible to retrieve log records from the database {error}"
                 }
             ),
             500,
         )
 
 
-@controller.route("/logs", methods=["DELETE"])
-def delete_all_logs():
+@controller.route("/logs", methods=["GET"])
+def get_all_logs():
     """
-    Delete all log records
+    Retrieve a page of log records
 
-    Delete all log records from the database.
+    Retrieve a page of log records from the database, ordered by ID and optionally filtered.
+    The next page is requested with the cursor returned by the previous one.
     ---
     tags:
       - Log Record
+    parameters:
+      - name: limit
+        in: query
+        description: Maximum number of log records in the page (1 to 1000, default 100)
+        required: false
+        type: integer
+      - name: cursor
+        in: query
+        description: Opaque cursor returned as next_cursor by the previous page
+        required: false
+        type: string
+      - name: ip_address
+        in: query
+        required: false
+        type: string
+      - name: software_name
+        in: query
+        required: false
+        type: string
+      - name: version
+        in: query
+        required: false
+        type: string
+      - name: origin_file
+        in: query
+        required: false
+        type: string
+      - name: date_from
+        in: query
+        description: First date of the range (dd-Mon-yyyy or yyyy-mm-dd)
+        required: false
+        type: string
+      - name: date_to
+        in: query
+        description: Last date of the range (dd-Mon-yyyy or yyyy-mm-dd)
+        required: false
+        type: string
     responses:
       200:
-        description: Number of rows deleted from database
+        description: Page of log records retrieved successfully
         schema:
           type: object
           properties:
             data:
-              type: string
-        examples:
-          application/json:
-            message: 101010
-      500:
-        description: Error deleting log records
-        schema:
-          type: object
-          properties:
-            message:
-              type: string
-        examples:
+              type: array
+              items:
+                type: object
+                properties:
+                  date:
+                    type: string
+                  description:
+                    type: string
+                  hour:
+                    type: string
+                  id:
+                    type: string
+                  ip_address:
+                    type: string
+                  log_id:
+                    type: string
+                  software_name:
+                    type: string
+                  title:
+                    type: string
+                  version:
+                    type: string
+            next_cursor:
+              type: string
+        examples:
+          application/json:
+            data:
+              - date: "01-Apr-2022"
+                description: "eget tempus vel pede morbi porttitor lorem id ligula suspendisse ornare consequat lectus in est risus auctor"
+                hour: "2:50:07.000"
+                id: "78331"
+                ip_address: "224.191.78.71"
+                log_id: "871783207-1"
+                software_name: "Konklab"
+                title: "Customer-focused responsive installation"
+                version: "4.42"
+            next_cursor: "eyJpZCI6IDc4MzMxfQ=="
+      304:
+        description: The log records did not change since the ETag or date given in If-None-Match or If-Modified-Since
+      400:
+        description: Invalid pagination or filter parameters
+        schema:
+          type: object
+          properties:
+            message:
+              type: string
+        examples:
+          application/json:
+            message: "Invalid cursor"
+      500:
+        description: Error retrieving log records
+        schema:
+          type: object
+          properties:
+            message:
+              type: string
+        examples:
+          application/json:
+            message: "It was not possible to retrieve log records from the database {error}"
+    """
+
+    try:
+        filters = parse_log_filters(request.args)
+        limit = parse_page_size(request.args.get("limit"))
+
+        data_version = get_data_version()
+        not_modified = check_not_modified(data_version)
+        if not_modified is not None:
+            return not_modified
+
+        page = get_all_logs_from_database(
+            filters=filters,
+            limit=limit,
+            cursor=request.args.get("cursor"),
+            version=data_version_number(data_version),
+        )
+        return add_validators(make_response(jsonify(page), 200), data_version)
+    except ValueError as error:
+        return make_response(jsonify({"message": str(error)}), 400)
+    except Exception as error:
+        return make_response(
+            jsonify(
+                {
+                    "message": f"It was not possible to retrieve log record from the database {error}"
+                }
+            ),
+            500,
+        )
+
+
+@controller.route("/logs/search", methods=["GET"])
+def search_log_records():
+    """
+    Search log records
+
+    Search the log records whose title or description contain the given keywords, best
+    matches first, with the matched words highlighted.
+    ---
+    tags:
+      - Log Record
+    parameters:
+      - name: q
+        in: query
+        description: Keywords to search
+        required: true
+        type: string
+      - name: limit
+        in: query
+        description: Maximum number of log records in the page (1 to 1000, default 100)
+        required: false
+        type: integer
+      - name: page
+        in: query
+        description: Number of the page, starting at 1
+        required: false
+        type: integer
+    responses:
+      200:
+        description: Page of matching log records retrieved successfully
+        schema:
+          type: object
+          properties:
+            data:
+              type: array
+              items:
+                type: object
+                properties:
+                  id:
+                    type: string
+                  title:
+                    type: string
+                  description:
+                    type: string
+                  rank:
+                    type: number
+                  highlights:
+                    type: object
+                    properties:
+                      title:
+                        type: string
+                      description:
+                        type: string
+            next_page:
+              type: integer
+        examples:
+          application/json:
+            data:
+              - date: "01-Apr-2022"
+                description: "eget tempus vel pede morbi porttitor lorem id ligula suspendisse ornare consequat lectus in est risus auctor"
+                hour: "2:50:07.000"
+                id: "78331"
+                ip_address: "224.191.78.71"
+                log_id: "871783207-1"
+                software_name: "Konklab"
+                title: "Customer-focused responsive installation"
+                version: "4.42"
+                rank: 0.0607
+                highlights:
+                  title: "Customer-focused responsive <mark>installation</mark>"
+                  description: "eget tempus vel pede morbi porttitor lorem id ligula suspendisse ornare consequat lectus in est risus auctor"
+            next_page: 2
+      400:
+        description: Invalid search parameters
+        schema:
+          type: object
+          properties:
+            message:
+              type: string
+        examples:
+          application/json:
+            message: "The search text must not be empty"
+      500:
+        description: Error searching log records
+        schema:
+          type: object
+          properties:
+            message:
+              type: string
+        examples:
+          application/json:
+            message: "It was not possible to search log records in the database {error}"
+    """
+
+    try:
+        page = request.args.get("page", "1")
+        if not page.isdigit():
+            raise ValueError(f"Invalid page '{page}'")
+
+        results = search_logs(
+            request.args.get("q", ""),
+            limit=parse_page_size(request.args.get("limit")),
+            page=int(page),
+        )
+        return make_response(jsonify(results), 200)
+    except ValueError as error:
+        return make_response(jsonify({"message": str(error)}), 400)
+    except Exception as error:
+        return make_response(
+            jsonify(
+                {
+                    "message": f"It was not possible to search log records in the database {error}"
+                }
+            ),
+            500,
+        )
+
+
+@controller.route("/logs/stats/<dimension>", methods=["GET"])
+def get_log_stats(dimension: str):
+    """
+    Retrieve log record counters
+
+    Retrieve the number of log records per software_name and version, per day, per hour or per
+    IP address, read from the pre-aggregated rollup counters.
+    ---
+    tags:
+      - Log Statistics
+    parameters:
+      - name: dimension
+        in: path
+        description: software_version, day, hour or ip
+        required: true
+        type: string
+      - name: limit
+        in: query
+        description: Maximum number of counters returned (1 to 1000, default 100)
+        required: false
+        type: integer
+      - name: order
+        in: query
+        description: count for the largest counters first, key for ascending keys
+        required: false
+        type: string
+    responses:
+      200:
+        description: Counters retrieved successfully
+        schema:
+          type: object
+          properties:
+            data:
+              type: array
+              items:
+                type: object
+        examples:
+          application/json:
+            data:
+              - software_name: "Konklab"
+                version: "4.42"
+                count: 12
+      400:
+        description: Invalid dimension or parameters
+        schema:
+          type: object
+          properties:
+            message:
+              type: string
+        examples:
+          application/json:
+            message: "Invalid dimension 'month', expected one of software_version, day, hour, ip"
+      500:
+        description: Error retrieving the counters
+        schema:
+          type: object
+          properties:
+            message:
+              type: string
+        examples:
+          application/json:
+            message: "It was not possible to retrieve log statistics from the database {error}"
+    """
+
+    try:
+        counters = get_rollup(
+            dimension,
+            limit=parse_page_size(request.args.get("limit")),
+            order=request.args.get("order"),
+        )
+        return make_response(jsonify({"data": counters}), 200)
+    except ValueError as error:
+        return make_response(jsonify({"message": str(error)}), 400)
+    except Exception as error:
+        return make_response(
+            jsonify(
+                {
+                    "message": f"It was not possible to retrieve log statistics from the database {error}"
+                }
+            ),
+            500,
+        )
+
+
+@controller.route("/logs/sketches/distinct-ips", methods=["GET"])
+def get_distinct_ip_count():
+    """
+    Estimate the number of distinct IP addresses
+
+    Estimate the number of distinct IP addresses of the log records of a software and a range of
+    days, merging the HyperLogLog sketches maintained by the ingestion. The relative standard
+    error is set by SKETCH_HLL_PRECISION.
+    ---
+    tags:
+      - Log Statistics
+    parameters:
+      - name: software_name
+        in: query
+        description: Software of the records, all of them if not given
+        required: false
+        type: string
+      - name: date_from
+        in: query
+        description: First day of the range (dd-Mon-yyyy or yyyy-mm-dd)
+        required: false
+        type: string
+      - name: date_to
+        in: query
+        description: Last day of the range (dd-Mon-yyyy or yyyy-mm-dd)
+        required: false
+        type: string
+    responses:
+      200:
+        description: Estimate computed successfully
+        schema:
+          type: object
+          properties:
+            data:
+              type: object
+              properties:
+                distinct_ips:
+                  type: integer
+                relative_error:
+                  type: number
+                rows:
+                  type: integer
+                sketches:
+                  type: integer
+        examples:
+          application/json:
+            data:
+              distinct_ips: 26874
+              relative_error: 0.01625
+              rows: 27000
+              sketches: 17742
+      400:
+        description: Invalid parameters
+        schema:
+          type: object
+          properties:
+            message:
+              type: string
+        examples:
+          application/json:
+            message: "Invalid date 'x', expected dd-Mon-yyyy or yyyy-mm-dd"
+      500:
+        description: Error reading the sketches
+        schema:
+          type: object
+          properties:
+            message:
+              type: string
+        examples:
+          application/json:
+            message: "It was not possible to retrieve log statistics from the database {error}"
+    """
+
+    try:
+        estimate = count_distinct_ips(parse_sketch_filters(request.args))
+        return make_response(jsonify({"data": estimate}), 200)
+    except ValueError as error:
+        return make_response(jsonify({"message": str(error)}), 400)
+    except Exception as error:
+        return make_response(
+            jsonify(
+                {
+                    "message": f"It was not possible to retrieve log statistics from the database {error}"
+                }
+            ),
+            500,
+        )
+
+
+@controller.route("/logs/sketches/top/<dimension>", methods=["GET"])
+def get_top_log_values(dimension: str):
+    """
+    Find the most frequent IP addresses or log IDs
+
+    Find the most frequent IP addresses or log IDs of the log records of a software and a range
+    of days, merging the Space-Saving summaries maintained by the ingestion. Each count may be
+    overestimated, the true count is between min_count and count, and the values not listed
+    appear at most max_unlisted_count times. The error is set by SKETCH_TOP_CAPACITY, once the
+    summaries are merged max_unlisted_count is about rows / SKETCH_TOP_CAPACITY, so only the
+    values whose min_count is above it are known to be frequent. Without heavy hitters, every
+    listed count is about max_unlisted_count with a min_count near 1.
+    ---
+    tags:
+      - Log Statistics
+    parameters:
+      - name: dimension
+        in: path
+        description: ip or log_id
+        required: true
+        type: string
+      - name: software_name
+        in: query
+        description: Software of the records, all of them if not given
+        required: false
+        type: string
+      - name: date_from
+        in: query
+        description: First day of the range (dd-Mon-yyyy or yyyy-mm-dd)
+        required: false
+        type: string
+      - name: date_to
+        in: query
+        description: Last day of the range (dd-Mon-yyyy or yyyy-mm-dd)
+        required: false
+        type: string
+      - name: limit
+        in: query
+        description: Maximum number of values returned (1 to SKETCH_TOP_CAPACITY, default 10)
+        required: false
+        type: integer
+    responses:
+      200:
+        description: Most frequent values found successfully
+        schema:
+          type: object
+          properties:
+            data:
+              type: array
+              items:
+                type: object
+            max_unlisted_count:
+              type: integer
+            rows:
+              type: integer
+            sketches:
+              type: integer
+        examples:
+          application/json:
+            data:
+              - ip: "224.191.78.71"
+                count: 14
+                min_count: 12
+            max_unlisted_count: 3
+            rows: 27000
+            sketches: 17742
+      400:
+        description: Invalid dimension or parameters
+        schema:
+          type: object
+          properties:
+            message:
+              type: string
+        examples:
+          application/json:
+            message: "Invalid dimension 'version', expected one of ip, log_id"
+      500:
+        description: Error reading the sketches
+        schema:
+          type: object
+          properties:
+            message:
+              type: string
+        examples:
+          application/json:
+            message: "It was not possible to retrieve log statistics from the database {error}"
+    """
+
+    try:
+        response = get_top_values(
+            dimension,
+            parse_sketch_filters(request.args),
+            limit=parse_top_limit(request.args.get("limit")),
+        )
+        return make_response(jsonify(response), 200)
+    except ValueError as error:
+        return make_response(jsonify({"message": str(error)}), 400)
+    except Exception as error:
+        return make_response(
+            jsonify(
+                {
+                    "message": f"It was not possible to retrieve log statistics from the database {error}"
+                }
+            ),
+            500,
+        )
+
+
+@controller.route("/logs/analytics", methods=["GET"])
+def get_log_analytics():
+    """
+    Count log records with the in-memory analytics engine
+
+    Count the log records matching the filters, grouped by up to three dimensions, from the
+    columnar copy of the records kept in memory. With several dimensions the largest groups
+    are returned for each value of the first one, e.g. group_by=software_name,ip_address
+    returns the top IP addresses of each software. Requires ANALYTICS_ENABLED=1 and numpy.
+    ---
+    tags:
+      - Log Statistics
+    parameters:
+      - name: group_by
+        in: query
+        description: Comma separated dimensions among software_name, version, origin_file, ip_address, day and hour
+        required: false
+        type: string
+      - name: limit
+        in: query
+        description: Maximum number of groups returned, per value of the first dimension (1 to 1000, default 100)
+        required: false
+        type: integer
+      - name: ip_address
+        in: query
+        description: Only count the records from this IP address
+        required: false
+        type: string
+      - name: software_name
+        in: query
+        description: Only count the records of this software
+        required: false
+        type: string
+      - name: version
+        in: query
+        description: Only count the records of this software version
+        required: false
+        type: string
+      - name: origin_file
+        in: query
+        description: Only count the records extracted from this file
+        required: false
+        type: string
+      - name: date_from
+        in: query
+        description: Only count the records from this date on (dd-Mon-yyyy or yyyy-mm-dd)
+        required: false
+        type: string
+      - name: date_to
+        in: query
+        description: Only count the records up to this date, inclusive (dd-Mon-yyyy or yyyy-mm-dd)
+        required: false
+        type: string
+      - name: time_from
+        in: query
+        description: Only count the records from this moment on (yyyy-mm-ddThh:mm:ss)
+        required: false
+        type: string
+      - name: time_to
+        in: query
+        description: Only count the records before this moment (yyyy-mm-ddThh:mm:ss)
+        required: false
+        type: string
+    responses:
+      200:
+        description: Groups counted successfully
+        schema:
+          type: object
+          properties:
+            data:
+              type: array
+              items:
+                type: object
+            rows:
+              type: integer
+            matched:
+              type: integer
+            seconds:
+              type: number
+        examples:
+          application/json:
+            data:
+              - software_name: "Konklab"
+                ip_address: "35.93.217.158"
+                count: 3
+            rows: 10000000
+            matched: 120000
+            seconds: 0.0123
+      400:
+        description: Invalid dimension or parameters
+        schema:
+          type: object
+          properties:
+            message:
+              type: string
+        examples:
+          application/json:
+            message: "Invalid dimension 'month', expected one of software_name, version, origin_file, ip_address, day, hour"
+      503:
+        description: The analytics engine is disabled
+        schema:
+          type: object
+          properties:
+            message:
+              type: string
+        examples:
+          application/json:
+            message: "The analytics engine is disabled, set ANALYTICS_ENABLED=1"
+      500:
+        description: Error counting the log records
+        schema:
+          type: object
+          properties:
+            message:
+              type: string
+        examples:
+          application/json:
+            message: "It was not possible to count the log records {error}"
+    """
+
+    try:
+        response = analytics_engine.query(
+            filters=parse_analytics_filters(request.args, parse_log_filters(request.args)),
+            group_by=parse_group_by(request.args.get("group_by")),
+            limit=parse_page_size(request.args.get("limit")),
+        )
+        return make_response(jsonify(response), 200)
+    except ValueError as error:
+        return make_response(jsonify({"message": str(error)}), 400)
+    except AnalyticsUnavailableError as error:
+        return make_response(jsonify({"message": str(error)}), 503)
+    except Exception as error:
+        return make_response(
+            jsonify({"message": f"It was not possible to count the log records {error}"}),
+            500,
+        )
+
+
+@controller.route("/logs/analytics/stats", methods=["GET"])
+def get_log_analytics_stats():
+    """
+    Retrieve the state of the analytics engine
+
+    Retrieve the number of records held by the analytics engine, the distinct values of its
+    encoded columns and the memory used by its arrays, in this worker process.
+    ---
+    tags:
+      - Log Statistics
+    responses:
+      200:
+        description: State retrieved successfully
+        schema:
+          type: object
+          properties:
+            data:
+              type: object
+        examples:
+          application/json:
+            data:
+              enabled: true
+              version: 3
+              rows: 10000000
+              distinct:
+                software_name: 200
+                version: 1500
+                origin_file: 10
+              memory_bytes: 280000000
+    """
+    return make_response(jsonify({"data": analytics_engine.stats()}), 200)
+
+
+@controller.route("/logs/export", methods=["GET"])
+def export_logs():
+    """
+    Export log records
+
+    Stream every log record matching the filters, ordered by ID, as newline-delimited JSON
+    or as a single JSON array.
+    ---
+    tags:
+      - Log Record
+    parameters:
+      - name: format
+        in: query
+        description: ndjson (default) or json
+        required: false
+        type: string
+      - name: ip_address
+        in: query
+        required: false
+        type: string
+      - name: software_name
+        in: query
+        required: false
+        type: string
+      - name: version
+        in: query
+        required: false
+        type: string
+      - name: origin_file
+        in: query
+        required: false
+        type: string
+      - name: date_from
+        in: query
+        description: First date of the range (dd-Mon-yyyy or yyyy-mm-dd)
+        required: false
+        type: string
+      - name: date_to
+        in: query
+        description: Last date of the range (dd-Mon-yyyy or yyyy-mm-dd)
+        required: false
+        type: string
+    produces:
+      - application/x-ndjson
+      - application/json
+    responses:
+      200:
+        description: Log records streamed successfully
+        examples:
+          application/x-ndjson: |
+            {"date": "01-Apr-2022", "description": "eget tempus vel pede morbi", "hour": "2:50:07.000", "id": "78331", "ip_address": "224.191.78.71", "log_id": "871783207-1", "origin_file": "AccessLogs (1).log", "software_name": "Konklab", "title": "Customer-focused responsive installation", "version": "4.42"}
+      400:
+        description: Invalid format or filter parameters
+        schema:
+          type: object
+          properties:
+            message:
+              type: string
+        examples:
+          application/json:
+            message: "Invalid format 'csv', expected one of ndjson, json"
+      500:
+        description: Error exporting log records
+        schema:
+          type: object
+          properties:
+            message:
+              type: string
+        examples:
+          application/json:
+            message: "It was not possible to export log records from the database {error}"
+    """
+
+    output_format = request.args.get("format", "ndjson")
+
+    try:
+        chunks = stream_logs_from_database(
+            filters=parse_log_filters(request.args), output_format=output_format
+        )
+    except ValueError as error:
+        return make_response(jsonify({"message": str(error)}), 400)
+    except Exception as error:
+        return make_response(
+            jsonify(
+                {
+                    "message": f"It was not possible to export log records from the database {error}"
+                }
+            ),
+            500,
+        )
+
+    mimetype = "application/json" if output_format == "json" else "application/x-ndjson"
+    return Response(stream_with_context(chunks), mimetype=mimetype)
+
+
+@controller.route("/logs", methods=["DELETE"])
+def delete_all_logs():
+    """
+    Delete log records
+
+    Delete the log records matching the filters, or all of them without filters. Filtered
+    records are deleted in batches of consecutive IDs, each committed on its own, and with
+    async set the deletion runs as a background job. All the records are deleted at once,
+    truncating the table where the database supports it.
+    ---
+    tags:
+      - Log Record
+    parameters:
+      - name: ip_address
+        in: query
+        required: false
+        type: string
+      - name: software_name
+        in: query
+        required: false
+        type: string
+      - name: version
+        in: query
+        required: false
+        type: string
+      - name: origin_file
+        in: query
+        required: false
+        type: string
+      - name: date_from
+        in: query
+        description: First date of the range (dd-Mon-yyyy or yyyy-mm-dd)
+        required: false
+        type: string
+      - name: date_to
+        in: query
+        description: Last date of the range (dd-Mon-yyyy or yyyy-mm-dd)
+        required: false
+        type: string
+      - name: async
+        in: query
+        description: true to run a filtered deletion as a background job and return right away
+        required: false
+        type: boolean
+    responses:
+      200:
+        description: Number of rows deleted from database
+        schema:
+          type: object
+          properties:
+            data:
+              type: string
+            batches:
+              type: integer
+            seconds:
+              type: number
+        examples:
+          application/json:
+            data: 101010
+            batches: 21
+            seconds: 3.2081
+      202:
+        description: Deletion job queued
+        schema:
+          type: object
+          properties:
+            data:
+              type: object
+      400:
+        description: Invalid filter parameters
+        schema:
+          type: object
+          properties:
+            message:
+              type: string
+        examples:
+          application/json:
+            message: "Invalid date 'x', expected dd-Mon-yyyy or yyyy-mm-dd"
+      500:
+        description: Error deleting log records
+        schema:
+          type: object
+          properties:
+            message:
+              type: string
+        examples:
           application/json:
             message: "It was not possible to delete all log records from the database {error}"
     """
 
     try:
-        number_of_logs_deleted = delete_all_log_records_from_database()
-        return make_response(jsonify({"data": number_of_logs_deleted}), 200)
+        filters = parse_log_filters(request.args)
+
+        if not filters:
+            number_of_logs_deleted = delete_all_log_records_from_database()
+            return make_response(jsonify({"data": number_of_logs_deleted}), 200)
+
+        if request.args.get("async", "").lower() in ("1", "true", "yes"):
+            job = deletion_jobs.submit(current_app._get_current_object(), filters)
+            response = make_response(jsonify({"data": job.serialize()}), 202)
+            response.headers["Location"] = f"/logs/delete/jobs/{job.id}"
+            return response
+
+        return make_response(jsonify(delete_log_records_in_batches(filters)), 200)
+    except ValueError as error:
+        return make_response(jsonify({"message": str(error)}), 400)
+    except TooManyJobsError as error:
+        return make_response(jsonify({"message": str(error)}), 429)
     except Exception as error:
         return make_response(
             jsonify(
@@ -338,6 +1688,144 @@ def delete_all_logs():
         )
 
 
+@controller.route("/logs/delete/jobs", methods=["GET"])
+def list_deletion_jobs():
+    """
+    List the deletion jobs
+
+    List the queued, running and recently finished deletion jobs, newest first.
+    ---
+    tags:
+      - Deletion Job
+    responses:
+      200:
+        description: Deletion jobs retrieved successfully
+        schema:
+          type: object
+          properties:
+            data:
+              type: array
+              items:
+                type: object
+    """
+    jobs = [job.serialize() for job in deletion_jobs.list()]
+    return make_response(jsonify({"data": jobs}), 200)
+
+
+@controller.route("/logs/delete/jobs/<job_id>", methods=["GET"])
+def get_deletion_job(job_id: str):
+    """
+    Retrieve a deletion job
+
+    Retrieve the status and the progress of a deletion job.
+    ---
+    tags:
+      - Deletion Job
+    parameters:
+      - name: job_id
+        in: path
+        description: ID of the deletion job
+        required: true
+        type: string
+    responses:
+      200:
+        description: Deletion job retrieved successfully
+        schema:
+          type: object
+          properties:
+            data:
+              type: object
+        examples:
+          application/json:
+            data:
+              id: "9b2e4c1a7d3f4e5a8c6b0d1e2f3a4b5c"
+              status: "running"
+              filters:
+                date_to: "2022-03-31"
+              deleted: 15000
+              batches: 3
+              first_id: 1
+              last_id: 27000
+              current_id: 20311
+              percent_done: 75.2
+              rows_per_second: 9800.4
+              eta_seconds: 0.5
+              errors: []
+      404:
+        description: Deletion job not found
+        schema:
+          type: object
+          properties:
+            message:
+              type: string
+        examples:
+          application/json:
+            message: "Deletion job not found"
+    """
+    job = deletion_jobs.get(job_id)
+
+    if job is None:
+        return make_response(jsonify({"message": "Deletion job not found"}), 404)
+
+    return make_response(jsonify({"data": job.serialize()}), 200)
+
+
+@controller.route("/logs/delete/jobs/<job_id>", methods=["DELETE"])
+def cancel_deletion_job(job_id: str):
+    """
+    Cancel a deletion job
+
+    Cancel a queued deletion job, or stop a running one after the batch being deleted. The
+    batches already deleted stay deleted.
+    ---
+    tags:
+      - Deletion Job
+    parameters:
+      - name: job_id
+        in: path
+        description: ID of the deletion job
+        required: true
+        type: string
+    responses:
+      202:
+        description: Cancellation requested
+        schema:
+          type: object
+          properties:
+            data:
+              type: object
+      404:
+        description: Deletion job not found
+        schema:
+          type: object
+          properties:
+            message:
+              type: string
+        examples:
+          application/json:
+            message: "Deletion job not found"
+      409:
+        description: Deletion job already finished
+        schema:
+          type: object
+          properties:
+            message:
+              type: string
+        examples:
+          application/json:
+            message: "Deletion job already finished"
+    """
+    cancelled = deletion_jobs.cancel(job_id)
+
+    if cancelled is None:
+        return make_response(jsonify({"message": "Deletion job not found"}), 404)
+
+    if not cancelled:
+        return make_response(jsonify({"message": "Deletion job already finished"}), 409)
+
+    return make_response(jsonify({"data": deletion_jobs.get(job_id).serialize()}), 202)
+
+
 @controller.route("/log/<id>", methods=["DELETE"])
 def delete_log_by_id(id: str):
     """
@@ -387,3 +1875,57 @@ def delete_log_by_id(id: str):
             ),
             500,
         )
+
+
+@controller.route("/cache/stats", methods=["GET"])
+def get_cache_stats():
+    """
+    Retrieve the response cache counters
+
+    Retrieve the size, hits, misses and evictions of the response cache, to help sizing it.
+    ---
+    tags:
+      - Cache
+    responses:
+      200:
+        description: Cache counters retrieved successfully
+        schema:
+          type: object
+          properties:
+            data:
+              type: object
+        examples:
+          application/json:
+            data:
+              enabled: true
+              version: 3
+              entries: 120
+              max_entries: 10000
+              hits: 5230
+              misses: 180
+              evictions: 0
+              expirations: 60
+              shared_backend: null
+              shared_hits: 0
+              shared_misses: 0
+    """
+    return make_response(jsonify({"data": response_cache.stats()}), 200)
+
+
+@controller.route("/metrics", methods=["GET"])
+def get_metrics():
+    """
+    Retrieve the metrics in the Prometheus text format
+
+    Retrieve the timings of the ingestion stages, the request latency per route and the
+    database pool checkout wait, for this worker process.
+    ---
+    tags:
+      - Metrics
+    produces:
+      - text/plain
+    responses:
+      200:
+        description: Metrics in the Prometheus text exposition format
+    """
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
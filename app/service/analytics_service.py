@@ -0,0 +1,755 @@
+"""
+Analytics Service Module
+------------------------
+Responsible to answer ad-hoc filter, group-by and top-k questions over the log records from
+an in-memory columnar copy of them.
+
+The engine keeps one NumPy array per column: the software_name, version and origin_file
+strings are dictionary-encoded, the timestamps are stored as seconds since the epoch and the
+IPv4 addresses as integers. It is loaded from the database on the first query and fed the
+rows inserted by each extraction after they are committed. Any other change of the data,
+detected through the data_versions row of the log records whichever process committed it,
+makes the next query load it again. The engine is enabled with ANALYTICS_ENABLED and requires the numpy package.
+
+Author: Álef Ádonis dos Santos Carlos
+Date: 10/01/2024
+"""
+
+from ..extensions import db
+from ..models.log_record_model import Log, LOG_RECORD_COLUMNS
+from .version_service import read_version_number
+from datetime import datetime, time as day_time, timedelta
+import os
+import socket
+import threading
+import time
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+ANALYTICS_ENABLED = os.environ.get("ANALYTICS_ENABLED", "0") == "1"
+ANALYTICS_LOAD_BATCH_SIZE = int(os.environ.get("ANALYTICS_LOAD_BATCH_SIZE", 100000))
+ANALYTICS_MAX_GROUP_BY = 3
+ANALYTICS_MAX_DENSE_GROUPS = 1 << 22
+
+ANALYTICS_DIMENSIONS = ("software_name", "version", "origin_file", "ip_address", "day", "hour")
+ANALYTICS_EQUALITY_FILTERS = ("software_name", "version", "origin_file", "ip_address")
+ANALYTICS_TIME_FILTERS = ("time_from", "time_to")
+ENCODED_COLUMNS = ("software_name", "version", "origin_file")
+NULL_TIMESTAMP = -(1 << 63)
+COLUMN_DTYPES = {
+    "software_name": "int32",
+    "version": "int32",
+    "origin_file": "int32",
+    "ip_address": "int64",
+    "timestamp": "int64",
+}
+
+EPOCH = datetime(1970, 1, 1)
+SECONDS_PER_GROUP = {"day": 86400, "hour": 3600}
+GROUP_LABEL_FORMATS = {"day": "%Y-%m-%d", "hour": "%Y-%m-%dT%H"}
+
+ROW_INDEXES = {
+    name: LOG_RECORD_COLUMNS.index(name)
+    for name in ("ip_address", "software_name", "version", "origin_file", "timestamp")
+}
+
+
+class AnalyticsUnavailableError(Exception):
+    """Raised when the analytics engine is disabled or numpy is not installed."""
+
+
+class StringDictionary:
+    """
+    Maps each distinct string of a column to a small integer code.
+
+    Attributes:
+        - values (List[str]): The distinct strings, indexed by their code.
+
+    Methods:
+        - encode: Encodes a list of strings.
+        - code: Finds the code of a string.
+    """
+
+    def __init__(self) -> None:
+        """
+        Initializes an empty StringDictionary.
+
+        Returns:
+            None
+        """
+        self.values = []
+        self._codes = {}
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def encode(self, values: list):
+        """
+        Encode a list of strings, adding the new ones to the dictionary.
+
+        Parameters:
+            values (List[str]): The strings.
+
+        Returns:
+            numpy.ndarray: Their codes, as int32.
+        """
+        codes = self._codes
+        encoded = np.empty(len(values), dtype=np.int32)
+
+        for index, value in enumerate(values):
+            code = codes.get(value)
+            if code is None:
+                code = codes[value] = len(self.values)
+                self.values.append(value)
+
+            encoded[index] = code
+
+        return encoded
+
+    def code(self, value: str):
+        """
+        Find the code of a string.
+
+        Parameters:
+            value (str): The string.
+
+        Returns:
+            int or None: Its code, None if the string was never encoded.
+        """
+        return self._codes.get(value)
+
+
+class IPAddressEncoder:
+    """
+    Stores the IPv4 addresses as their integer value, and any other address as a negative code.
+
+    Methods:
+        - encode: Encodes a list of addresses.
+        - code: Finds the integer of an address.
+        - decode: Converts an integer back into the address.
+    """
+
+    def __init__(self) -> None:
+        """
+        Initializes an IPAddressEncoder without other addresses.
+
+        Returns:
+            None
+        """
+        self.others = StringDictionary()
+
+    def code(self, value: str, add: bool = False):
+        """
+        Find the integer of an address.
+
+        Parameters:
+            value (str): The address.
+            add (bool): True to give a code to an address that is not a canonical IPv4 one.
+
+        Returns:
+            int or None: The integer, None if the address is unknown and add is False.
+        """
+        try:
+            packed = socket.inet_aton(value)
+
+            if socket.inet_ntoa(packed) == value:
+                return int.from_bytes(packed, "big")
+        except (OSError, TypeError):
+            pass
+
+        code = self.others.code(value)
+        if code is None:
+            if not add:
+                return None
+
+            code = int(self.others.encode([value])[0])
+
+        return -code - 1
+
+    def encode(self, values: list):
+        """
+        Encode a list of addresses.
+
+        Parameters:
+            values (List[str]): The addresses.
+
+        Returns:
+            numpy.ndarray: Their integers, as int64.
+        """
+        return np.fromiter((self.code(value, add=True) for value in values), np.int64, len(values))
+
+    def decode(self, code: int) -> str:
+        """
+        Convert an integer back into the address.
+
+        Parameters:
+            code (int): The integer.
+
+        Returns:
+            str: The address.
+        """
+        if code < 0:
+            return self.others.values[-code - 1]
+
+        return socket.inet_ntoa(int(code).to_bytes(4, "big"))
+
+
+class ColumnStore:
+    """
+    The encoded columns of a set of log records.
+
+    Attributes:
+        - dictionaries (dict): The StringDictionary of each dictionary-encoded column.
+        - ip_addresses (IPAddressEncoder): The encoder of the ip_address column.
+
+    Methods:
+        - append: Encodes and appends records.
+        - columns: Returns the arrays of every column.
+        - stats: Reports the number of rows and the memory used.
+    """
+
+    def __init__(self) -> None:
+        """
+        Initializes an empty ColumnStore.
+
+        Returns:
+            None
+        """
+        self.dictionaries = {name: StringDictionary() for name in ENCODED_COLUMNS}
+        self.ip_addresses = IPAddressEncoder()
+
+        self._chunks = []
+        self._columns = None
+
+    def append(self, ip_addresses: list, strings: dict, timestamps: list) -> None:
+        """
+        Encode and append records, given column by column.
+
+        Parameters:
+            ip_addresses (List[str]): The IP addresses.
+            strings (dict): The values of each dictionary-encoded column.
+            timestamps (List[datetime]): The timestamps, None when unknown.
+
+        Returns:
+            None
+        """
+        chunk = {name: self.dictionaries[name].encode(strings[name]) for name in ENCODED_COLUMNS}
+        chunk["ip_address"] = self.ip_addresses.encode(ip_addresses)
+        chunk["timestamp"] = np.array(timestamps, dtype="datetime64[s]").astype(np.int64)
+
+        self._chunks.append(chunk)
+        self._columns = None
+
+    def columns(self) -> dict:
+        """
+        Return the arrays of every column, concatenating the chunks appended since the last call.
+
+        Returns:
+            dict: The array of each column.
+        """
+        if self._columns is None:
+            self._columns = {
+                name: np.concatenate([chunk[name] for chunk in self._chunks])
+                if self._chunks
+                else np.empty(0, dtype=dtype)
+                for name, dtype in COLUMN_DTYPES.items()
+            }
+            self._chunks = [self._columns]
+
+        return self._columns
+
+    def stats(self) -> dict:
+        """
+        Report the number of rows and the memory used by the arrays.
+
+        Returns:
+            dict: The number of rows, the distinct values of each encoded column and the bytes used.
+        """
+        chunks = list(self._chunks)
+
+        return {
+            "rows": sum(len(chunk["timestamp"]) for chunk in chunks),
+            "distinct": {name: len(self.dictionaries[name]) for name in ENCODED_COLUMNS},
+            "memory_bytes": sum(array.nbytes for chunk in chunks for array in chunk.values()),
+        }
+
+
+class AnalyticsEngine:
+    """
+    Holds the columnar copy of the log records and answers the analytics queries.
+
+    Attributes:
+        - version (int or None): The data version the columns reflect, None if not loaded.
+
+    Methods:
+        - load: Loads the columns from the database.
+        - feed: Appends committed rows.
+        - follow_version: Moves to the data version created by the commit whose rows were fed.
+        - query: Filters, groups and counts the records.
+        - stats: Reports the state of the engine.
+    """
+
+    def __init__(self) -> None:
+        """
+        Initializes an empty AnalyticsEngine.
+
+        Returns:
+            None
+        """
+        self.version = None
+
+        self._store = ColumnStore() if np is not None else None
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._loading = False
+        self._fed_while_loading = False
+
+    def load(self) -> int:
+        """
+        Load the columns from the database, replacing the current ones once they are loaded.
+
+        Returns:
+            int: Number of records loaded.
+        """
+        with self._load_lock:
+            version = read_version_number()
+            store = ColumnStore()
+
+            with self._lock:
+                self._loading = True
+                self._fed_while_loading = False
+
+            try:
+                last_id = 0
+
+                while True:
+                    records = (
+                        db.session.query(
+                            Log.id,
+                            Log.ip_address,
+                            Log.software_name,
+                            Log.version,
+                            Log.origin_file,
+                            Log.timestamp,
+                        )
+                        .filter(Log.id > last_id)
+                        .order_by(Log.id)
+                        .limit(ANALYTICS_LOAD_BATCH_SIZE)
+                        .all()
+                    )
+
+                    if not records:
+                        break
+
+                    ids, ip_addresses, software_names, versions, origin_files, timestamps = zip(
+                        *records
+                    )
+                    store.append(
+                        ip_addresses,
+                        {
+                            "software_name": software_names,
+                            "version": versions,
+                            "origin_file": origin_files,
+                        },
+                        timestamps,
+                    )
+                    last_id = ids[-1]
+
+                store.columns()
+            finally:
+                with self._lock:
+                    self._loading = False
+
+            with self._lock:
+                self._store = store
+                self.version = None if self._fed_while_loading else version
+
+            return store.stats()["rows"]
+
+    def feed(self, rows: list, version: int) -> None:
+        """
+        Append rows committed by an extraction, if the columns are still the ones it started with.
+
+        Parameters:
+            rows (List[tuple]): The rows, with values in the LOG_RECORD_COLUMNS order.
+            version (int or None): The version of the engine when the extraction started, or
+                the one returned by follow_version after its previous commit.
+
+        Returns:
+            None
+        """
+        if not rows or version is None:
+            return
+
+        with self._lock:
+            if self._loading:
+                self._fed_while_loading = True
+                return
+
+            if self.version != version:
+                return
+
+            self._store.append(
+                [row[ROW_INDEXES["ip_address"]] for row in rows],
+                {name: [row[ROW_INDEXES[name]] for row in rows] for name in ENCODED_COLUMNS},
+                [row[ROW_INDEXES["timestamp"]] for row in rows],
+            )
+
+    def follow_version(self, previous: int, version: int):
+        """
+        Move to the data version created by a commit of an extraction whose rows were fed.
+
+        The columns are only kept if they are still the ones the extraction fed and reflected
+        the version right before the new one, otherwise another change happened meanwhile,
+        maybe in another process, and they are loaded again on the next query.
+
+        Parameters:
+            previous (int or None): The version the rows of the commit were fed with.
+            version (int or None): The version created by the commit, None if it did not
+                change the data.
+
+        Returns:
+            int or None: The version to feed the next commit of the extraction with, None if
+                the columns were not kept.
+        """
+        if version is None:
+            return previous
+
+        with self._lock:
+            if previous is not None and self.version == previous == version - 1:
+                self.version = version
+                return version
+
+            return None
+
+    def ensure_loaded(self) -> None:
+        """
+        Load the columns if they are not loaded or do not reflect the current data version.
+
+        Returns:
+            None
+
+        Raises:
+            AnalyticsUnavailableError: If the engine is disabled or numpy is not installed.
+        """
+        if not ANALYTICS_ENABLED:
+            raise AnalyticsUnavailableError(
+                "The analytics engine is disabled, set ANALYTICS_ENABLED=1"
+            )
+
+        if np is None:
+            raise AnalyticsUnavailableError(
+                "The numpy package is required by the analytics engine"
+            )
+
+        if self.version is None or self.version != read_version_number():
+            self.load()
+
+    def query(self, filters: dict = None, group_by: tuple = (), limit: int = 10) -> dict:
+        """
+        Count the records matching the filters, grouped by up to ANALYTICS_MAX_GROUP_BY dimensions.
+
+        With a single dimension the limit largest groups are returned. With several, the limit
+        largest groups of the other dimensions are returned for each value of the first one,
+        e.g. the top IP addresses of each software.
+
+        Parameters:
+            filters (dict): The filters returned by parse_analytics_filters.
+            group_by (tuple): The dimensions, from ANALYTICS_DIMENSIONS, none to only count.
+            limit (int): The number of groups returned, per value of the first dimension.
+
+        Returns:
+            dict: The groups with their count, the number of records scanned and matched and the
+                seconds spent.
+
+        Raises:
+            AnalyticsUnavailableError: If the engine is disabled or numpy is not installed.
+        """
+        self.ensure_loaded()
+
+        started_at = time.perf_counter()
+        with self._lock:
+            store = self._store
+            columns = store.columns()
+
+        mask = filter_mask(store, columns, filters or {})
+
+        if any(dimension in SECONDS_PER_GROUP for dimension in group_by):
+            known = columns["timestamp"] != NULL_TIMESTAMP
+            mask = known if mask is None else mask & known
+
+        matched = len(columns["timestamp"]) if mask is None else int(np.count_nonzero(mask))
+        data = []
+
+        if group_by and matched:
+            data = group_and_count(
+                [group_codes(store, columns, mask, dimension) for dimension in group_by],
+                group_by,
+                limit,
+            )
+
+        return {
+            "data": data,
+            "rows": len(columns["timestamp"]),
+            "matched": matched,
+            "seconds": round(time.perf_counter() - started_at, 6),
+        }
+
+    def stats(self) -> dict:
+        """
+        Report the state of the engine.
+
+        Returns:
+            dict: Whether it is enabled, the data version of the columns, the number of rows, the
+                distinct values of each encoded column and the bytes used by the arrays.
+        """
+        with self._lock:
+            stats = self._store.stats() if self._store is not None else {}
+
+        return {"enabled": ANALYTICS_ENABLED and np is not None, "version": self.version, **stats}
+
+
+def filter_mask(store: ColumnStore, columns: dict, filters: dict):
+    """
+    Compute which records match the filters.
+
+    Parameters:
+        store (ColumnStore): The store the columns belong to.
+        columns (dict): The arrays of every column.
+        filters (dict): The filters returned by parse_analytics_filters.
+
+    Returns:
+        numpy.ndarray or None: A boolean per record, None if there is no filter.
+    """
+    if not filters:
+        return None
+
+    mask = np.ones(len(columns["timestamp"]), dtype=bool)
+
+    for name in ANALYTICS_EQUALITY_FILTERS:
+        if name not in filters:
+            continue
+
+        if name == "ip_address":
+            code = store.ip_addresses.code(filters[name])
+        else:
+            code = store.dictionaries[name].code(filters[name])
+
+        if code is None:
+            return np.zeros_like(mask)
+
+        mask &= columns[name] == code
+
+    start, end = time_bounds(filters)
+    if start is not None or end is not None:
+        timestamps = columns["timestamp"]
+        mask &= timestamps != NULL_TIMESTAMP
+
+        if start is not None:
+            mask &= timestamps >= start
+
+        if end is not None:
+            mask &= timestamps < end
+
+    return mask
+
+
+def group_codes(store: ColumnStore, columns: dict, mask, dimension: str) -> tuple:
+    """
+    Compute the dense group codes of the matching records for a dimension.
+
+    Parameters:
+        store (ColumnStore): The store the columns belong to.
+        columns (dict): The arrays of every column.
+        mask (numpy.ndarray or None): A boolean per record, True for the matching ones, None for all.
+        dimension (str): The dimension, from ANALYTICS_DIMENSIONS.
+
+    Returns:
+        tuple: The codes, from 0 to the number of codes, the number of codes and a function
+            converting a code into its label.
+    """
+    column = columns["timestamp" if dimension in SECONDS_PER_GROUP else dimension]
+    if mask is not None:
+        column = column[mask]
+
+    if dimension in ENCODED_COLUMNS:
+        labels = store.dictionaries[dimension].values
+        return column, len(labels), labels.__getitem__
+
+    if dimension == "ip_address":
+        values, codes = np.unique(column, return_inverse=True)
+        return (
+            codes.reshape(-1).astype(np.int64),
+            len(values),
+            lambda code: store.ip_addresses.decode(int(values[code])),
+        )
+
+    seconds = SECONDS_PER_GROUP[dimension]
+    periods = column // seconds
+    first = int(periods.min())
+    label_format = GROUP_LABEL_FORMATS[dimension]
+
+    return (
+        periods - first,
+        int(periods.max()) - first + 1,
+        lambda code: (EPOCH + timedelta(seconds=(first + code) * seconds)).strftime(label_format),
+    )
+
+
+def group_and_count(groups: list, group_by: tuple, limit: int) -> list:
+    """
+    Count the records of each combination of group codes and keep the largest groups.
+
+    The codes are combined into a single integer key, counted with bincount when the number
+    of combinations is small enough and with unique otherwise.
+
+    Parameters:
+        groups (List[tuple]): The codes, number of codes and label function of each dimension.
+        group_by (tuple): The names of the dimensions.
+        limit (int): The number of groups kept, per value of the first dimension.
+
+    Returns:
+        List[dict]: The label of each dimension and the count of the kept groups.
+    """
+    key, combinations, _ = groups[0]
+
+    for codes, size, _ in groups[1:]:
+        key = key.astype(np.int64) * size + codes
+        combinations *= size
+
+    if combinations <= ANALYTICS_MAX_DENSE_GROUPS:
+        counts = np.bincount(key, minlength=combinations)
+        keys = np.flatnonzero(counts)
+        counts = counts[keys]
+    else:
+        keys, counts = np.unique(key, return_counts=True)
+
+    group_codes = []
+    remainder = keys
+    for _, size, _ in reversed(groups):
+        remainder, codes = np.divmod(remainder, size)
+        group_codes.insert(0, codes)
+
+    if len(groups) == 1:
+        kept = np.arange(len(counts))
+        if len(kept) > limit:
+            kept = np.argpartition(-counts, limit - 1)[:limit]
+
+        kept = kept[np.lexsort((kept, -counts[kept]))]
+    else:
+        first = group_codes[0]
+        totals = np.bincount(first, weights=counts)
+        order = np.lexsort((-counts, first, -totals[first]))
+        ordered_first = first[order]
+        starts = np.flatnonzero(np.r_[True, ordered_first[1:] != ordered_first[:-1]])
+        ranks = np.arange(len(order)) - np.repeat(starts, np.diff(np.r_[starts, len(order)]))
+        kept = order[ranks < limit]
+
+    columns = []
+    for (_, _, label), codes in zip(groups, group_codes):
+        values, positions = np.unique(codes[kept], return_inverse=True)
+        labels = [label(int(value)) for value in values]
+        columns.append([labels[position] for position in positions.reshape(-1)])
+
+    return [
+        {**dict(zip(group_by, values)), "count": int(count)}
+        for values, count in zip(zip(*columns), counts[kept])
+    ]
+
+
+def time_bounds(filters: dict) -> tuple:
+    """
+    Convert the date and time filters into a range of seconds since the epoch.
+
+    Parameters:
+        filters (dict): The filters returned by parse_analytics_filters.
+
+    Returns:
+        tuple: The inclusive start and exclusive end, None when not bounded.
+    """
+    starts = []
+    ends = []
+
+    if "date_from" in filters:
+        starts.append(datetime.combine(filters["date_from"], day_time.min))
+
+    if "time_from" in filters:
+        starts.append(filters["time_from"])
+
+    if "date_to" in filters:
+        ends.append(datetime.combine(filters["date_to"] + timedelta(days=1), day_time.min))
+
+    if "time_to" in filters:
+        ends.append(filters["time_to"])
+
+    return (
+        (max(starts) - EPOCH) // timedelta(seconds=1) if starts else None,
+        (min(ends) - EPOCH) // timedelta(seconds=1) if ends else None,
+    )
+
+
+def parse_analytics_filters(args, filters: dict) -> dict:
+    """
+    Add the time window filters of the analytics queries to the log record filters.
+
+    Parameters:
+        args (MultiDict): The request query arguments.
+        filters (dict): The filters returned by parse_log_filters.
+
+    Returns:
+        dict: The filters, with time_from and time_to converted to datetimes.
+
+    Raises:
+        ValueError: If a time filter is invalid.
+    """
+    filters = dict(filters)
+
+    for name in ANALYTICS_TIME_FILTERS:
+        if args.get(name):
+            try:
+                filters[name] = datetime.fromisoformat(args[name])
+            except ValueError:
+                raise ValueError(
+                    f"Invalid {name} '{args[name]}', expected yyyy-mm-ddThh:mm:ss"
+                ) from None
+
+            if filters[name].tzinfo is not None:
+                raise ValueError(f"Invalid {name} '{args[name]}', expected a time without offset")
+
+    return filters
+
+
+def parse_group_by(value) -> tuple:
+    """
+    Parse the comma separated dimensions of an analytics query.
+
+    Parameters:
+        value (str or None): The dimensions, e.g. "software_name,ip_address".
+
+    Returns:
+        tuple: The dimensions, empty if none was given.
+
+    Raises:
+        ValueError: If a dimension is unknown, repeated or there are too many.
+    """
+    group_by = tuple(name.strip() for name in (value or "").split(",") if name.strip())
+
+    for name in group_by:
+        if name not in ANALYTICS_DIMENSIONS:
+            raise ValueError(
+                f"Invalid dimension '{name}', expected one of {', '.join(ANALYTICS_DIMENSIONS)}"
+            )
+
+    if len(set(group_by)) != len(group_by) or len(group_by) > ANALYTICS_MAX_GROUP_BY:
+        raise ValueError(
+            f"The group_by must list up to {ANALYTICS_MAX_GROUP_BY} distinct dimensions"
+        )
+
+    return group_by
+
+
+analytics_engine = AnalyticsEngine()
@@ -0,0 +1,238 @@
+"""
+Bulk Loader Module
+------------------------
+Responsible to write large amounts of log records in the database without the ORM overhead.
+
+On PostgreSQL the rows are streamed with COPY FROM STDIN from an in-memory buffer, on the
+other dialects they are written with a Core insert executed with executemany, run by the
+driver directly on SQLite, whose full-text index is then updated in one statement.
+
+Author: Álef Ádonis dos Santos Carlos
+Date: 10/01/2024
+"""
+
+from ..extensions import db
+from ..models.log_record_model import Log, LOG_RECORD_COLUMNS
+from .search_service import index_inserted_records
+from sqlalchemy import func, insert
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.exc import IntegrityError
+import io
+import os
+
+
+INSERT_BATCH_SIZE = int(os.environ.get("INSERT_BATCH_SIZE", 10000))
+
+COPY_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
+
+
+def supports_copy() -> bool:
+    """
+    Check if the current database connection can load rows with COPY FROM STDIN.
+
+    Returns:
+        bool: True if the dialect is PostgreSQL with a driver exposing copy_expert, False otherwise.
+    """
+    if db.engine.dialect.name != "postgresql":
+        return False
+
+    return db.engine.dialect.driver == "psycopg2"
+
+
+def build_copy_buffer(rows: list, columns: tuple) -> io.StringIO:
+    """
+    Write rows in the PostgreSQL COPY text format into an in-memory buffer.
+
+    Parameters:
+        rows (List[tuple]): The rows to write, with values in the same order as columns.
+        columns (tuple): The names of the columns being loaded.
+
+    Returns:
+        io.StringIO: The buffer positioned at its start.
+    """
+    buffer = io.StringIO()
+    buffer.writelines(
+        "\t".join(
+            "\\N" if value is None else str(value).translate(COPY_ESCAPES)
+            for value in row
+        )
+        + "\n"
+        for row in rows
+    )
+    buffer.seek(0)
+    return buffer
+
+
+def copy_rows(rows: list, table, columns: tuple) -> None:
+    """
+    Load rows in the current transaction with COPY FROM STDIN.
+
+    The values are converted by the bind processors of their columns first, so an invalid IP
+    address is saved as NULL like with the executemany path instead of failing the COPY.
+
+    Parameters:
+        rows (List[tuple]): The rows to load.
+        table (Table): The destination table.
+        columns (tuple): The names of the columns being loaded.
+
+    Returns:
+        None
+
+    Raises:
+        IntegrityError: If a row violates a constraint, wrapping the driver error like the
+            executemany path does.
+    """
+    connection = db.session.connection().connection.driver_connection
+    statement = f"COPY {table.name} ({', '.join(columns)}) FROM STDIN"
+    buffer = build_copy_buffer(bind_row_values(rows, table, columns), columns)
+
+    with connection.cursor() as cursor:
+        try:
+            cursor.copy_expert(statement, buffer)
+        except db.engine.dialect.dbapi.IntegrityError as error:
+            raise IntegrityError(statement, None, error) from error
+
+
+def bind_row_values(rows: list, table, columns: tuple) -> list:
+    """
+    Convert the values of rows with the bind processors of their columns, as a Core insert would.
+
+    Parameters:
+        rows (List[tuple]): The rows to convert.
+        table (Table): The destination table.
+        columns (tuple): The names of the columns being loaded.
+
+    Returns:
+        List[tuple]: The rows with the values the driver expects.
+    """
+    dialect = db.engine.dialect
+    processors = []
+
+    for index, column in enumerate(columns):
+        processor = table.c[column].type.bind_processor(dialect)
+
+        if processor is not None:
+            processors.append((index, processor))
+
+    if not processors:
+        return rows
+
+    bound_rows = []
+    for row in rows:
+        values = list(row)
+
+        for index, processor in processors:
+            values[index] = processor(values[index])
+
+        bound_rows.append(tuple(values))
+
+    return bound_rows
+
+
+def execute_sqlite_insert(rows: list, table, columns: tuple, conflict_columns: tuple = None) -> None:
+    """
+    Load rows in the current SQLite transaction with the driver's executemany, and index them for search.
+
+    The statement is executed as is, skipping the per row parameter handling of a Core insert.
+
+    Parameters:
+        rows (List[tuple]): The rows to load.
+        table (Table): The destination table.
+        columns (tuple): The names of the columns being loaded.
+        conflict_columns (tuple): The columns of a unique index whose violations are skipped, None to fail on them.
+
+    Returns:
+        None
+    """
+    statement = (
+        f"INSERT INTO {table.name} ({', '.join(columns)}) "
+        f"VALUES ({', '.join('?' for _ in columns)})"
+    )
+    if conflict_columns:
+        statement += f" ON CONFLICT ({', '.join(conflict_columns)}) DO NOTHING"
+
+    last_id = db.session.query(func.max(Log.id)).scalar() or 0
+    db.session.connection().exec_driver_sql(statement, bind_row_values(rows, table, columns))
+    index_inserted_records(last_id)
+
+
+def insert_rows(rows: list, table, columns: tuple) -> None:
+    """
+    Load rows in the current transaction with a Core insert executed with executemany.
+
+    On SQLite the insert is executed by the driver directly.
+
+    Parameters:
+        rows (List[tuple]): The rows to load.
+        table (Table): The destination table.
+        columns (tuple): The names of the columns being loaded.
+
+    Returns:
+        None
+    """
+    if db.engine.dialect.name == "sqlite":
+        execute_sqlite_insert(rows, table, columns)
+        return
+
+    db.session.execute(insert(table), [dict(zip(columns, row)) for row in rows])
+
+
+def insert_rows_ignoring_conflicts(rows: list, conflict_columns: tuple) -> None:
+    """
+    Insert log record rows in the current transaction, skipping the ones violating a unique index.
+
+    On PostgreSQL and SQLite the rows are inserted with ON CONFLICT DO NOTHING, on the other
+    dialects with a plain insert, so the caller must have filtered the duplicates out.
+
+    Parameters:
+        rows (List[tuple]): The rows to insert, with values in the LOG_RECORD_COLUMNS order.
+        conflict_columns (tuple): The columns of the unique index.
+
+    Returns:
+        None
+    """
+    table = Log.__table__
+    dialect = db.engine.dialect.name
+
+    if dialect == "sqlite":
+        execute_sqlite_insert(rows, table, LOG_RECORD_COLUMNS, conflict_columns)
+        return
+
+    if dialect == "postgresql":
+        statement = postgresql.insert(table).on_conflict_do_nothing(
+            index_elements=list(conflict_columns)
+        )
+    else:
+        statement = insert(table)
+
+    db.session.execute(statement, [dict(zip(LOG_RECORD_COLUMNS, row)) for row in rows])
+
+
+def bulk_insert_records(rows: list, batch_size: int = None) -> int:
+    """
+    Save log record rows in the database in batches, bypassing the ORM, in the current transaction.
+
+    The transaction is left open, so the caller can commit it together with its own changes,
+    the commits of the ingestion are controlled by PIPELINE_BATCHES_PER_COMMIT.
+
+    Parameters:
+        rows (List[tuple]): The rows to save, with values in the LOG_RECORD_COLUMNS order.
+        batch_size (int): Number of rows written by each statement, INSERT_BATCH_SIZE if None.
+
+    Returns:
+        int: Number of rows written.
+    """
+    batch_size = batch_size or INSERT_BATCH_SIZE
+
+    table = Log.__table__
+    use_copy = supports_copy()
+
+    for index in range(0, len(rows), batch_size):
+        batch_rows = rows[index : index + batch_size]
+
+        if use_copy:
+            copy_rows(batch_rows, table, LOG_RECORD_COLUMNS)
+        else:
+            insert_rows(batch_rows, table, LOG_RECORD_COLUMNS)
+
+    return len(rows)
@@ -0,0 +1,331 @@
+"""
+Cache Service Module
+------------------------
+Responsible to cache serialized log records and listing pages between requests.
+
+Every entry is stored under the version of the log records data read by the request before
+its query, the data_versions row incremented by every transaction inserting or deleting log
+records, whichever process commits it. A new version makes all the older entries unreachable
+at once. Entries live in an in-process LRU and, when CACHE_BACKEND is set, in a shared backend
+where the entries of old versions expire after CACHE_TTL.
+
+Author: Álef Ádonis dos Santos Carlos
+Date: 10/01/2024
+"""
+
+from collections import OrderedDict
+import json
+import os
+import threading
+import time
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+
+CACHE_ENABLED = os.environ.get("CACHE_ENABLED", "1") == "1"
+CACHE_MAX_ENTRIES = int(os.environ.get("CACHE_MAX_ENTRIES", 10000))
+CACHE_TTL = float(os.environ.get("CACHE_TTL", 60))
+CACHE_BACKEND = os.environ.get("CACHE_BACKEND", "")
+CACHE_KEY_PREFIX = "log-cache:"
+
+
+class LRUCache:
+    """
+    A thread-safe least recently used cache with a size bound and a time to live.
+
+    Attributes:
+        - max_entries (int): Maximum number of entries kept, the least recently used is evicted first.
+        - ttl (float): Number of seconds an entry stays valid.
+        - hits (int): Number of lookups answered by the cache.
+        - misses (int): Number of lookups not found or expired.
+        - evictions (int): Number of entries removed to respect max_entries.
+        - expirations (int): Number of entries removed because they were older than ttl.
+
+    Methods:
+        - get: Retrieves an entry.
+        - set: Stores an entry.
+        - clear: Removes every entry.
+    """
+
+    def __init__(self, max_entries: int, ttl: float) -> None:
+        """
+        Initializes an empty LRUCache.
+
+        Parameters:
+            - max_entries (int): Maximum number of entries kept.
+            - ttl (float): Number of seconds an entry stays valid.
+
+        Returns:
+            None
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str):
+        """
+        Retrieve an entry, marking it as the most recently used.
+
+        Parameters:
+            key (str): The key of the entry.
+
+        Returns:
+            The cached value, None if it is missing or expired.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value) -> None:
+        """
+        Store an entry, evicting the least recently used ones above max_entries.
+
+        Parameters:
+            key (str): The key of the entry.
+            value: The value to cache.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        """
+        Remove every entry.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self._entries.clear()
+
+
+class MemoryCacheBackend:
+    """
+    A local stand-in for the shared backend, keeping the same get/set contract as Redis.
+
+    It is only shared between the threads of one process, so it is meant for local runs and tests.
+    """
+
+    def __init__(self) -> None:
+        """
+        Initializes an empty MemoryCacheBackend.
+
+        Returns:
+            None
+        """
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        """Retrieve a value, None if it is missing or expired."""
+        with self._lock:
+            entry = self._values.get(key)
+
+            if entry is None:
+                return None
+
+            value, expires_at = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._values[key]
+                return None
+
+            return value
+
+    def set(self, key: str, value, ex: float = None) -> None:
+        """Store a value, expiring after ex seconds if given."""
+        with self._lock:
+            expires_at = time.monotonic() + ex if ex else None
+            self._values[key] = (value, expires_at)
+
+
+def create_shared_backend(backend_url: str):
+    """
+    Create the shared cache backend described by CACHE_BACKEND.
+
+    Parameters:
+        backend_url (str): "memory" for the local stand-in or a redis:// URL.
+
+    Returns:
+        MemoryCacheBackend or Redis or None: The backend, None if no backend is configured.
+
+    Raises:
+        RuntimeError: If a Redis URL is configured but the redis package is not installed.
+    """
+    if not backend_url:
+        return None
+
+    if backend_url == "memory":
+        return MemoryCacheBackend()
+
+    if redis is None:
+        raise RuntimeError("The redis package is required to use a Redis cache backend")
+
+    return redis.Redis.from_url(backend_url)
+
+
+class ResponseCache:
+    """
+    Caches serialized responses under the data version read before computing them.
+
+    Attributes:
+        - local (LRUCache): The in-process cache.
+        - shared (MemoryCacheBackend or Redis or None): The optional shared backend.
+        - enabled (bool): False to bypass the cache entirely.
+        - version (int): The newest data version seen, the local entries of older ones are cleared.
+
+    Methods:
+        - get: Retrieves a cached value of a data version.
+        - set: Caches a value under the data version read before computing it.
+        - stats: Reports the hit, miss and eviction counters.
+    """
+
+    def __init__(self, local: LRUCache, shared=None, enabled: bool = True) -> None:
+        """
+        Initializes a ResponseCache over the given caches.
+
+        Parameters:
+            - local (LRUCache): The in-process cache.
+            - shared (MemoryCacheBackend or Redis or None): The optional shared backend.
+            - enabled (bool): False to bypass the cache entirely.
+
+        Returns:
+            None
+        """
+        self.local = local
+        self.shared = shared
+        self.enabled = enabled
+        self.shared_hits = 0
+        self.shared_misses = 0
+        self.version = 0
+
+        self._lock = threading.Lock()
+
+    def get(self, key: str, version: int):
+        """
+        Retrieve a cached value of a data version.
+
+        Parameters:
+            key (str): The key of the value.
+            version (int): The data version read by the request before its query.
+
+        Returns:
+            The cached value, None if it is not cached.
+        """
+        if not self.enabled:
+            return None
+
+        self._observe_version(version)
+        full_key = f"{CACHE_KEY_PREFIX}{version}:{key}"
+        value = self.local.get(full_key)
+
+        if value is not None or self.shared is None:
+            return value
+
+        payload = self.shared.get(full_key)
+        if payload is None:
+            self.shared_misses += 1
+            return None
+
+        self.shared_hits += 1
+        value = json.loads(payload)
+        self.local.set(full_key, value)
+        return value
+
+    def set(self, key: str, value, version: int) -> None:
+        """
+        Cache a value under the data version read before the query computing it.
+
+        The query sees at least the data of that version, so a value computed while the data
+        changed is never served for a newer version.
+
+        Parameters:
+            key (str): The key of the value.
+            value: The JSON serializable value to cache.
+            version (int): The data version read by the request before its query.
+
+        Returns:
+            None
+        """
+        if not self.enabled or version < self.version:
+            return
+
+        self._observe_version(version)
+        full_key = f"{CACHE_KEY_PREFIX}{version}:{key}"
+        self.local.set(full_key, value)
+
+        if self.shared is not None:
+            self.shared.set(full_key, json.dumps(value), ex=self.local.ttl)
+
+    def _observe_version(self, version: int) -> None:
+        if version <= self.version:
+            return
+
+        with self._lock:
+            if version <= self.version:
+                return
+
+            self.version = version
+
+        self.local.clear()
+
+    def stats(self) -> dict:
+        """
+        Report the cache counters.
+
+        Returns:
+            dict: The size, hits, misses, evictions and expirations of the local cache, the hits and
+                misses of the shared backend and the newest data version seen.
+        """
+        return {
+            "enabled": self.enabled,
+            "version": self.version,
+            "entries": len(self.local),
+            "max_entries": self.local.max_entries,
+            "hits": self.local.hits,
+            "misses": self.local.misses,
+            "evictions": self.local.evictions,
+            "expirations": self.local.expirations,
+            "shared_backend": type(self.shared).__name__ if self.shared is not None else None,
+            "shared_hits": self.shared_hits,
+            "shared_misses": self.shared_misses,
+        }
+
+
+response_cache = ResponseCache(
+    local=LRUCache(CACHE_MAX_ENTRIES, CACHE_TTL),
+    shared=create_shared_backend(CACHE_BACKEND),
+    enabled=CACHE_ENABLED,
+)
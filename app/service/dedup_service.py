@@ -0,0 +1,327 @@
+"""
+Dedup Service Module
+------------------------
+Responsible to keep the ingestion idempotent, skipping the log records already saved.
+
+Records are identified by a natural key, log_id and origin_file by default, backed by a unique
+index. A Bloom filter built from the saved keys sits in front of it: rows it reports as
+definitely new are bulk loaded directly, only the possible duplicates are checked against the
+database and inserted with ON CONFLICT DO NOTHING.
+
+A partitioned table only accepts unique indexes holding its partition key, so the timestamp is
+part of the default key when the log records are partitioned.
+
+Author: Álef Ádonis dos Santos Carlos
+Date: 10/01/2024
+"""
+
+from ..extensions import db
+from ..models.log_record_model import Log, LOG_PARTITIONED, LOG_RECORD_COLUMNS
+from .bulk_loader import bulk_insert_records, insert_rows_ignoring_conflicts
+from .version_service import bump_data_version
+from flask import current_app
+from sqlalchemy import func, text, tuple_
+from sqlalchemy.exc import IntegrityError
+import hashlib
+import math
+import os
+import threading
+
+
+DEDUP_ENABLED = os.environ.get("DEDUP_ENABLED", "1") == "1"
+DEDUP_KEY = tuple(
+    column.strip()
+    for column in os.environ.get(
+        "DEDUP_KEY", "log_id,origin_file,timestamp" if LOG_PARTITIONED else "log_id,origin_file"
+    ).split(",")
+)
+DEDUP_INDEX_NAME = "ux_log_records_dedup_key"
+DEDUP_BLOOM_ERROR_RATE = float(os.environ.get("DEDUP_BLOOM_ERROR_RATE", 0.01))
+DEDUP_BLOOM_MIN_CAPACITY = int(os.environ.get("DEDUP_BLOOM_MIN_CAPACITY", 1_000_000))
+DEDUP_LOOKUP_CHUNK_SIZE = 500
+
+DEDUP_KEY_INDEXES = tuple(LOG_RECORD_COLUMNS.index(column) for column in DEDUP_KEY)
+
+
+class BloomFilter:
+    """
+    A Bloom filter over strings: it never reports a key it contains as absent, and reports an
+    absent key as present with a probability close to its error rate while it holds at most
+    its capacity.
+
+    Attributes:
+        - capacity (int): Number of keys the filter is sized for.
+        - error_rate (float): Target false positive rate at capacity.
+        - count (int): Number of keys added.
+
+    Methods:
+        - add: Adds a key.
+        - might_contain: Checks if a key may have been added.
+    """
+
+    def __init__(self, capacity: int, error_rate: float) -> None:
+        """
+        Initializes an empty BloomFilter sized for the given capacity and error rate.
+
+        Parameters:
+            - capacity (int): Number of keys the filter is sized for.
+            - error_rate (float): Target false positive rate at capacity.
+
+        Returns:
+            None
+        """
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.count = 0
+
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+
+        return [(first + index * second) % self.size for index in range(self.hash_count)]
+
+    def add(self, key: str) -> None:
+        """
+        Add a key to the filter.
+
+        Parameters:
+            key (str): The key to add.
+
+        Returns:
+            None
+        """
+        for position in self._positions(key):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+        self.count += 1
+
+    def might_contain(self, key: str) -> bool:
+        """
+        Check if a key may have been added to the filter.
+
+        Parameters:
+            key (str): The key to check.
+
+        Returns:
+            bool: False if the key was certainly never added, True otherwise.
+        """
+        return all(
+            self._bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(key)
+        )
+
+
+bloom_filter = None
+bloom_filter_lock = threading.Lock()
+
+
+def dedup_key(row: tuple) -> str:
+    """
+    Build the natural key of a row as a single string.
+
+    Parameters:
+        row (tuple): The row, with values in the LOG_RECORD_COLUMNS order.
+
+    Returns:
+        str: The values of the DEDUP_KEY columns joined by a separator.
+    """
+    return "\x1f".join(str(row[index]) for index in DEDUP_KEY_INDEXES)
+
+
+def ensure_dedup_index() -> bool:
+    """
+    Create the unique index over the DEDUP_KEY columns if it does not exist yet.
+
+    Returns:
+        bool: True if the index exists, False if the saved records have duplicates preventing it.
+    """
+    columns = ", ".join(DEDUP_KEY)
+
+    try:
+        with db.engine.begin() as connection:
+            connection.execute(
+                text(
+                    f"CREATE UNIQUE INDEX IF NOT EXISTS {DEDUP_INDEX_NAME} "
+                    f"ON {Log.__tablename__} ({columns})"
+                )
+            )
+        return True
+    except IntegrityError:
+        current_app.logger.warning(
+            "The log records have duplicated (%s) values, "
+            "run `flask dedup-logs` to remove them and create the unique index",
+            columns,
+        )
+        return False
+
+
+def remove_duplicate_log_records() -> int:
+    """
+    Delete the log records whose natural key was already saved, keeping the oldest one.
+
+    Returns:
+        int: Number of records deleted.
+    """
+    key_columns = [getattr(Log, column) for column in DEDUP_KEY]
+    oldest_ids = (
+        db.session.query(func.min(Log.id)).group_by(*key_columns).scalar_subquery()
+    )
+
+    deleted = (
+        db.session.query(Log)
+        .filter(Log.id.not_in(oldest_ids))
+        .delete(synchronize_session=False)
+    )
+    if deleted:
+        bump_data_version()
+    db.session.commit()
+    reset_bloom_filter()
+
+    return deleted
+
+
+def build_bloom_filter() -> BloomFilter:
+    """
+    Build a Bloom filter holding the natural keys of every saved log record.
+
+    The filter is sized for twice the saved records, at least DEDUP_BLOOM_MIN_CAPACITY.
+
+    Returns:
+        BloomFilter: The filled filter.
+    """
+    saved_records = db.session.query(func.count(Log.id)).scalar() or 0
+    new_filter = BloomFilter(
+        max(DEDUP_BLOOM_MIN_CAPACITY, saved_records * 2), DEDUP_BLOOM_ERROR_RATE
+    )
+
+    key_columns = [getattr(Log, column) for column in DEDUP_KEY]
+    for key in db.session.query(*key_columns).yield_per(10000):
+        new_filter.add("\x1f".join(str(value) for value in key))
+
+    return new_filter
+
+
+def get_bloom_filter() -> BloomFilter:
+    """
+    Retrieve the Bloom filter of this process, building it on first use or once it is over capacity.
+
+    Returns:
+        BloomFilter: The filter.
+    """
+    global bloom_filter
+
+    with bloom_filter_lock:
+        if bloom_filter is None or bloom_filter.count > bloom_filter.capacity:
+            bloom_filter = build_bloom_filter()
+
+        return bloom_filter
+
+
+def reset_bloom_filter() -> None:
+    """
+    Drop the Bloom filter of this process, so it is rebuilt from the saved records on next use.
+
+    Returns:
+        None
+    """
+    global bloom_filter
+
+    with bloom_filter_lock:
+        bloom_filter = None
+
+
+def find_saved_keys(rows: list) -> set:
+    """
+    Query which of the natural keys of the given rows are already saved.
+
+    Parameters:
+        rows (List[tuple]): The rows, with values in the LOG_RECORD_COLUMNS order.
+
+    Returns:
+        set: The natural keys already saved.
+    """
+    key_columns = tuple_(*[getattr(Log, column) for column in DEDUP_KEY])
+    keys = list({tuple(row[index] for index in DEDUP_KEY_INDEXES) for row in rows})
+    saved_keys = set()
+
+    for index in range(0, len(keys), DEDUP_LOOKUP_CHUNK_SIZE):
+        chunk = keys[index : index + DEDUP_LOOKUP_CHUNK_SIZE]
+        saved_keys.update(
+            "\x1f".join(str(value) for value in key)
+            for key in db.session.query(*key_columns.clauses).filter(key_columns.in_(chunk))
+        )
+
+    return saved_keys
+
+
+def insert_possible_duplicates(rows: list) -> list:
+    """
+    Insert the rows whose natural key is not saved yet, in the current transaction.
+
+    Parameters:
+        rows (List[tuple]): The rows, with values in the LOG_RECORD_COLUMNS order.
+
+    Returns:
+        List[tuple]: The rows inserted.
+    """
+    saved_keys = find_saved_keys(rows)
+    new_rows = [row for row in rows if dedup_key(row) not in saved_keys]
+
+    if new_rows:
+        insert_rows_ignoring_conflicts(new_rows, DEDUP_KEY)
+
+    return new_rows
+
+
+def insert_new_records(rows: list) -> tuple:
+    """
+    Insert the rows whose natural key was not saved yet, in the current transaction.
+
+    Rows the Bloom filter reports as definitely new are bulk loaded in a savepoint. If one of
+    them turns out to be a duplicate, saved meanwhile by another process, the savepoint is
+    rolled back and they go through the conflict checking path too.
+
+    Parameters:
+        rows (List[tuple]): The rows, with values in the LOG_RECORD_COLUMNS order.
+
+    Returns:
+        tuple: The rows inserted and the number of rows skipped as duplicates.
+    """
+    if not DEDUP_ENABLED:
+        bulk_insert_records(rows)
+        return rows, 0
+
+    filter_ = get_bloom_filter()
+
+    unique_rows = {}
+    for row in rows:
+        unique_rows.setdefault(dedup_key(row), row)
+
+    new_rows = []
+    possible_duplicates = []
+    for key, row in unique_rows.items():
+        if filter_.might_contain(key):
+            possible_duplicates.append(row)
+        else:
+            new_rows.append(row)
+
+    if new_rows:
+        try:
+            with db.session.begin_nested():
+                bulk_insert_records(new_rows)
+        except IntegrityError:
+            possible_duplicates.extend(new_rows)
+            new_rows = []
+
+    if possible_duplicates:
+        new_rows.extend(insert_possible_duplicates(possible_duplicates))
+
+    for row in new_rows:
+        filter_.add(dedup_key(row))
+
+    return new_rows, len(rows) - len(new_rows)
@@ -0,0 +1,360 @@
+"""
+Ingest Pipeline Module
+------------------------
+Responsible to stream parsed log records from the parser workers to the database writer.
+
+The parsers push batches of rows into a bounded queue while the writer drains it, so the
+number of batches held in memory never exceeds PIPELINE_MAX_BATCHES plus one per worker.
+
+Author: Álef Ádonis dos Santos Carlos
+Date: 10/01/2024
+"""
+
+from .log_parser import (
+    PARSER_MODE,
+    PARSER_WORKERS,
+    iter_log_text_chunks,
+    parse_compressed_log_columns,
+    parse_compressed_log_rows,
+    parse_log_chunk,
+    parse_log_chunk_mmap,
+    parse_log_text_rows,
+    split_into_chunks,
+)
+from .manifest_service import FileReadPlan
+from .metrics_service import (
+    ingest_file_parse_seconds,
+    ingest_lines_parsed,
+    ingest_lines_per_second,
+    ingest_queue_depth,
+)
+from collections import deque
+from itertools import repeat
+from typing import Callable, Iterable, NamedTuple
+import concurrent.futures
+import os
+import queue
+import threading
+import time
+
+
+PIPELINE_MAX_BATCHES = int(os.environ.get("PIPELINE_MAX_BATCHES", 4))
+PIPELINE_BATCHES_PER_COMMIT = int(os.environ.get("PIPELINE_BATCHES_PER_COMMIT", 0))
+PIPELINE_POLL_INTERVAL = 0.1
+
+
+def timed_call(function: Callable, *args) -> tuple:
+    """
+    Call a function and measure it, in the worker running it.
+
+    Parameters:
+        function (Callable): The function.
+        *args: Its arguments.
+
+    Returns:
+        tuple: The result of the function and the seconds it took.
+    """
+    started_at = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - started_at
+
+
+class ParsedBatch(NamedTuple):
+    """
+    A batch of rows parsed from a chunk of a log file.
+
+    Attributes:
+        - plan (FileReadPlan): The read plan of the file the rows came from, with the end of
+          the uncompressed lines parsed for a compressed file, None for a streamed file.
+        - rows (list): The parsed rows, with values in the LOG_RECORD_COLUMNS order.
+        - completes_plan (bool): True if this is the last batch of the file.
+        - size (int): Number of bytes of the file the rows were parsed from.
+    """
+
+    plan: FileReadPlan
+    rows: list
+    completes_plan: bool
+    size: int
+
+
+class Extraction:
+    """
+    Holds the state of a single extraction and runs its parsing stage in a background thread.
+
+    Attributes:
+        - read_plans (List[FileReadPlan]): The files with new lines to parse.
+        - idle_plans (List[FileReadPlan]): The files that changed without new complete lines.
+        - transform (Callable): Parses a byte range of a file into rows, used by the thread mode.
+        - parser_mode (str): "process" to parse in a process pool, "mmap" to parse memory-mapped
+          files in a thread pool with parse_log_chunk_mmap, "thread" otherwise.
+        - workers (int): Number of parser workers, the executor default if None.
+        - max_batches (int): Maximum number of parsed batches waiting for the writer.
+
+    Methods:
+        - __init__: Initializes an Extraction with the files to parse.
+        - batches: Starts the parsing stage and yields the parsed batches.
+        - close: Stops the parsing stage.
+    """
+
+    def __init__(
+        self,
+        read_plans: list,
+        idle_plans: list,
+        transform: Callable,
+        parser_mode: str = PARSER_MODE,
+        workers: int = PARSER_WORKERS,
+        max_batches: int = PIPELINE_MAX_BATCHES,
+    ) -> None:
+        """
+        Initializes an Extraction with the files to parse.
+
+        Parameters:
+            - read_plans (List[FileReadPlan]): The files with new lines to parse.
+            - idle_plans (List[FileReadPlan]): The files that changed without new complete lines.
+            - transform (Callable): Parses a byte range of a file into rows, used by the thread mode.
+            - parser_mode (str): "process" to parse in a process pool, "mmap" to parse memory-mapped
+              files in a thread pool with parse_log_chunk_mmap, "thread" otherwise.
+            - workers (int): Number of parser workers, the executor default if None.
+            - max_batches (int): Maximum number of parsed batches waiting for the writer.
+
+        Returns:
+            None
+        """
+        self.read_plans = read_plans
+        self.idle_plans = idle_plans
+        self.transform = transform
+        self.parser_mode = parser_mode
+        self.workers = workers or min(32, (os.cpu_count() or 1) + 4)
+        self.max_batches = max_batches
+
+        self._queue = queue.Queue(maxsize=max(1, max_batches))
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._error = None
+        self._file_parse_times = {}
+
+    def __bool__(self) -> bool:
+        return bool(self.read_plans)
+
+    def batches(self):
+        """
+        Start the parsing stage and yield the parsed batches as soon as they are ready.
+
+        Batches of the same file are yielded in file order.
+
+        Returns:
+            Iterator[ParsedBatch]: The parsed batches.
+
+        Raises:
+            Exception: The error raised by a parser worker, if any.
+        """
+        self._thread = threading.Thread(target=self._produce, daemon=True)
+        self._thread.start()
+
+        while True:
+            batch = self._queue.get()
+
+            if batch is None:
+                break
+
+            ingest_queue_depth.set(self._queue.qsize())
+            yield batch
+
+        if self._error is not None:
+            raise self._error
+
+    def close(self) -> None:
+        """
+        Stop the parsing stage and wait for its thread to finish.
+
+        Returns:
+            None
+        """
+        self._stop_event.set()
+
+        if self._thread is not None:
+            self._thread.join()
+
+    def _tasks(self):
+        for plan in self.read_plans:
+            if plan.compression:
+                # The whole file is a single task decompressed and parsed inside a worker, the
+                # end of its range is only known from the result.
+                parse = (
+                    parse_compressed_log_columns
+                    if self.parser_mode == "process"
+                    else parse_compressed_log_rows
+                )
+                args = (plan.filepath, plan.compression, plan.start)
+                yield plan, plan.read_size, True, parse, args
+                continue
+
+            parse = self._chunk_parser()
+            chunks = split_into_chunks(plan.filepath, plan.start, plan.end)
+
+            for index, (chunk_start, chunk_end) in enumerate(chunks):
+                completes_plan = index == len(chunks) - 1
+                args = (plan.filepath, chunk_start, chunk_end)
+                yield plan, chunk_end - chunk_start, completes_plan, parse, args
+
+    def _chunk_parser(self) -> Callable:
+        if self.parser_mode == "process":
+            return parse_log_chunk
+
+        if self.parser_mode == "mmap":
+            return parse_log_chunk_mmap
+
+        return self.transform
+
+    def _to_batch(
+        self, plan: FileReadPlan, size: int, timed_result: tuple, completes_plan: bool
+    ) -> ParsedBatch:
+        result, seconds = timed_result
+
+        if plan.compression:
+            result, end = result
+            plan = plan._replace(end=end)
+
+        if self.parser_mode == "process":
+            line_count, columns, timestamps = result
+            rows = list(
+                zip(*columns, repeat(plan.file_name, line_count), timestamps, columns[0])
+            )
+        else:
+            rows = result
+
+        self._record_parse_time(plan, len(rows), seconds, completes_plan)
+        return ParsedBatch(plan=plan, rows=rows, completes_plan=completes_plan, size=size)
+
+    def _record_parse_time(
+        self, plan: FileReadPlan, lines: int, seconds: float, completes_plan: bool
+    ) -> None:
+        file_lines, file_seconds = self._file_parse_times.pop(plan.file_name, (0, 0.0))
+        file_lines += lines
+        file_seconds += seconds
+
+        ingest_lines_parsed.inc(lines)
+
+        if not completes_plan:
+            self._file_parse_times[plan.file_name] = (file_lines, file_seconds)
+            return
+
+        ingest_file_parse_seconds.observe(file_seconds)
+        if file_seconds:
+            ingest_lines_per_second.set(round(file_lines / file_seconds, 2))
+
+    def _put(self, item) -> bool:
+        while not self._stop_event.is_set():
+            try:
+                self._queue.put(item, timeout=PIPELINE_POLL_INTERVAL)
+                return True
+            except queue.Full:
+                continue
+
+        return False
+
+    def _produce(self) -> None:
+        if self.parser_mode == "process":
+            executor_class = concurrent.futures.ProcessPoolExecutor
+        else:
+            executor_class = concurrent.futures.ThreadPoolExecutor
+
+        try:
+            with executor_class(max_workers=self.workers) as executor:
+                in_flight = deque()
+
+                for plan, size, completes_plan, parse, args in self._tasks():
+                    in_flight.append(
+                        (plan, size, completes_plan, executor.submit(timed_call, parse, *args))
+                    )
+
+                    if len(in_flight) < self.workers:
+                        continue
+
+                    plan, size, completes_plan, future = in_flight.popleft()
+                    if not self._put(self._to_batch(plan, size, future.result(), completes_plan)):
+                        break
+
+                while in_flight and not self._stop_event.is_set():
+                    plan, size, completes_plan, future = in_flight.popleft()
+                    if not self._put(self._to_batch(plan, size, future.result(), completes_plan)):
+                        break
+
+                for _, _, _, future in in_flight:
+                    future.cancel()
+        except Exception as error:
+            self._error = error
+        finally:
+            self._put(None)
+
+
+class StreamExtraction(Extraction):
+    """
+    Parses a log file received as a stream of blocks, like an uploaded request body.
+
+    The blocks are read, decompressed when the stream is compressed, and cut into chunks of
+    complete lines by the parsing thread as they arrive, so the memory held does not depend on
+    the size of the file. The file is not tracked by the ingestion manifest, its batches never
+    complete a plan.
+
+    Attributes:
+        - blocks (Iterable[bytes]): The blocks of the file, in stream order.
+        - file_name (str): The name of the file, used as origin_file.
+        - chunk_size (int): The approximate number of uncompressed bytes parsed per batch.
+        - bytes_read (int): Number of uncompressed bytes parsed so far.
+    """
+
+    def __init__(
+        self,
+        blocks: Iterable,
+        file_name: str,
+        chunk_size: int = None,
+        max_batches: int = PIPELINE_MAX_BATCHES,
+    ) -> None:
+        """
+        Initializes a StreamExtraction of a file.
+
+        Parameters:
+            - blocks (Iterable[bytes]): The blocks of the file, in stream order.
+            - file_name (str): The name of the file, used as origin_file.
+            - chunk_size (int): The approximate number of uncompressed bytes parsed per batch,
+              PARSER_CHUNK_SIZE if None.
+            - max_batches (int): Maximum number of parsed batches waiting for the writer.
+
+        Returns:
+            None
+        """
+        super().__init__(
+            read_plans=[], idle_plans=[], transform=None, workers=1, max_batches=max_batches
+        )
+        self.blocks = blocks
+        self.file_name = file_name
+        self.chunk_size = chunk_size
+        self.bytes_read = 0
+
+    def __bool__(self) -> bool:
+        return True
+
+    def _produce(self) -> None:
+        file_lines = 0
+        file_seconds = 0.0
+
+        try:
+            for text, start, end in iter_log_text_chunks(self.blocks, self.chunk_size):
+                rows, seconds = timed_call(parse_log_text_rows, text, self.file_name, start, end)
+                file_lines += len(rows)
+                file_seconds += seconds
+                ingest_lines_parsed.inc(len(rows))
+                self.bytes_read = end
+
+                batch = ParsedBatch(plan=None, rows=rows, completes_plan=False, size=end - start)
+                if not self._put(batch):
+                    return
+
+            ingest_file_parse_seconds.observe(file_seconds)
+            if file_seconds:
+                ingest_lines_per_second.set(round(file_lines / file_seconds, 2))
+        except Exception as error:
+            self._error = error
+        finally:
+            self._put(None)
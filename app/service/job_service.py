@@ -0,0 +1,578 @@
+"""
+Job Service Module
+------------------------
+Responsible to run log extractions and deletions in the background and report their progress.
+
+Jobs are queued in a pool of threads, so at most EXTRACTION_JOB_WORKERS extractions and one
+deletion run at the same time, and kept in memory with their progress until the given number
+of newer jobs finished. An extraction job waits while another extraction of the log directory
+holds the extraction lock. A job can be cancelled while queued or running: a running job stops
+after the batch being written. An extraction rolls back the batches it did not commit yet, a
+deletion keeps the batches already deleted.
+
+Author: Álef Ádonis dos Santos Carlos
+Date: 10/01/2024
+"""
+
+from .log_service import (
+    delete_log_records_in_batches,
+    extract_log_records_from_files,
+    extraction_lock,
+    find_log_id_range,
+    save_records_in_database,
+)
+from collections import OrderedDict
+from flask import Flask
+from typing import Callable
+import concurrent.futures
+import os
+import threading
+import time
+import traceback
+import uuid
+
+
+EXTRACTION_JOB_WORKERS = int(os.environ.get("EXTRACTION_JOB_WORKERS", 1))
+EXTRACTION_JOB_MAX_PENDING = int(os.environ.get("EXTRACTION_JOB_MAX_PENDING", 4))
+DELETION_JOB_MAX_PENDING = int(os.environ.get("DELETION_JOB_MAX_PENDING", 4))
+JOB_HISTORY = int(os.environ.get("JOB_HISTORY", 100))
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+JOB_CANCELLED = "cancelled"
+JOB_FINISHED_STATUSES = (JOB_SUCCEEDED, JOB_FAILED, JOB_CANCELLED)
+
+
+class JobCancelled(Exception):
+    """Raised inside a running job to stop it once its cancellation was requested."""
+
+
+class TooManyJobsError(Exception):
+    """Raised when the maximum number of jobs are already queued or running."""
+
+
+class BackgroundJob:
+    """
+    Holds the status of a background job, the subclasses add their own progress.
+
+    Attributes:
+        - id (str): The job identifier.
+        - status (str): queued, running, succeeded, failed or cancelled.
+        - errors (List[str]): The errors that stopped the job.
+        - result (dict): The response of the job once it succeeded.
+
+    Methods:
+        - cancel: Requests the job to stop.
+        - finish: Marks the job as finished.
+        - serialize: Serializes the job status into a dictionary.
+    """
+
+    def __init__(self) -> None:
+        """
+        Initializes a queued BackgroundJob.
+
+        Returns:
+            None
+        """
+        self.id = uuid.uuid4().hex
+        self.status = JOB_QUEUED
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.errors = []
+        self.result = None
+        self.future = None
+
+        self._cancel_event = threading.Event()
+        self._started_clock = None
+        self._lock = threading.Lock()
+
+    @property
+    def cancel_requested(self) -> bool:
+        return self._cancel_event.is_set()
+
+    def check_cancelled(self) -> None:
+        """
+        Stop the job if its cancellation was requested.
+
+        Raises:
+            JobCancelled: If the cancellation of the job was requested.
+        """
+        if self.cancel_requested:
+            raise JobCancelled()
+
+    def _mark_running(self) -> None:
+        self.status = JOB_RUNNING
+        self.started_at = time.time()
+        self._started_clock = time.perf_counter()
+
+    def finish(self, status: str, result: dict = None, error: str = None) -> None:
+        """
+        Mark the job as finished.
+
+        Parameters:
+            status (str): succeeded, failed or cancelled.
+            result (dict): The response of the job, if it succeeded.
+            error (str): The error that stopped the job, if it failed.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self.status = status
+            self.finished_at = time.time()
+            self.result = result
+
+            if error is not None:
+                self.errors.append(error)
+
+    def cancel(self) -> bool:
+        """
+        Request the job to stop, a queued job is cancelled right away.
+
+        Returns:
+            bool: False if the job had already finished.
+        """
+        with self._lock:
+            if self.status in JOB_FINISHED_STATUSES:
+                return False
+
+            self._cancel_event.set()
+
+        if self.future is not None and self.future.cancel():
+            self.finish(JOB_CANCELLED)
+
+        return True
+
+    def _progress(self, elapsed: float) -> dict:
+        return {}
+
+    def serialize(self) -> dict:
+        """
+        Serialize the job status into a dictionary.
+
+        Returns:
+            dict: The status, the timings and the progress of the job.
+        """
+        with self._lock:
+            elapsed = None
+            if self._started_clock is not None:
+                elapsed = (
+                    self.finished_at - self.started_at
+                    if self.finished_at is not None
+                    else time.perf_counter() - self._started_clock
+                )
+
+            return {
+                "id": self.id,
+                "status": self.status,
+                "cancel_requested": self.cancel_requested,
+                "created_at": self.created_at,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+                **self._progress(elapsed),
+                "seconds": round(elapsed, 4) if elapsed is not None else None,
+                "errors": list(self.errors),
+                "result": self.result,
+            }
+
+
+class ExtractionJob(BackgroundJob):
+    """
+    Holds the status and the progress of a background extraction.
+
+    Attributes:
+        - files_total (int): Number of files with new lines to parse.
+        - files_done (int): Number of files fully saved.
+        - bytes_total (int): Number of bytes to parse.
+        - bytes_done (int): Number of bytes parsed and saved.
+        - rows (int): Number of rows parsed.
+        - inserted (int): Number of rows inserted.
+        - skipped (int): Number of rows skipped as duplicates.
+
+    Methods:
+        - start: Marks the job as running over the given files.
+        - report: Records the progress of a written batch.
+    """
+
+    def __init__(self) -> None:
+        """
+        Initializes a queued ExtractionJob.
+
+        Returns:
+            None
+        """
+        super().__init__()
+        self.files_total = 0
+        self.files_done = 0
+        self.bytes_total = 0
+        self.bytes_done = 0
+        self.rows = 0
+        self.inserted = 0
+        self.skipped = 0
+
+    def start(self, read_plans: list) -> None:
+        """
+        Mark the job as running over the given files.
+
+        Parameters:
+            read_plans (List[FileReadPlan]): The files with new lines to parse.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self._mark_running()
+            self.files_total = len(read_plans)
+            self.bytes_total = sum(plan.read_size for plan in read_plans)
+
+    def report(self, batch, inserted: int, skipped: int) -> None:
+        """
+        Record the progress of a written batch, used as the progress callback of save_records_in_database.
+
+        Parameters:
+            batch (ParsedBatch): The batch written.
+            inserted (int): Number of rows of the batch inserted.
+            skipped (int): Number of rows of the batch skipped as duplicates.
+
+        Returns:
+            None
+
+        Raises:
+            JobCancelled: If the cancellation of the job was requested.
+        """
+        with self._lock:
+            self.rows += len(batch.rows)
+            self.inserted += inserted
+            self.skipped += skipped
+            self.bytes_done += batch.size
+
+            if batch.completes_plan:
+                self.files_done += 1
+
+        self.check_cancelled()
+
+    def _progress(self, elapsed: float) -> dict:
+        eta_seconds = None
+        if self.status == JOB_RUNNING and elapsed and self.bytes_done:
+            bytes_per_second = self.bytes_done / elapsed
+            eta_seconds = round((self.bytes_total - self.bytes_done) / bytes_per_second, 1)
+
+        return {
+            "files_done": self.files_done,
+            "files_total": self.files_total,
+            "bytes_done": self.bytes_done,
+            "bytes_total": self.bytes_total,
+            "rows": self.rows,
+            "inserted": self.inserted,
+            "skipped": self.skipped,
+            "rows_per_second": round(self.rows / elapsed, 2) if elapsed else None,
+            "eta_seconds": eta_seconds,
+        }
+
+
+class DeletionJob(BackgroundJob):
+    """
+    Holds the status and the progress of a background deletion.
+
+    Attributes:
+        - filters (dict): The filters of the records to delete.
+        - first_id (int): The lowest ID matching the filters when the job started.
+        - last_id (int): The highest ID matching the filters when the job started.
+        - current_id (int): The highest ID the deleted batches reached.
+        - deleted (int): Number of records deleted.
+        - batches (int): Number of batches committed.
+
+    Methods:
+        - start: Marks the job as running over an ID range.
+        - report: Records the progress of a deleted batch.
+    """
+
+    def __init__(self, filters: dict) -> None:
+        """
+        Initializes a queued DeletionJob.
+
+        Parameters:
+            filters (dict): The filters returned by parse_log_filters.
+
+        Returns:
+            None
+        """
+        super().__init__()
+        self.filters = filters
+        self.first_id = None
+        self.last_id = None
+        self.current_id = None
+        self.deleted = 0
+        self.batches = 0
+
+    def start(self, first_id: int, last_id: int) -> None:
+        """
+        Mark the job as running over an ID range.
+
+        Parameters:
+            first_id (int): The lowest ID matching the filters, None if no record matches.
+            last_id (int): The highest ID matching the filters, None if no record matches.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self._mark_running()
+            self.first_id = first_id
+            self.last_id = last_id
+
+    def report(self, deleted: int, upper_id: int) -> None:
+        """
+        Record the progress of a deleted batch, used as the progress callback of delete_log_records_in_batches.
+
+        Parameters:
+            deleted (int): Number of records of the batch deleted.
+            upper_id (int): The highest ID of the batch.
+
+        Returns:
+            None
+
+        Raises:
+            JobCancelled: If the cancellation of the job was requested.
+        """
+        with self._lock:
+            self.deleted += deleted
+            self.batches += 1
+            self.current_id = upper_id
+
+        self.check_cancelled()
+
+    def _progress(self, elapsed: float) -> dict:
+        fraction_done = None
+        if self.first_id is not None and self.current_id is not None:
+            fraction_done = (self.current_id - self.first_id + 1) / (self.last_id - self.first_id + 1)
+
+        eta_seconds = None
+        if self.status == JOB_RUNNING and elapsed and fraction_done:
+            eta_seconds = round(elapsed * (1 - fraction_done) / fraction_done, 1)
+
+        return {
+            "filters": {name: str(value) for name, value in self.filters.items()},
+            "deleted": self.deleted,
+            "batches": self.batches,
+            "first_id": self.first_id,
+            "last_id": self.last_id,
+            "current_id": self.current_id,
+            "percent_done": round(fraction_done * 100, 1) if fraction_done is not None else None,
+            "rows_per_second": round(self.deleted / elapsed, 2) if elapsed else None,
+            "eta_seconds": eta_seconds,
+        }
+
+
+class JobManager:
+    """
+    Queues the jobs of a kind in a thread pool and keeps track of them.
+
+    Attributes:
+        - job_class (type): The class of the jobs, built with the arguments given to submit.
+        - runner (Callable): Runs a job to completion, called with the application and the job.
+        - workers (int): Maximum number of jobs running at the same time.
+        - max_pending (int): Maximum number of jobs queued or running.
+        - history (int): Number of finished jobs kept.
+
+    Methods:
+        - submit: Queues a new job.
+        - get: Retrieves a job by ID.
+        - list: Retrieves every job kept, newest first.
+        - cancel: Requests a job to stop.
+    """
+
+    def __init__(
+        self, job_class: type, runner: Callable, workers: int, max_pending: int, history: int
+    ) -> None:
+        """
+        Initializes a JobManager, the thread pool is only created on the first job.
+
+        Parameters:
+            - job_class (type): The class of the jobs, built with the arguments given to submit.
+            - runner (Callable): Runs a job to completion, called with the application and the job.
+            - workers (int): Maximum number of jobs running at the same time.
+            - max_pending (int): Maximum number of jobs queued or running.
+            - history (int): Number of finished jobs kept.
+
+        Returns:
+            None
+        """
+        self.job_class = job_class
+        self.runner = runner
+        self.workers = max(1, workers)
+        self.max_pending = max(1, max_pending)
+        self.history = history
+
+        self._jobs = OrderedDict()
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def submit(self, app: Flask, *args) -> BackgroundJob:
+        """
+        Queue a new job.
+
+        Parameters:
+            app (Flask): The Flask application the job runs in.
+            *args: The arguments of the job class.
+
+        Returns:
+            BackgroundJob: The queued job.
+
+        Raises:
+            TooManyJobsError: If max_pending jobs are already queued or running.
+        """
+        with self._lock:
+            pending = [
+                job for job in self._jobs.values() if job.status not in JOB_FINISHED_STATUSES
+            ]
+            if len(pending) >= self.max_pending:
+                raise TooManyJobsError(
+                    f"There are already {len(pending)} jobs queued or running"
+                )
+
+            if self._executor is None:
+                self._executor = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=self.workers,
+                    thread_name_prefix=self.job_class.__name__,
+                )
+
+            job = self.job_class(*args)
+            self._jobs[job.id] = job
+            self._forget_finished_jobs()
+
+            job.future = self._executor.submit(self.runner, app, job)
+
+        return job
+
+    def get(self, job_id: str) -> BackgroundJob:
+        """
+        Retrieve a job by ID.
+
+        Parameters:
+            job_id (str): The ID of the job.
+
+        Returns:
+            BackgroundJob or None: The job, None if it is unknown.
+        """
+        return self._jobs.get(job_id)
+
+    def list(self) -> list:
+        """
+        Retrieve every job kept, newest first.
+
+        Returns:
+            List[BackgroundJob]: The jobs.
+        """
+        with self._lock:
+            return list(reversed(self._jobs.values()))
+
+    def cancel(self, job_id: str):
+        """
+        Request a job to stop.
+
+        Parameters:
+            job_id (str): The ID of the job.
+
+        Returns:
+            bool or None: None if the job is unknown, False if it had already finished, True otherwise.
+        """
+        job = self.get(job_id)
+
+        if job is None:
+            return None
+
+        return job.cancel()
+
+    def _forget_finished_jobs(self) -> None:
+        finished = [job for job in self._jobs.values() if job.status in JOB_FINISHED_STATUSES]
+
+        for job in finished[: max(0, len(finished) - self.history)]:
+            del self._jobs[job.id]
+
+
+def run_job(app: Flask, job: BackgroundJob, work: Callable) -> None:
+    """
+    Run a job to completion in an application context, recording its outcome in the job.
+
+    Parameters:
+        app (Flask): The Flask application the job runs in.
+        job (BackgroundJob): The job to run.
+        work (Callable): Does the work of the job and returns its result.
+
+    Returns:
+        None
+    """
+    with app.app_context():
+        try:
+            job.check_cancelled()
+            job.finish(JOB_SUCCEEDED, work())
+        except JobCancelled:
+            job.finish(JOB_CANCELLED)
+        except Exception as error:
+            traceback.print_exc()
+            job.finish(JOB_FAILED, error=f"{type(error).__name__}: {error}")
+
+
+def run_extraction_job(app: Flask, job: ExtractionJob) -> None:
+    """
+    Run an extraction job to completion, once no other extraction of the log directory is running.
+
+    Parameters:
+        app (Flask): The Flask application the job runs in.
+        job (ExtractionJob): The job to run.
+
+    Returns:
+        None
+    """
+
+    def extract() -> dict:
+        with extraction_lock(while_waiting=job.check_cancelled):
+            extraction = extract_log_records_from_files()
+
+            if not extraction:
+                job.start([])
+                return {"message": "There was no logs to extract"}
+
+            job.start(extraction.read_plans)
+            return save_records_in_database(extraction, progress=job.report)
+
+    run_job(app, job, extract)
+
+
+def run_deletion_job(app: Flask, job: DeletionJob) -> None:
+    """
+    Run a deletion job to completion.
+
+    Parameters:
+        app (Flask): The Flask application the job runs in.
+        job (DeletionJob): The job to run.
+
+    Returns:
+        None
+    """
+
+    def delete() -> dict:
+        job.start(*find_log_id_range(job.filters))
+        return delete_log_records_in_batches(job.filters, progress=job.report)
+
+    run_job(app, job, delete)
+
+
+extraction_jobs = JobManager(
+    ExtractionJob,
+    run_extraction_job,
+    workers=EXTRACTION_JOB_WORKERS,
+    max_pending=EXTRACTION_JOB_MAX_PENDING,
+    history=JOB_HISTORY,
+)
+deletion_jobs = JobManager(
+    DeletionJob,
+    run_deletion_job,
+    workers=1,
+    max_pending=DELETION_JOB_MAX_PENDING,
+    history=JOB_HISTORY,
+)
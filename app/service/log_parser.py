@@ -0,0 +1,647 @@
+"""
+Log Parser Module
+------------------------
+Responsible to parse byte ranges of log files into compact column lists or row tuples.
+
+The functions of this module do not depend on the application or the database, so they can
+run inside the worker processes of a ProcessPoolExecutor. Files compressed with gzip, bzip2
+or xz are detected by their magic bytes, and decompressed as a stream and parsed inside a
+worker, with the offsets counted on the uncompressed stream.
+
+Author: Álef Ádonis dos Santos Carlos
+Date: 10/01/2024
+"""
+
+from datetime import datetime
+from typing import Iterable, Optional
+import bz2
+import lzma
+import mmap
+import os
+import sys
+import zlib
+
+
+PARSER_MODE = os.environ.get("PARSER_MODE", "mmap")
+PARSER_WORKERS = int(os.environ.get("PARSER_WORKERS", 0)) or None
+PARSER_CHUNK_SIZE = int(os.environ.get("PARSER_CHUNK_SIZE", 16 * 1024 * 1024))
+
+DECOMPRESSION_BLOCK_SIZE = 1024 * 1024
+
+COMPRESSION_MAGIC_NUMBERS = (
+    (b"\x1f\x8b", "gzip"),
+    (b"BZh", "bz2"),
+    (b"\xfd7zXZ\x00", "xz"),
+)
+COMPRESSION_DECOMPRESSORS = {
+    "gzip": lambda: zlib.decompressobj(16 + zlib.MAX_WBITS),
+    "bz2": bz2.BZ2Decompressor,
+    "xz": lzma.LZMADecompressor,
+}
+
+FIELDS_PER_LINE = 8
+INTERNED_FIELDS = (1, 3, 4)
+
+MONTHS = {
+    name: number
+    for number, name in enumerate(
+        ("Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"),
+        start=1,
+    )
+}
+
+
+def parse_log_timestamp(date: str, hour: str, date_cache: dict = None) -> datetime:
+    """
+    Parse the date (dd-Mon-yyyy) and hour (h:mm:ss.fff) of a log record into a datetime.
+
+    Parameters:
+        date (str): The date of the log record.
+        hour (str): The hour of the log record.
+        date_cache (dict): Already parsed dates, shared between calls to skip parsing repeated dates.
+
+    Returns:
+        datetime or None: The moment of the event, None if the date or hour is malformed.
+    """
+    try:
+        if date_cache is not None and date in date_cache:
+            year, month, day = date_cache[date]
+        else:
+            day, month_name, year = date.split("-")
+            year, month, day = int(year), MONTHS[month_name], int(day)
+
+            if date_cache is not None:
+                date_cache[date] = (year, month, day)
+
+        hours, minutes, seconds = hour.split(":")
+        seconds, _, fraction = seconds.partition(".")
+
+        return datetime(
+            year,
+            month,
+            day,
+            int(hours),
+            int(minutes),
+            int(seconds),
+            int(fraction.ljust(6, "0")[:6]) if fraction else 0,
+        )
+    except (ValueError, KeyError):
+        return None
+
+
+def iso_date_prefix(date: str):
+    """
+    Convert the date of a log record (dd-Mon-yyyy) into the prefix of an ISO datetime (yyyy-mm-ddT).
+
+    Parameters:
+        date (str): The date of the log record.
+
+    Returns:
+        str or None: The prefix, None if the date is malformed.
+    """
+    try:
+        day, month_name, year = date.split("-")
+        return f"{int(year):04d}-{MONTHS[month_name]:02d}-{int(day):02d}T"
+    except (ValueError, KeyError):
+        return None
+
+
+def split_into_chunks(filepath: str, start: int, end: int, chunk_size: int = None) -> list:
+    """
+    Split a byte range of a file into chunks that start and end on line boundaries.
+
+    Parameters:
+        filepath (str): The path to the log file.
+        start (int): The byte offset where the range starts, at the beginning of a line.
+        end (int): The byte offset where the range ends, right after a line break.
+        chunk_size (int): The approximate size in bytes of each chunk, PARSER_CHUNK_SIZE if None.
+
+    Returns:
+        List[tuple]: The (start, end) offsets of each chunk.
+    """
+    chunk_size = chunk_size or PARSER_CHUNK_SIZE
+    chunks = []
+
+    with open(filepath, "rb") as file:
+        chunk_start = start
+
+        while chunk_start < end:
+            boundary = chunk_start + chunk_size
+
+            if boundary >= end:
+                chunks.append((chunk_start, end))
+                break
+
+            file.seek(boundary - 1)
+            file.readline()
+            chunk_end = min(file.tell(), end)
+
+            chunks.append((chunk_start, chunk_end))
+            chunk_start = chunk_end
+
+    return chunks
+
+
+def parse_log_chunk(filepath: str, start: int, end: int) -> tuple:
+    """
+    Parse a byte range of a log file into column lists.
+
+    Parameters:
+        filepath (str): The path to the log file.
+        start (int): The byte offset where the range starts, at the beginning of a line.
+        end (int): The byte offset where the range ends, right after a line break.
+
+    Returns:
+        tuple: The number of lines parsed, one list per field of the line in the LOG_RECORD_COLUMNS order and
+            the list of parsed timestamps.
+    """
+    with open(filepath, "rb") as file:
+        file.seek(start)
+        text = file.read(end - start).decode("utf-8")
+
+    return parse_log_text_columns(text, filepath, start, end)
+
+
+def parse_log_text_columns(text: str, filepath: str, start: int, end: int) -> tuple:
+    """
+    Parse the lines read from a log file into column lists.
+
+    Repeated values of the date, software_name and version columns share the same string
+    object, so they are pickled only once when the result is sent back by a worker process.
+
+    Parameters:
+        text (str): The decoded lines.
+        filepath (str): The path to the log file, used in the error messages.
+        start (int): The offset where the lines start, used in the error messages.
+        end (int): The offset where the lines end, used in the error messages.
+
+    Returns:
+        tuple: The number of lines parsed, one list per field of the line in the LOG_RECORD_COLUMNS order and
+            the list of parsed timestamps.
+    """
+    records = [line.split(";") for line in text.split("\n") if line]
+
+    if not records:
+        return 0, tuple([] for _ in range(FIELDS_PER_LINE)), []
+
+    if any(len(record) < FIELDS_PER_LINE for record in records):
+        raise ValueError(f"Malformed log record in {filepath} between bytes {start} and {end}")
+
+    columns = [list(column) for column in zip(*records)][:FIELDS_PER_LINE]
+
+    interned = {}
+    for field in INTERNED_FIELDS:
+        columns[field] = [interned.setdefault(value, value) for value in columns[field]]
+
+    date_cache = {}
+    timestamps = [
+        parse_log_timestamp(date, hour, date_cache)
+        for date, hour in zip(columns[1], columns[2])
+    ]
+
+    return len(records), tuple(columns), timestamps
+
+
+def parse_log_chunk_mmap(filepath: str, start: int, end: int) -> list:
+    """
+    Parse a byte range of a memory-mapped log file into row tuples, ready for the insert path.
+
+    The lines and fields are split on the bytes of the mapping, without decoding the range
+    first. The date, software_name and version fields repeat across lines, so each distinct
+    value is decoded once and looked up by its bytes afterwards, only the other fields are
+    decoded line by line. The timestamp is read by datetime.fromisoformat like in
+    parse_log_text_rows.
+
+    Parameters:
+        filepath (str): The path to the log file.
+        start (int): The byte offset where the range starts, at the beginning of a line.
+        end (int): The byte offset where the range ends, right after a line break.
+
+    Returns:
+        List[tuple]: The parsed rows, with values in the LOG_RECORD_COLUMNS order.
+
+    Raises:
+        ValueError: If a line has less than FIELDS_PER_LINE fields or is not valid UTF-8.
+    """
+    if end <= start:
+        return []
+
+    with open(filepath, "rb") as file, mmap.mmap(
+        file.fileno(), 0, access=mmap.ACCESS_READ
+    ) as mapped_file:
+        data = mapped_file[start:end]
+
+    origin_file = sys.intern(os.path.basename(filepath))
+    values = {}
+    get_value = values.get
+    set_value = values.setdefault
+    dates = {}
+    from_iso_format = datetime.fromisoformat
+    rows = []
+    append = rows.append
+
+    for line in data.split(b"\n"):
+        if not line:
+            continue
+
+        fields = line.split(b";")
+        if len(fields) != FIELDS_PER_LINE:
+            if len(fields) < FIELDS_PER_LINE:
+                raise ValueError(
+                    f"Malformed log record in {filepath} between bytes {start} and {end}"
+                )
+
+            fields = fields[:FIELDS_PER_LINE]
+
+        ip_address, date, hour, software_name, version, log_id, title, description = fields
+
+        cached_date = dates.get(date)
+        if cached_date is None:
+            decoded_date = date.decode()
+            cached_date = dates[date] = (decoded_date, iso_date_prefix(decoded_date))
+        date, prefix = cached_date
+
+        software_name = get_value(software_name) or set_value(software_name, software_name.decode())
+        version = get_value(version) or set_value(version, version.decode())
+        ip_address = ip_address.decode()
+        hour = hour.decode()
+
+        try:
+            timestamp = from_iso_format(prefix + ("0" + hour if hour[1:2] == ":" else hour))
+        except (ValueError, TypeError):
+            timestamp = parse_log_timestamp(date, hour)
+
+        append(
+            (
+                ip_address,
+                date,
+                hour,
+                software_name,
+                version,
+                log_id.decode(),
+                title.decode(),
+                description.decode(),
+                origin_file,
+                timestamp,
+                ip_address,
+            )
+        )
+
+    return rows
+
+
+def parse_log_text_rows(text: str, filepath: str, start: int, end: int) -> list:
+    """
+    Parse the lines read from a log file into row tuples, ready for the insert path.
+
+    Each line is split once. The timestamp is read by datetime.fromisoformat from the ISO
+    prefix of the date, cached per distinct date, and the hour, falling back to
+    parse_log_timestamp for the hours it does not accept. Repeated values of the date,
+    software_name, version and origin_file columns share the same string object.
+
+    Parameters:
+        text (str): The decoded lines.
+        filepath (str): The path to the log file, its name is the origin_file of the rows.
+        start (int): The offset where the lines start, used in the error messages.
+        end (int): The offset where the lines end, used in the error messages.
+
+    Returns:
+        List[tuple]: The parsed rows, with values in the LOG_RECORD_COLUMNS order.
+
+    Raises:
+        ValueError: If a line has less than FIELDS_PER_LINE fields.
+    """
+    origin_file = sys.intern(os.path.basename(filepath))
+    interned = {}
+    intern = interned.setdefault
+    dates = {}
+    from_iso_format = datetime.fromisoformat
+    rows = []
+    append = rows.append
+
+    for line in text.split("\n"):
+        if not line:
+            continue
+
+        fields = line.split(";")
+        if len(fields) != FIELDS_PER_LINE:
+            if len(fields) < FIELDS_PER_LINE:
+                raise ValueError(
+                    f"Malformed log record in {filepath} between bytes {start} and {end}"
+                )
+
+            fields = fields[:FIELDS_PER_LINE]
+
+        ip_address, date, hour, software_name, version, log_id, title, description = fields
+
+        cached_date = dates.get(date)
+        if cached_date is None:
+            cached_date = dates[date] = (intern(date, date), iso_date_prefix(date))
+        date, prefix = cached_date
+
+        try:
+            timestamp = from_iso_format(prefix + ("0" + hour if hour[1:2] == ":" else hour))
+        except (ValueError, TypeError):
+            timestamp = parse_log_timestamp(date, hour)
+
+        append(
+            (
+                ip_address,
+                date,
+                hour,
+                intern(software_name, software_name),
+                intern(version, version),
+                log_id,
+                title,
+                description,
+                origin_file,
+                timestamp,
+                ip_address,
+            )
+        )
+
+    return rows
+
+
+def detect_compression(filepath: str) -> Optional[str]:
+    """
+    Detect the compression of a file from its magic bytes.
+
+    Parameters:
+        filepath (str): The path to the file.
+
+    Returns:
+        str or None: "gzip", "bz2" or "xz", None for a plain file.
+    """
+    with open(filepath, "rb") as file:
+        header = file.read(max(len(magic) for magic, _ in COMPRESSION_MAGIC_NUMBERS))
+
+    return detect_header_compression(header)
+
+
+def detect_header_compression(header: bytes) -> Optional[str]:
+    """
+    Detect the compression of a stream from its first bytes.
+
+    Parameters:
+        header (bytes): The first bytes of the stream.
+
+    Returns:
+        str or None: "gzip", "bz2" or "xz", None for plain data.
+    """
+    for magic, compression in COMPRESSION_MAGIC_NUMBERS:
+        if header.startswith(magic):
+            return compression
+
+    return None
+
+
+def decompress_blocks(blocks: Iterable, compression: str, allow_truncated: bool = False):
+    """
+    Decompress a stream of compressed blocks incrementally.
+
+    Each output block holds at most DECOMPRESSION_BLOCK_SIZE bytes, however much a block of
+    input expands. Streams made of several concatenated members, like the output of pigz or
+    pbzip2, are decompressed member after member.
+
+    Parameters:
+        blocks (Iterable[bytes]): The compressed blocks, in stream order.
+        compression (str): "gzip", "bz2" or "xz", as returned by detect_header_compression.
+        allow_truncated (bool): True to end quietly when the stream stops in the middle of a
+            member, like a file that is still being compressed.
+
+    Returns:
+        Iterator[bytes]: The decompressed blocks.
+
+    Raises:
+        ValueError: If the stream is corrupted, or ends in the middle of a member and
+            allow_truncated is False.
+    """
+    new_decompressor = COMPRESSION_DECOMPRESSORS[compression]
+    decompressor = new_decompressor()
+
+    try:
+        for block in blocks:
+            while True:
+                if decompressor.eof:
+                    if not block:
+                        break
+                    decompressor = new_decompressor()
+
+                data = decompressor.decompress(block, DECOMPRESSION_BLOCK_SIZE)
+                if data:
+                    yield data
+
+                if decompressor.eof:
+                    block = decompressor.unused_data
+                elif compression == "gzip":
+                    block = decompressor.unconsumed_tail
+                    if not block:
+                        break
+                elif decompressor.needs_input:
+                    break
+                else:
+                    block = b""
+    except (OSError, EOFError, zlib.error, lzma.LZMAError) as error:
+        raise ValueError(f"Invalid {compression} stream: {error}")
+
+    if not decompressor.eof and not allow_truncated:
+        raise ValueError(f"The {compression} stream ended before its last member was complete")
+
+
+def iter_line_chunks(
+    data_blocks: Iterable, chunk_size: int, start: int = 0, keep_partial_line: bool = True
+):
+    """
+    Cut a stream of uncompressed blocks into chunks of complete lines.
+
+    At most one chunk and one block are held in memory at a time.
+
+    Parameters:
+        data_blocks (Iterable[bytes]): The uncompressed blocks, in stream order.
+        chunk_size (int): The approximate size in bytes of a chunk.
+        start (int): The offset of the first block in the uncompressed stream.
+        keep_partial_line (bool): True to yield the last line even if the stream does not end
+            with a newline, False to leave it out.
+
+    Returns:
+        Iterator[tuple]: The decoded text of each chunk and its start and end offsets in the
+            uncompressed stream.
+    """
+    pending = []
+    pending_size = 0
+
+    for block in data_blocks:
+        pending.append(block)
+        pending_size += len(block)
+
+        if pending_size < chunk_size:
+            continue
+
+        cut = block.rfind(b"\n") + 1
+        if not cut:
+            continue
+
+        data = b"".join(pending)
+        length = pending_size - len(block) + cut
+
+        yield data[:length].decode("utf-8"), start, start + length
+        start += length
+        pending = [block[cut:]]
+        pending_size = len(block) - cut
+
+    if not pending_size:
+        return
+
+    data = b"".join(pending)
+    length = len(data) if keep_partial_line else data.rfind(b"\n") + 1
+
+    if length:
+        yield data[:length].decode("utf-8"), start, start + length
+
+
+def iter_log_text_chunks(blocks: Iterable, chunk_size: int = None):
+    """
+    Cut a stream of log file blocks, compressed or not, into chunks of complete lines.
+
+    The compression is detected from the first bytes of the stream. At most one chunk and one
+    decompressed block are held in memory at a time, and the last line is kept even if the
+    stream does not end with a newline.
+
+    Parameters:
+        blocks (Iterable[bytes]): The blocks of the file, in stream order.
+        chunk_size (int): The approximate size in bytes of a chunk, PARSER_CHUNK_SIZE if None.
+
+    Returns:
+        Iterator[tuple]: The decoded text of each chunk and its start and end offsets in the
+            uncompressed stream.
+
+    Raises:
+        ValueError: If the stream is compressed and corrupted.
+    """
+    header_size = max(len(magic) for magic, _ in COMPRESSION_MAGIC_NUMBERS)
+    blocks = iter(blocks)
+
+    header = b""
+    for block in blocks:
+        header += block
+        if len(header) >= header_size:
+            break
+
+    def stream():
+        yield header
+        yield from blocks
+
+    compression = detect_header_compression(header)
+    data_blocks = decompress_blocks(stream(), compression) if compression else stream()
+
+    yield from iter_line_chunks(data_blocks, chunk_size or PARSER_CHUNK_SIZE)
+
+
+def iter_compressed_log_chunks(filepath: str, compression: str, start: int, chunk_size: int = None):
+    """
+    Cut the complete lines of a compressed log file after an offset of the uncompressed stream into chunks.
+
+    The file is read and decompressed as a stream, in blocks of DECOMPRESSION_BLOCK_SIZE,
+    and each chunk is yielded as soon as it is decompressed, so at most one chunk and one
+    block are held in memory at a time. The last line is left out if it does not end with a
+    newline, and a file whose stream was cut short, like one that is still being compressed,
+    is read up to its last complete line.
+
+    Parameters:
+        filepath (str): The path to the log file.
+        compression (str): The compression of the file, as returned by detect_compression.
+        start (int): The uncompressed offset where the reading starts, at the beginning of a line.
+        chunk_size (int): The approximate size in bytes of a chunk, PARSER_CHUNK_SIZE if None.
+
+    Returns:
+        Iterator[tuple]: The decoded text of each chunk and its start and end offsets in the
+            uncompressed stream.
+
+    Raises:
+        ValueError: If the file is corrupted.
+    """
+    with open(filepath, "rb") as file:
+        def skip(data_blocks):
+            remaining = start
+            for block in data_blocks:
+                if remaining >= len(block):
+                    remaining -= len(block)
+                    continue
+
+                yield block[remaining:]
+                remaining = 0
+
+        blocks = iter(lambda: file.read(DECOMPRESSION_BLOCK_SIZE), b"")
+        data_blocks = skip(decompress_blocks(blocks, compression, allow_truncated=True))
+
+        yield from iter_line_chunks(
+            data_blocks, chunk_size or PARSER_CHUNK_SIZE, start, keep_partial_line=False
+        )
+
+
+def parse_compressed_log_columns(filepath: str, compression: str, start: int) -> tuple:
+    """
+    Decompress a compressed log file after an offset of its uncompressed stream and parse its complete lines into column lists.
+
+    It runs inside a parser worker, so the compressed files of an extraction are decompressed
+    in parallel and only their columns are sent back. The file is decompressed and parsed one
+    chunk at a time, so its whole text is never held in memory.
+
+    Parameters:
+        filepath (str): The path to the log file.
+        compression (str): The compression of the file, as returned by detect_compression.
+        start (int): The uncompressed offset where the reading starts, at the beginning of a line.
+
+    Returns:
+        tuple: The number of lines parsed, one list per field of the line in the LOG_RECORD_COLUMNS
+            order and the list of parsed timestamps, as returned by parse_log_text_columns,
+            and the uncompressed offset right after the last complete line.
+
+    Raises:
+        ValueError: If the file is corrupted or a line is malformed.
+    """
+    line_count = 0
+    columns = tuple([] for _ in range(FIELDS_PER_LINE))
+    timestamps = []
+    end = start
+
+    for text, chunk_start, end in iter_compressed_log_chunks(filepath, compression, start):
+        chunk_line_count, chunk_columns, chunk_timestamps = parse_log_text_columns(
+            text, filepath, chunk_start, end
+        )
+        line_count += chunk_line_count
+        timestamps.extend(chunk_timestamps)
+
+        for column, chunk_column in zip(columns, chunk_columns):
+            column.extend(chunk_column)
+
+    return (line_count, columns, timestamps), end
+
+
+def parse_compressed_log_rows(filepath: str, compression: str, start: int) -> tuple:
+    """
+    Decompress a compressed log file after an offset of its uncompressed stream and parse its complete lines into row tuples.
+
+    It runs inside a parser thread, the decompressors release the GIL while they work, so the
+    compressed files of an extraction are decompressed in parallel.
+
+    Parameters:
+        filepath (str): The path to the log file.
+        compression (str): The compression of the file, as returned by detect_compression.
+        start (int): The uncompressed offset where the reading starts, at the beginning of a line.
+
+    Returns:
+        tuple: The parsed rows, with values in the LOG_RECORD_COLUMNS order, and the
+            uncompressed offset right after the last complete line.
+
+    Raises:
+        ValueError: If the file is corrupted or a line is malformed.
+    """
+    rows = []
+    end = start
+
+    for text, chunk_start, end in iter_compressed_log_chunks(filepath, compression, start):
+        rows.extend(parse_log_text_rows(text, filepath, chunk_start, end))
+
+    return rows, end
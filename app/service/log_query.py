@@ -0,0 +1,177 @@
+"""
+Log Query Module
+------------------------
+Responsible to validate the listing parameters and build the filtered log record queries.
+
+Author: Álef Ádonis dos Santos Carlos
+Date: 10/01/2024
+"""
+
+from ..models.log_record_model import Log
+from sqlalchemy import and_, or_
+from datetime import date, datetime, time, timedelta
+import base64
+import binascii
+import json
+
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+EQUALITY_FILTERS = ("ip_address", "software_name", "version", "origin_file")
+EQUALITY_FILTER_COLUMNS = {
+    "ip_address": "ip",
+    "software_name": "software_name",
+    "version": "version",
+    "origin_file": "origin_file",
+}
+DATE_FILTERS = ("date_from", "date_to")
+DATE_FORMATS = ("%d-%b-%Y", "%Y-%m-%d")
+
+
+def parse_date(value: str) -> date:
+    """
+    Parse a date given as dd-Mon-yyyy, the format used by the log files, or as yyyy-mm-dd.
+
+    Parameters:
+        value (str): The date to parse.
+
+    Returns:
+        date: The parsed date.
+
+    Raises:
+        ValueError: If the value is not in one of the accepted formats.
+    """
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, date_format).date()
+        except ValueError:
+            continue
+
+    raise ValueError(f"Invalid date '{value}', expected dd-Mon-yyyy or yyyy-mm-dd")
+
+
+def parse_log_filters(args) -> dict:
+    """
+    Extract the log record filters from the request arguments.
+
+    Parameters:
+        args (MultiDict): The request query arguments.
+
+    Returns:
+        dict: The filters given, date filters converted to dates.
+
+    Raises:
+        ValueError: If a date filter is invalid.
+    """
+    filters = {name: args[name] for name in EQUALITY_FILTERS if args.get(name)}
+
+    for name in DATE_FILTERS:
+        if args.get(name):
+            filters[name] = parse_date(args[name])
+
+    return filters
+
+
+def parse_page_size(value) -> int:
+    """
+    Validate the requested page size.
+
+    Parameters:
+        value (str or None): The limit argument of the request.
+
+    Returns:
+        int: The page size, DEFAULT_PAGE_SIZE if no limit was given.
+
+    Raises:
+        ValueError: If the limit is not an integer between 1 and MAX_PAGE_SIZE.
+    """
+    if value in (None, ""):
+        return DEFAULT_PAGE_SIZE
+
+    try:
+        limit = int(value)
+    except ValueError:
+        raise ValueError(f"Invalid limit '{value}'")
+
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise ValueError(f"The limit must be between 1 and {MAX_PAGE_SIZE}")
+
+    return limit
+
+
+def encode_cursor(last_id: int) -> str:
+    """
+    Build the opaque cursor pointing after the given log record id.
+
+    Parameters:
+        last_id (int): The id of the last log record of a page.
+
+    Returns:
+        str: The cursor of the next page.
+    """
+    payload = json.dumps({"id": last_id}).encode("utf-8")
+    return base64.urlsafe_b64encode(payload).decode("ascii")
+
+
+def decode_cursor(cursor) -> int:
+    """
+    Read the log record id of an opaque cursor.
+
+    Parameters:
+        cursor (str or None): The cursor argument of the request.
+
+    Returns:
+        int: The id after which the page starts, 0 if no cursor was given.
+
+    Raises:
+        ValueError: If the cursor is invalid.
+    """
+    if not cursor:
+        return 0
+
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return int(payload["id"])
+    except (binascii.Error, UnicodeError, ValueError, KeyError, TypeError):
+        raise ValueError("Invalid cursor")
+
+
+def apply_log_filters(query, filters: dict):
+    """
+    Restrict a log record query to the given filters.
+
+    The IP address and the date range are compared with the typed ip and timestamp columns,
+    so they are answered by index range scans. The records without an ip, saved before the
+    backfill or holding an invalid address, are matched on their ip_address text instead.
+
+    Parameters:
+        query (Query): The log record query.
+        filters (dict): The filters returned by parse_log_filters.
+
+    Returns:
+        Query: The filtered query.
+    """
+    for name in EQUALITY_FILTERS:
+        if name not in filters:
+            continue
+
+        if name == "ip_address":
+            query = query.filter(
+                or_(
+                    Log.ip == filters[name],
+                    and_(Log.ip.is_(None), Log.ip_address == filters[name]),
+                )
+            )
+        else:
+            query = query.filter(getattr(Log, EQUALITY_FILTER_COLUMNS[name]) == filters[name])
+
+    if "date_from" in filters:
+        query = query.filter(Log.timestamp >= datetime.combine(filters["date_from"], time.min))
+
+    if "date_to" in filters:
+        query = query.filter(
+            Log.timestamp < datetime.combine(filters["date_to"] + timedelta(days=1), time.min)
+        )
+
+    return query
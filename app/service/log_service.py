@@ -8,125 +8,584 @@ Date: 10/01/2024
 """
 
 from ..extensions import db
+from ..models.ingestion_manifest_model import IngestionManifest
 from ..models.log_record_model import Log
-import concurrent.futures
+from ..models.log_rollup_model import LogRollup
+from ..models.log_sketch_model import LogSketch
+from .analytics_service import analytics_engine
+from .cache_service import response_cache
+from .dedup_service import insert_new_records, reset_bloom_filter
+from .ingest_pipeline import Extraction, PIPELINE_BATCHES_PER_COMMIT, StreamExtraction
+from .log_parser import parse_log_timestamp
+from .log_query import apply_log_filters, decode_cursor, encode_cursor
+from .manifest_service import (
+    clear_manifest,
+    load_manifest,
+    plan_file_read,
+    update_manifest,
+)
+from .metrics_service import (
+    ingest_batch_write_seconds,
+    ingest_commit_seconds,
+    ingest_plan_seconds,
+    ingest_rows_committed,
+    ingest_rows_skipped,
+)
+from .partition_service import prepare_partitioned_rows
+from .rollup_service import apply_rollup_deltas, clear_rollups, count_rollups, rollup_keys
+from .sketch_service import SketchBuffer, clear_sketches, refresh_sketches, sketch_pair
+from .version_service import bump_data_version, get_data_version, read_version_number
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from sqlalchemy import func, text
+from typing import Callable, Iterable
+import json
 import os
+import threading
+import time
 
 
 DIR_PATH = os.environ.get("LOG_PATH")
-extracted_logs = []
+EXPORT_BATCH_SIZE = int(os.environ.get("EXPORT_BATCH_SIZE", 1000))
+EXPORT_FORMATS = ("ndjson", "json")
+DELETE_BATCH_SIZE = int(os.environ.get("DELETE_BATCH_SIZE", 5000))
+MULTI_GET_MAX_IDS = int(os.environ.get("MULTI_GET_MAX_IDS", 1000))
+MULTI_GET_CHUNK_SIZE = 1000
+UPLOAD_READ_SIZE = int(os.environ.get("UPLOAD_READ_SIZE", 256 * 1024))
+UPLOAD_CHUNK_SIZE = int(os.environ.get("UPLOAD_CHUNK_SIZE", 4 * 1024 * 1024))
+UPLOAD_BATCHES_PER_COMMIT = int(os.environ.get("UPLOAD_BATCHES_PER_COMMIT", 16))
+EXTRACTION_LOCK_KEY = 7_320_517_414
+EXTRACTION_LOCK_POLL_INTERVAL = float(os.environ.get("EXTRACTION_LOCK_POLL_INTERVAL", 1))
 
+extraction_thread_lock = threading.Lock()
 
-def transform_log_records_to_object(filepath: str) -> None:
+
+class ExtractionInProgressError(Exception):
+    """Raised when an extraction of the log directory is already running."""
+
+
+def transform_log_records_to_object(filepath: str, start: int = 0, end: int = None) -> list:
     """
-    Transform log records from a file into Log objects and append them to the extracted_logs list.
+    Transform log records from a byte range of a file into row tuples.
+
+    The values of each row follow the LOG_RECORD_COLUMNS order.
 
     Parameters:
         filepath (str): The path to the log file.
+        start (int): The byte offset where the reading starts.
+        end (int): The byte offset where the reading stops, the end of the file if None.
 
     Returns:
-        None
+        List[tuple]: The parsed rows.
     """
-    global extracted_logs
+    origin_file = os.path.basename(filepath)
+    log_records = []
+    date_cache = {}
 
-    with open(filepath, "r", encoding="utf-8") as file:
-        for line in file:
+    with open(filepath, "rb") as file:
+        file.seek(start)
+        remaining = end - start if end is not None else None
+
+        for raw_line in file:
+            if remaining is not None:
+                if remaining <= 0:
+                    break
+                remaining -= len(raw_line)
+
+            line = raw_line.decode("utf-8")
             record = line.rstrip("\n").split(";")
 
-            log_record = Log(
-                ip_address=record[0],
-                date=record[1],
-                hour=record[2],
-                software_name=record[3],
-                version=record[4],
-                log_id=record[5],
-                title=record[6],
-                description=record[7],
-                origin_file=filepath.split("/")[-1],
+            log_record = (
+                record[0],
+                record[1],
+                record[2],
+                record[3],
+                record[4],
+                record[5],
+                record[6],
+                record[7],
+                origin_file,
+                parse_log_timestamp(record[1], record[2], date_cache),
+                record[0],
             )
 
-            extracted_logs.append(log_record)
+            log_records.append(log_record)
+
+    return log_records
 
 
-def extract_log_records_from_files() -> bool:
+def try_extraction_lock(connection) -> bool:
     """
-    Extract log records from multiple files in parallel and store them in the extracted_logs list.
+    Try to take the lock of the extractions without waiting.
+
+    Parameters:
+        connection (Connection): The connection holding the advisory lock on PostgreSQL, None
+            for the lock of the current process.
 
     Returns:
-        bool: True if log records were successfully extracted, False otherwise.
+        bool: True if the lock was taken.
     """
-    filepath_list = []
-    for file_ in os.listdir(DIR_PATH):
-        filepath = os.path.join(DIR_PATH, file_)
-        filepath_list.append(filepath)
+    if connection is None:
+        return extraction_thread_lock.acquire(blocking=False)
 
-    if not filepath_list:
-        return False
+    return connection.execute(
+        text("SELECT pg_try_advisory_lock(:key)"), {"key": EXTRACTION_LOCK_KEY}
+    ).scalar()
 
-    with concurrent.futures.ThreadPoolExecutor() as executor:
-        futures = [
-            executor.submit(transform_log_records_to_object, log_path)
-            for log_path in filepath_list
-        ]
 
-        results = [
-            future.result() for future in concurrent.futures.as_completed(futures)
-        ]
+@contextmanager
+def extraction_lock(while_waiting: Callable = None):
+    """
+    Hold the lock of the extractions of the log directory, so they do not plan the same manifest ranges.
 
-    return True
+    On PostgreSQL it is a session advisory lock held by a dedicated connection of the pool, so it
+    is shared by every process using the database, like the API workers and the watch-logs
+    command. On the other dialects it is a lock of the current process.
 
+    Parameters:
+        while_waiting (Callable): Called every EXTRACTION_LOCK_POLL_INTERVAL seconds while another
+            extraction holds the lock, an exception raised by it stops waiting. None to fail
+            right away.
 
-def save_records_in_database():
+    Raises:
+        ExtractionInProgressError: If another extraction holds the lock and while_waiting is None.
+    """
+    with ExitStack() as stack:
+        connection = None
+        if db.engine.dialect.name == "postgresql":
+            connection = stack.enter_context(db.engine.connect())
+
+        while not try_extraction_lock(connection):
+            if while_waiting is None:
+                raise ExtractionInProgressError(
+                    "An extraction of the log directory is already running"
+                )
+
+            while_waiting()
+            time.sleep(EXTRACTION_LOCK_POLL_INTERVAL)
+
+        try:
+            yield
+        finally:
+            if connection is None:
+                extraction_thread_lock.release()
+            else:
+                connection.execute(
+                    text("SELECT pg_advisory_unlock(:key)"), {"key": EXTRACTION_LOCK_KEY}
+                )
+
+
+def extract_log_records_from_files(file_names: Iterable = None) -> Extraction:
     """
-    Save log records in batches to the database.
+    Plan the extraction of the log records that were added to the files since the last extraction.
+
+    Only the lines added since the last extraction are read, based on the ingestion manifest.
+    Files that were not touched are left alone and rotated or truncated files are read again.
+    The caller holds the extraction_lock until the extraction is saved.
+    The files are only parsed when the returned extraction is saved, with PARSER_MODE set to
+    "process" they are split in chunks parsed by a pool of PARSER_WORKERS processes, otherwise
+    by a pool of threads, with the bytes-level memory-mapped parser unless PARSER_MODE is
+    "thread". Compressed
+    files are handed whole to the same pool, each worker decompresses one as a stream and parses it
+    chunk by chunk, so the compressed files are decompressed in parallel and each is saved in a
+    single batch.
+
+    Parameters:
+        file_names (Iterable): The names of the files of DIR_PATH to check, all of them if None.
 
     Returns:
-        List[dict]: Serialized log records of the last batch saved.
+        Extraction or None: The extraction holding the files to parse, None if there was nothing new to extract.
     """
-    global extracted_logs
+    started_at = time.perf_counter()
+    manifest = load_manifest()
+
+    read_plans = []
+    for file_ in os.listdir(DIR_PATH) if file_names is None else file_names:
+        filepath = os.path.join(DIR_PATH, file_)
 
-    for index in range(0, len(extracted_logs), 200):
-        batch_logs = extracted_logs[index : min(index + 200, len(extracted_logs))]
+        if not os.path.isfile(filepath):
+            continue
 
-        db.session.add_all(batch_logs)
+        read_plan = plan_file_read(filepath, manifest.get(file_))
+        if read_plan is not None:
+            read_plans.append(read_plan)
+
+    extraction = Extraction(
+        read_plans=[plan for plan in read_plans if plan.compression or plan.end > plan.start],
+        idle_plans=[plan for plan in read_plans if not plan.compression and plan.end <= plan.start],
+        transform=transform_log_records_to_object,
+    )
+    ingest_plan_seconds.observe(time.perf_counter() - started_at)
+
+    if not extraction:
+        update_manifest(extraction.idle_plans)
         db.session.commit()
+        return None
 
-    saved_logs = [log.serialize() for log in extracted_logs[:6]]
-    extracted_logs = []
-    return saved_logs
+    return extraction
 
 
-def get_log_by_id(id: str):
+def commit_records(completed_plans: list, rows: int):
     """
-    Retrieve a log record from the database by ID.
+    Commit the inserted log records together with the manifest offsets of the files they completed.
+
+    Parameters:
+        completed_plans (List[FileReadPlan]): The plans of the files fully inserted.
+        rows (int): Number of log records inserted since the previous commit.
+
+    Returns:
+        int or None: The data version created by the commit, None if no record was inserted.
+    """
+    started_at = time.perf_counter()
+    update_manifest(completed_plans)
+    version = bump_data_version() if rows else None
+    db.session.commit()
+
+    ingest_commit_seconds.observe(time.perf_counter() - started_at)
+    ingest_rows_committed.inc(rows)
+    return version
+
+
+def save_records_in_database(
+    extraction: Extraction, progress: Callable = None, batches_per_commit: int = None
+) -> dict:
+    """
+    Parse the files of an extraction and save their log records in the database as they are parsed.
+
+    Every batches_per_commit parsed batches are committed together with the manifest offsets
+    of the files they completed, zero keeps the whole extraction in a single transaction.
+    Records whose natural key is already saved are skipped, the sketches of the inserted ones are
+    updated before each commit, and the committed ones are fed to the analytics engine if it was
+    loaded when the extraction started. Each commit increments the data version, so the cached
+    pages see the committed batches without waiting for the end of the extraction.
+
+    Parameters:
+        extraction (Extraction): The extraction returned by extract_log_records_from_files,
+            or a StreamExtraction.
+        progress (Callable): Called after each batch is written with the batch, the rows inserted
+            and the rows skipped. An exception raised by it rolls back the uncommitted batches and
+            stops the extraction.
+        batches_per_commit (int): Number of batches per transaction, PIPELINE_BATCHES_PER_COMMIT
+            if None.
+
+    Returns:
+        dict: Serialized first log records saved, number of rows parsed, inserted and skipped as
+            duplicates, and the rows per second.
+    """
+    if batches_per_commit is None:
+        batches_per_commit = PIPELINE_BATCHES_PER_COMMIT
+
+    last_id = db.session.query(func.max(Log.id)).scalar() or 0
+    started_at = time.perf_counter()
+
+    rows_parsed = 0
+    rows_inserted = 0
+    rows_skipped = 0
+    completed_plans = list(extraction.idle_plans)
+    uncommitted_batches = 0
+    uncommitted_rows = 0
+    uncommitted_records = []
+    analytics_version = analytics_engine.version
+    sketch_buffer = SketchBuffer()
+
+    try:
+        for batch in extraction.batches():
+            write_started_at = time.perf_counter()
+            rows = prepare_partitioned_rows(batch.rows)
+            inserted_rows, skipped = insert_new_records(rows)
+            apply_rollup_deltas(count_rollups(inserted_rows))
+            sketch_buffer.add(inserted_rows)
+            ingest_batch_write_seconds.observe(time.perf_counter() - write_started_at)
+            ingest_rows_skipped.inc(skipped)
+
+            rows_parsed += len(batch.rows)
+            rows_inserted += len(inserted_rows)
+            rows_skipped += skipped
+            uncommitted_rows += len(inserted_rows)
+
+            if analytics_version is not None:
+                uncommitted_records.extend(inserted_rows)
+
+            if progress is not None:
+                progress(batch, len(inserted_rows), skipped)
+
+            if batch.completes_plan:
+                completed_plans.append(batch.plan)
+
+            uncommitted_batches += 1
+            if batches_per_commit and uncommitted_batches >= batches_per_commit:
+                sketch_buffer.flush()
+                version = commit_records(completed_plans, uncommitted_rows)
+                analytics_engine.feed(uncommitted_records, analytics_version)
+                analytics_version = analytics_engine.follow_version(analytics_version, version)
+                completed_plans = []
+                uncommitted_batches = 0
+                uncommitted_rows = 0
+                uncommitted_records = []
+
+        sketch_buffer.flush()
+        version = commit_records(completed_plans, uncommitted_rows)
+        analytics_engine.feed(uncommitted_records, analytics_version)
+        analytics_engine.follow_version(analytics_version, version)
+    except:
+        db.session.rollback()
+        raise
+    finally:
+        extraction.close()
+
+    elapsed = time.perf_counter() - started_at
+
+    saved_logs = [
+        log.serialize()
+        for log in Log.query.filter(Log.id > last_id).order_by(Log.id).limit(6)
+    ]
+
+    return {
+        "data": saved_logs,
+        "rows": rows_parsed,
+        "inserted": rows_inserted,
+        "skipped": rows_skipped,
+        "seconds": round(elapsed, 4),
+        "rows_per_second": round(rows_parsed / elapsed, 2) if elapsed else None,
+    }
+
+
+def save_uploaded_log_file(stream, file_name: str) -> dict:
+    """
+    Parse a log file received as a stream, compressed or not, and save its log records as it arrives.
+
+    The stream is read in blocks of UPLOAD_READ_SIZE bytes and parsed in chunks of about
+    UPLOAD_CHUNK_SIZE uncompressed bytes, so neither the file nor its rows are held whole in
+    memory or written to disk. Every UPLOAD_BATCHES_PER_COMMIT chunks are committed, the
+    chunks committed before an error stay saved and are skipped as duplicates if the file is
+    sent again.
+
+    Parameters:
+        stream: A binary file-like object with the content of the file, like the request stream.
+        file_name (str): The name of the file, saved as the origin_file of its records.
+
+    Returns:
+        dict: The result of save_records_in_database, with the file name and the number of
+            uncompressed bytes read.
+
+    Raises:
+        ValueError: If the file name is invalid, or the file is malformed or badly compressed.
+    """
+    file_name = (file_name or "").strip()
+    max_length = Log.__table__.c.origin_file.type.length
+
+    if not file_name or "/" in file_name or "\\" in file_name or len(file_name) > max_length:
+        raise ValueError(
+            f"The file name is required, without a path and at most {max_length} characters"
+        )
+
+    extraction = StreamExtraction(
+        iter(lambda: stream.read(UPLOAD_READ_SIZE), b""), file_name, UPLOAD_CHUNK_SIZE
+    )
+    result = save_records_in_database(extraction, batches_per_commit=UPLOAD_BATCHES_PER_COMMIT)
+    result["file"] = file_name
+    result["bytes"] = extraction.bytes_read
+    return result
+
+
+def get_log_by_id(id: str, version: int = None):
+    """
+    Retrieve a log record from the database by ID, through the response cache.
 
     Parameters:
         id (str): The ID of the log record to retrieve.
+        version (int): The data version read by the request before the query, read again if None.
 
     Returns:
         dict or None: Serialized log record if found, None otherwise.
     """
+    if version is None and response_cache.enabled:
+        version = read_version_number()
+
+    cache_key = f"log:{id}"
+    cached_record = response_cache.get(cache_key, version)
+
+    if cached_record is not None:
+        return cached_record
+
     log_record = Log.query.filter_by(id=id).first()
 
     if log_record is not None:
-        return log_record.serialize()
+        serialized_record = log_record.serialize()
+        response_cache.set(cache_key, serialized_record, version)
+        return serialized_record
     else:
         return None
 
 
-def get_all_logs_from_database():
+def get_logs_by_ids(ids: list, version: int = None) -> dict:
     """
-    Retrieve all log records from the database.
+    Retrieve many log records from the database by ID, through the response cache.
+
+    The records missing from the cache are read with one IN query per MULTI_GET_CHUNK_SIZE IDs.
+
+    Parameters:
+        ids (list): The IDs of the log records to retrieve, at most MULTI_GET_MAX_IDS.
+        version (int): The data version read by the request before the query, read again if None.
 
     Returns:
-        List[dict]: Serialized list of all log records in the database.
+        dict: The serialized log records in the order of the IDs, None for the IDs not found,
+            and the list of IDs not found.
+
+    Raises:
+        ValueError: If the IDs are not a list of integers or there are too many of them.
     """
-    return [log.serialize() for log in Log.query.all()]
+    if not isinstance(ids, list):
+        raise ValueError("The ids must be a list")
+
+    if len(ids) > MULTI_GET_MAX_IDS:
+        raise ValueError(f"At most {MULTI_GET_MAX_IDS} ids can be retrieved at once")
+
+    try:
+        keys = [str(int(id)) for id in ids]
+    except (TypeError, ValueError):
+        raise ValueError("The ids must be integers")
+
+    records = {}
+    missing_ids = []
+    if version is None and response_cache.enabled:
+        version = read_version_number()
+
+    for key in dict.fromkeys(keys):
+        cached_record = response_cache.get(f"log:{key}", version)
+
+        if cached_record is not None:
+            records[key] = cached_record
+        else:
+            missing_ids.append(int(key))
+
+    for index in range(0, len(missing_ids), MULTI_GET_CHUNK_SIZE):
+        chunk = missing_ids[index : index + MULTI_GET_CHUNK_SIZE]
+
+        for log_record in Log.query.filter(Log.id.in_(chunk)):
+            serialized_record = log_record.serialize()
+            records[serialized_record["id"]] = serialized_record
+            response_cache.set(f"log:{serialized_record['id']}", serialized_record, version)
+
+    return {
+        "data": [records.get(key) for key in keys],
+        "not_found": [key for key in dict.fromkeys(keys) if key not in records],
+    }
+
+
+def get_all_logs_from_database(
+    filters: dict = None, limit: int = None, cursor: str = None, version: int = None
+) -> dict:
+    """
+    Retrieve a page of log records from the database, ordered by ID.
+
+    The pages are read with keyset pagination, each page starts right after the ID encoded
+    in the cursor, so its cost does not depend on how deep it is. Pages are kept in the
+    response cache.
+
+    Parameters:
+        filters (dict): The filters returned by parse_log_filters.
+        limit (int): The maximum number of log records in the page, all of them if None.
+        cursor (str): The cursor returned with the previous page, None for the first page.
+        version (int): The data version read by the request before the query, read again if None.
+
+    Returns:
+        dict: Serialized log records of the page and the cursor of the next page, None if it is the last one.
+
+    Raises:
+        ValueError: If the cursor or a filter is invalid.
+    """
+    query = apply_log_filters(Log.query, filters or {})
+    query = query.filter(Log.id > decode_cursor(cursor)).order_by(Log.id)
+
+    if limit is None:
+        return {"data": [log.serialize() for log in query], "next_cursor": None}
+
+    cache_key = "logs:" + json.dumps(
+        {"filters": filters or {}, "limit": limit, "cursor": cursor},
+        sort_keys=True,
+        default=str,
+    )
+    if version is None and response_cache.enabled:
+        version = read_version_number()
+
+    cached_page = response_cache.get(cache_key, version)
+
+    if cached_page is not None:
+        return cached_page
+
+    logs = query.limit(limit + 1).all()
+    next_cursor = encode_cursor(logs[limit - 1].id) if len(logs) > limit else None
+
+    page = {
+        "data": [log.serialize() for log in logs[:limit]],
+        "next_cursor": next_cursor,
+    }
+    response_cache.set(cache_key, page, version)
+    return page
+
+
+def warm_up_log_queries() -> None:
+    """
+    Run the queries of the read endpoints once, without the response cache, so their
+    statements are in the compiled cache of the engine before the first request.
+
+    Returns:
+        None
+    """
+    try:
+        get_data_version()
+        Log.query.filter_by(id=0).first()
+        Log.query.filter(Log.id.in_([0])).all()
+        apply_log_filters(Log.query, {}).filter(Log.id > 0).order_by(Log.id).limit(1).all()
+    finally:
+        db.session.rollback()
+
+
+def stream_logs_from_database(filters: dict = None, output_format: str = "ndjson"):
+    """
+    Stream the log records from the database, ordered by ID, as JSON text chunks.
+
+    The rows are read from a server-side cursor EXPORT_BATCH_SIZE at a time, so the memory
+    used does not depend on the number of records exported.
+
+    Parameters:
+        filters (dict): The filters returned by parse_log_filters.
+        output_format (str): "ndjson" for one JSON object per line or "json" for a single JSON array.
+
+    Returns:
+        Iterator[str]: The chunks of the export.
+
+    Raises:
+        ValueError: If the format or a filter is invalid.
+    """
+    if output_format not in EXPORT_FORMATS:
+        raise ValueError(f"Invalid format '{output_format}', expected one of {', '.join(EXPORT_FORMATS)}")
+
+    query = apply_log_filters(Log.query, filters or {}).order_by(Log.id)
+    query = query.yield_per(EXPORT_BATCH_SIZE)
+
+    def generate_ndjson():
+        for log in query:
+            yield json.dumps(log.serialize()) + "\n"
+
+    def generate_json():
+        separator = "\n"
+        yield "["
+        for log in query:
+            yield separator + json.dumps(log.serialize())
+            separator = ",\n"
+        yield "\n]\n"
+
+    if output_format == "json":
+        return generate_json()
+
+    return generate_ndjson()
 
 
 def delete_log_record_by_id(id: str):
     """
-    Delete a log record from the database by ID.
+    Delete a log record from the database by ID, decrementing the rollup counters it was part of.
 
     Parameters:
         id (str): The ID of the log record to delete.
@@ -135,7 +594,18 @@ def delete_log_record_by_id(id: str):
         None
     """
     try:
-        db.session.query(Log).filter(Log.id == id).delete()
+        log_record = (
+            db.session.query(Log.software_name, Log.version, Log.timestamp, Log.ip_address)
+            .filter(Log.id == id)
+            .first()
+        )
+
+        if log_record is not None:
+            db.session.query(Log).filter(Log.id == id).delete()
+            apply_rollup_deltas(Counter({key: -1 for key in rollup_keys(*log_record)}))
+            refresh_sketches({sketch_pair(log_record.software_name, log_record.timestamp)} - {None})
+            bump_data_version()
+
         db.session.commit()
 
     except:
@@ -143,10 +613,106 @@ def delete_log_record_by_id(id: str):
         raise Exception
 
 
+def find_log_id_range(filters: dict = None) -> tuple:
+    """
+    Find the lowest and highest IDs of the log records matching the filters.
+
+    Parameters:
+        filters (dict): The filters returned by parse_log_filters.
+
+    Returns:
+        tuple: The lowest and the highest ID, both None if no record matches.
+    """
+    query = apply_log_filters(db.session.query(func.min(Log.id), func.max(Log.id)), filters or {})
+    return tuple(query.one())
+
+
+def delete_log_records_in_batches(
+    filters: dict, batch_size: int = None, progress: Callable = None
+) -> dict:
+    """
+    Delete the log records matching the filters in batches of consecutive IDs, committing each batch.
+
+    Each batch deletes the next batch_size matching records by primary key range and decrements
+    their rollup counters in its own short transaction, so the extraction and the reads are
+    only blocked for one batch at a time. The manifest is kept, the deleted lines are not read
+    again by the next extraction.
+
+    Parameters:
+        filters (dict): The filters returned by parse_log_filters.
+        batch_size (int): Number of records deleted per transaction, DELETE_BATCH_SIZE if None.
+        progress (Callable): Called after each committed batch with the number of records deleted
+            and the highest ID reached. An exception raised by it stops the deletion, the
+            batches committed stay deleted.
+
+    Returns:
+        dict: Number of records deleted, number of batches and the seconds it took.
+    """
+    batch_size = batch_size or DELETE_BATCH_SIZE
+    started_at = time.perf_counter()
+    deleted = 0
+    batches = 0
+
+    first_id, last_id = find_log_id_range(filters)
+    lower_id = first_id - 1 if first_id is not None else None
+
+    try:
+        while last_id is not None and lower_id < last_id:
+            upper_id = (
+                apply_log_filters(db.session.query(Log.id), filters)
+                .filter(Log.id > lower_id)
+                .order_by(Log.id)
+                .offset(batch_size - 1)
+                .limit(1)
+                .scalar()
+            ) or last_id
+
+            rollup_deltas = Counter()
+            sketch_pairs = set()
+            batch_records = apply_log_filters(
+                db.session.query(Log.software_name, Log.version, Log.timestamp, Log.ip_address),
+                filters,
+            ).filter(Log.id > lower_id, Log.id <= upper_id)
+
+            for log_record in batch_records:
+                rollup_deltas.subtract(rollup_keys(*log_record))
+                sketch_pairs.add(sketch_pair(log_record.software_name, log_record.timestamp))
+
+            batch_deleted = (
+                apply_log_filters(db.session.query(Log), filters)
+                .filter(Log.id > lower_id, Log.id <= upper_id)
+                .delete(synchronize_session=False)
+            )
+            apply_rollup_deltas(rollup_deltas)
+            refresh_sketches(sketch_pairs - {None})
+            bump_data_version()
+            db.session.commit()
+
+            deleted += batch_deleted
+            batches += 1
+            lower_id = upper_id
+
+            if progress is not None:
+                progress(batch_deleted, upper_id)
+    except:
+        db.session.rollback()
+        raise
+
+    return {
+        "data": deleted,
+        "batches": batches,
+        "seconds": round(time.perf_counter() - started_at, 4),
+    }
+
+
 def delete_all_log_records_from_database() -> int:
     """
     Delete all log records from the database.
 
+    The ingestion manifest is cleared as well, so the next extraction reads the files again,
+    together with the rollup counters and the sketches. On PostgreSQL the tables are truncated
+    and the IDs restart from one, instead of deleting every row.
+
     Returns:
         int: Number of rows deleted.
 
@@ -154,8 +720,23 @@ def delete_all_log_records_from_database() -> int:
         Exception: If an error occurs during deletion.
     """
     try:
-        num_rows_deleted = db.session.query(Log).delete()
+        if db.engine.dialect.name == "postgresql":
+            num_rows_deleted = db.session.query(func.count(Log.id)).scalar()
+            db.session.execute(
+                text(
+                    f"TRUNCATE TABLE {Log.__tablename__}, {LogRollup.__tablename__}, "
+                    f"{LogSketch.__tablename__}, {IngestionManifest.__tablename__} RESTART IDENTITY"
+                )
+            )
+        else:
+            num_rows_deleted = db.session.query(Log).delete()
+            clear_manifest()
+            clear_rollups()
+            clear_sketches()
+
+        bump_data_version()
         db.session.commit()
+        reset_bloom_filter()
         return num_rows_deleted
     except:
         db.session.rollback()
@@ -0,0 +1,271 @@
+"""
+Manifest Service Module
+------------------------
+Responsible to decide which part of each log file still has to be read and to keep
+the ingestion manifest updated.
+
+Author: Álef Ádonis dos Santos Carlos
+Date: 10/01/2024
+"""
+
+from ..extensions import db
+from ..models.ingestion_manifest_model import IngestionManifest
+from .log_parser import detect_compression
+from typing import NamedTuple, Optional
+import hashlib
+import os
+
+
+FINGERPRINT_SIZE = 4096
+TAIL_SCAN_SIZE = 64 * 1024
+
+
+class FileReadPlan(NamedTuple):
+    """
+    Describes the byte range of a log file that has to be read in an extraction.
+
+    Attributes:
+        - filepath (str): The path to the log file.
+        - file_name (str): The name of the log file, used as origin_file.
+        - start (int): The byte offset where the reading starts.
+        - end (int): The byte offset right after the last complete line of the file, None for a
+          compressed file until it is parsed.
+        - inode (int): The inode of the file when it was planned.
+        - size (int): The size in bytes of the file when it was planned.
+        - mtime_ns (int): The modification time in nanoseconds of the file when it was planned.
+        - fingerprint (str): A hash of the first bytes of the file up to the end offset.
+        - compression (str): "gzip", "bz2" or "xz" for a compressed file, whose offsets are
+          counted on the uncompressed stream, None for a plain file.
+    """
+
+    filepath: str
+    file_name: str
+    start: int
+    end: int
+    inode: int
+    size: int
+    mtime_ns: int
+    fingerprint: str
+    compression: Optional[str] = None
+
+    @property
+    def read_size(self) -> int:
+        """
+        Number of bytes of the file that have to be read, the whole file if it is compressed.
+        """
+        if self.compression:
+            return self.size
+
+        return self.end - self.start
+
+
+def compute_fingerprint(filepath: str, length: int) -> str:
+    """
+    Compute a hash of the first bytes of a file.
+
+    Parameters:
+        filepath (str): The path to the file.
+        length (int): The number of bytes to hash.
+
+    Returns:
+        str: The hexadecimal digest of the first bytes of the file.
+    """
+    with open(filepath, "rb") as file:
+        return hashlib.sha1(file.read(length)).hexdigest()
+
+
+def find_last_line_end(filepath: str, start: int, size: int) -> int:
+    """
+    Find the offset right after the last line break of a file, ignoring an incomplete last line.
+
+    Parameters:
+        filepath (str): The path to the file.
+        start (int): The offset before which the search stops.
+        size (int): The size in bytes of the file.
+
+    Returns:
+        int: The offset right after the last line break, or start if there is no complete line after it.
+    """
+    position = size
+
+    with open(filepath, "rb") as file:
+        while position > start:
+            block_start = max(start, position - TAIL_SCAN_SIZE)
+            file.seek(block_start)
+            block = file.read(position - block_start)
+            line_break = block.rfind(b"\n")
+
+            if line_break != -1:
+                return block_start + line_break + 1
+
+            position = block_start
+
+    return start
+
+
+def load_manifest() -> dict:
+    """
+    Retrieve the ingestion manifest from the database.
+
+    Returns:
+        dict: Manifest entries indexed by file name.
+    """
+    return {entry.file_name: entry for entry in IngestionManifest.query.all()}
+
+
+def plan_file_read(filepath: str, entry: Optional[IngestionManifest]) -> Optional[FileReadPlan]:
+    """
+    Decide which byte range of a log file has to be read based on its manifest entry.
+
+    Files that were not touched since the last extraction are not opened at all. Files that
+    were truncated or rotated, detected by a different inode, a smaller size or a different
+    fingerprint, are read again from the start. Compressed files are fingerprinted on their
+    compressed bytes, and the end of their range is only known once they are decompressed.
+
+    Parameters:
+        filepath (str): The path to the log file.
+        entry (IngestionManifest or None): The manifest entry of the file, if there is one.
+
+    Returns:
+        FileReadPlan or None: The range to read, None if the file is unchanged.
+    """
+    stat = os.stat(filepath)
+
+    if (
+        entry is not None
+        and entry.inode == stat.st_ino
+        and entry.size == stat.st_size
+        and entry.mtime_ns == stat.st_mtime_ns
+    ):
+        return None
+
+    compression = detect_compression(filepath)
+    if compression:
+        return plan_compressed_file_read(filepath, entry, stat, compression)
+
+    start = 0
+    if (
+        entry is not None
+        and entry.inode == stat.st_ino
+        and entry.offset <= stat.st_size
+        and entry.fingerprint
+        == compute_fingerprint(filepath, min(FINGERPRINT_SIZE, entry.offset))
+    ):
+        start = entry.offset
+
+    end = find_last_line_end(filepath, start, stat.st_size)
+
+    if entry is not None and start >= FINGERPRINT_SIZE:
+        fingerprint = entry.fingerprint
+    else:
+        fingerprint = compute_fingerprint(filepath, min(FINGERPRINT_SIZE, end))
+
+    return FileReadPlan(
+        filepath=filepath,
+        file_name=os.path.basename(filepath),
+        start=start,
+        end=end,
+        inode=stat.st_ino,
+        size=stat.st_size,
+        mtime_ns=stat.st_mtime_ns,
+        fingerprint=fingerprint,
+    )
+
+
+def plan_compressed_file_read(
+    filepath: str, entry: Optional[IngestionManifest], stat: os.stat_result, compression: str
+) -> FileReadPlan:
+    """
+    Decide where the reading of a compressed log file starts based on its manifest entry.
+
+    The reading resumes from the uncompressed offset of the entry if the file only grew since,
+    e.g. a stream that was still being compressed.
+
+    Parameters:
+        filepath (str): The path to the log file.
+        entry (IngestionManifest or None): The manifest entry of the file, if there is one.
+        stat (os.stat_result): The status of the file.
+        compression (str): The compression of the file.
+
+    Returns:
+        FileReadPlan: The range to read, with no end.
+    """
+    start = 0
+    if (
+        entry is not None
+        and entry.inode == stat.st_ino
+        and entry.size <= stat.st_size
+        and entry.fingerprint
+        == compute_fingerprint(filepath, min(FINGERPRINT_SIZE, entry.size))
+    ):
+        start = entry.offset
+
+    return FileReadPlan(
+        filepath=filepath,
+        file_name=os.path.basename(filepath),
+        start=start,
+        end=None,
+        inode=stat.st_ino,
+        size=stat.st_size,
+        mtime_ns=stat.st_mtime_ns,
+        fingerprint=compute_fingerprint(filepath, min(FINGERPRINT_SIZE, stat.st_size)),
+        compression=compression,
+    )
+
+
+def update_manifest(plans: list) -> None:
+    """
+    Record in the session the offsets consumed by the given read plans.
+
+    The caller is responsible for committing, so the manifest is only persisted together
+    with the records it describes.
+
+    Parameters:
+        plans (List[FileReadPlan]): The read plans that were processed.
+
+    Returns:
+        None
+    """
+    if not plans:
+        return
+
+    file_names = [plan.file_name for plan in plans]
+    entries = {
+        entry.file_name: entry
+        for entry in IngestionManifest.query.filter(
+            IngestionManifest.file_name.in_(file_names)
+        )
+    }
+
+    for plan in plans:
+        entry = entries.get(plan.file_name)
+
+        if entry is None:
+            db.session.add(
+                IngestionManifest(
+                    file_name=plan.file_name,
+                    inode=plan.inode,
+                    size=plan.size,
+                    mtime_ns=plan.mtime_ns,
+                    fingerprint=plan.fingerprint,
+                    offset=plan.end,
+                )
+            )
+        else:
+            entry.inode = plan.inode
+            entry.size = plan.size
+            entry.mtime_ns = plan.mtime_ns
+            entry.fingerprint = plan.fingerprint
+            entry.offset = plan.end
+
+
+def clear_manifest() -> int:
+    """
+    Delete every manifest entry so the next extraction reads all files from the start.
+
+    The caller is responsible for committing.
+
+    Returns:
+        int: Number of entries deleted.
+    """
+    return db.session.query(IngestionManifest).delete()
@@ -0,0 +1,352 @@
+"""
+Metrics Service Module
+------------------------
+Responsible to collect the timings and counters of the ingestion and query paths and to render
+them in the Prometheus text format.
+
+The metrics live in the memory of the process, each worker process exposes its own values.
+
+Author: Álef Ádonis dos Santos Carlos
+Date: 10/01/2024
+"""
+
+from sqlalchemy.pool import QueuePool
+import cProfile
+import os
+import threading
+import time
+
+
+PROFILING_ENABLED = os.environ.get("PROFILING_ENABLED", "0") == "1"
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "/tmp/log-profiles")
+PROFILE_MIN_SECONDS = float(os.environ.get("PROFILE_MIN_SECONDS", 0))
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def format_labels(label_names: tuple, label_values: tuple, extra: str = "") -> str:
+    """
+    Render the labels of a sample, e.g. {route="/logs",method="GET"}.
+
+    Parameters:
+        label_names (tuple): The names of the labels.
+        label_values (tuple): Their values, in the same order.
+        extra (str): An additional rendered label, e.g. le="0.1".
+
+    Returns:
+        str: The rendered labels, empty if there are none.
+    """
+    labels = [
+        '{}="{}"'.format(
+            name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        )
+        for name, value in zip(label_names, label_values)
+    ]
+
+    if extra:
+        labels.append(extra)
+
+    return "{" + ",".join(labels) + "}" if labels else ""
+
+
+def format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """
+    Base class of the metrics, holding one value per combination of label values.
+
+    Attributes:
+        - name (str): The name of the metric.
+        - documentation (str): The description of the metric.
+        - label_names (tuple): The names of its labels.
+
+    Methods:
+        - render: Renders the metric in the Prometheus text format.
+    """
+
+    type_name = "untyped"
+
+    def __init__(self, name: str, documentation: str, label_names: tuple = ()) -> None:
+        """
+        Initializes a Metric without samples.
+
+        Parameters:
+            - name (str): The name of the metric.
+            - documentation (str): The description of the metric.
+            - label_names (tuple): The names of its labels.
+
+        Returns:
+            None
+        """
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(labels.get(name, "") for name in self.label_names)
+
+    def _samples(self):
+        for label_values, value in sorted(self._values.items()):
+            yield "", label_values, value
+
+    def render(self) -> str:
+        """
+        Render the metric in the Prometheus text format.
+
+        Returns:
+            str: The HELP and TYPE lines followed by a line per sample.
+        """
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type_name}",
+        ]
+
+        with self._lock:
+            for suffix, label_values, value, *extra in self._samples():
+                labels = format_labels(self.label_names, label_values, *extra)
+                lines.append(f"{self.name}{suffix}{labels} {format_value(value)}")
+
+        return "\n".join(lines)
+
+
+class CounterMetric(Metric):
+    """A value that only goes up, like the number of rows committed."""
+
+    type_name = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        """
+        Increment the counter.
+
+        Parameters:
+            amount (float): The amount added.
+            **labels: The label values.
+
+        Returns:
+            None
+        """
+        key = self._key(labels)
+
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class GaugeMetric(Metric):
+    """A value that goes up and down, like the depth of a queue."""
+
+    type_name = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        """
+        Set the gauge.
+
+        Parameters:
+            value (float): The new value.
+            **labels: The label values.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class HistogramMetric(Metric):
+    """Counts observations, like durations, in cumulative buckets."""
+
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        label_names: tuple = (),
+        buckets: tuple = DEFAULT_BUCKETS,
+    ) -> None:
+        """
+        Initializes a HistogramMetric without observations.
+
+        Parameters:
+            - name (str): The name of the metric.
+            - documentation (str): The description of the metric.
+            - label_names (tuple): The names of its labels.
+            - buckets (tuple): The upper bounds of the buckets, in ascending order.
+
+        Returns:
+            None
+        """
+        super().__init__(name, documentation, label_names)
+        self.buckets = tuple(buckets) + (float("inf"),)
+
+    def observe(self, value: float, **labels) -> None:
+        """
+        Record an observation.
+
+        Parameters:
+            value (float): The observed value.
+            **labels: The label values.
+
+        Returns:
+            None
+        """
+        key = self._key(labels)
+
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0.0))
+
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+
+            self._values[key] = (counts, total + value)
+
+    def _samples(self):
+        for label_values, (counts, total) in sorted(self._values.items()):
+            for bound, count in zip(self.buckets, counts):
+                yield "_bucket", label_values, count, f'le="{format_value(float(bound))}"'
+
+            yield "_sum", label_values, total
+            yield "_count", label_values, counts[-1]
+
+
+class MetricsRegistry:
+    """
+    Holds the metrics exposed by the /metrics endpoint.
+
+    Methods:
+        - counter: Registers a counter.
+        - gauge: Registers a gauge.
+        - histogram: Registers a histogram.
+        - render: Renders every metric in the Prometheus text format.
+    """
+
+    def __init__(self) -> None:
+        """
+        Initializes an empty MetricsRegistry.
+
+        Returns:
+            None
+        """
+        self._metrics = []
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, documentation: str, label_names: tuple = ()) -> CounterMetric:
+        return self.register(CounterMetric(name, documentation, label_names))
+
+    def gauge(self, name: str, documentation: str, label_names: tuple = ()) -> GaugeMetric:
+        return self.register(GaugeMetric(name, documentation, label_names))
+
+    def histogram(
+        self, name: str, documentation: str, label_names: tuple = (), buckets: tuple = DEFAULT_BUCKETS
+    ) -> HistogramMetric:
+        return self.register(HistogramMetric(name, documentation, label_names, buckets))
+
+    def render(self) -> str:
+        """
+        Render every metric in the Prometheus text format.
+
+        Returns:
+            str: The exposition text.
+        """
+        return "\n".join(metric.render() for metric in self._metrics) + "\n"
+
+
+metrics = MetricsRegistry()
+
+ingest_plan_seconds = metrics.histogram(
+    "log_ingest_plan_seconds", "Time spent finding the new lines of the log files."
+)
+ingest_file_parse_seconds = metrics.histogram(
+    "log_ingest_file_parse_seconds", "Time spent by the parser workers on each log file."
+)
+ingest_lines_parsed = metrics.counter(
+    "log_ingest_lines_parsed_total", "Number of log lines parsed."
+)
+ingest_lines_per_second = metrics.gauge(
+    "log_ingest_lines_per_second", "Lines parsed per second of parser work in the last file."
+)
+ingest_queue_depth = metrics.gauge(
+    "log_ingest_queue_depth", "Number of parsed batches waiting for the database writer."
+)
+ingest_batch_write_seconds = metrics.histogram(
+    "log_ingest_batch_write_seconds", "Time spent inserting a parsed batch and its rollups."
+)
+ingest_commit_seconds = metrics.histogram(
+    "log_ingest_commit_seconds", "Time spent committing the inserted batches."
+)
+ingest_rows_committed = metrics.counter(
+    "log_ingest_rows_committed_total", "Number of log records inserted and committed."
+)
+ingest_rows_skipped = metrics.counter(
+    "log_ingest_rows_skipped_total", "Number of parsed rows skipped as duplicates."
+)
+http_request_seconds = metrics.histogram(
+    "http_request_duration_seconds",
+    "Time spent handling a request, until the response body starts for streamed responses.",
+    ("route", "method", "status"),
+)
+db_pool_checkout_seconds = metrics.histogram(
+    "db_pool_checkout_wait_seconds",
+    "Time spent waiting for a database connection from the pool.",
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 30),
+)
+
+
+class InstrumentedQueuePool(QueuePool):
+    """A QueuePool recording how long each checkout waits for a connection."""
+
+    def _do_get(self):
+        started_at = time.perf_counter()
+
+        try:
+            return super()._do_get()
+        finally:
+            db_pool_checkout_seconds.observe(time.perf_counter() - started_at)
+
+
+def start_profile():
+    """
+    Start profiling the current request.
+
+    Returns:
+        cProfile.Profile: The running profiler.
+    """
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return profiler
+
+
+def stop_profile(profiler: cProfile.Profile, name: str, seconds: float):
+    """
+    Stop a profiler, dumping its statistics if the call took at least PROFILE_MIN_SECONDS.
+
+    Parameters:
+        profiler (cProfile.Profile): The running profiler.
+        name (str): A name for the profiled call, used in the file name.
+        seconds (float): The duration of the call.
+
+    Returns:
+        str or None: The path of the statistics file, None if the call was not slow enough.
+    """
+    profiler.disable()
+
+    if seconds < PROFILE_MIN_SECONDS:
+        return None
+
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    safe_name = "".join(character if character.isalnum() else "_" for character in name)
+    path = os.path.join(PROFILE_DIR, f"{time.time_ns()}-{os.getpid()}-{safe_name}.prof")
+    profiler.dump_stats(path)
+
+    return path
@@ -0,0 +1,99 @@
+"""
+Migration Service Module
+------------------------
+Responsible to bring databases created by older versions of the application up to date.
+
+Author: Álef Ádonis dos Santos Carlos
+Date: 10/01/2024
+"""
+
+from ..extensions import db
+from ..models.log_record_model import Log
+from .log_parser import parse_log_timestamp
+from sqlalchemy import bindparam, inspect, select, text, update
+import os
+
+
+BACKFILL_BATCH_SIZE = int(os.environ.get("BACKFILL_BATCH_SIZE", 10000))
+TYPED_LOG_COLUMNS = ("timestamp", "ip")
+
+
+def add_missing_log_columns() -> list:
+    """
+    Add to an existing log_records table the typed columns it does not have yet.
+
+    Returns:
+        List[str]: The names of the columns added.
+    """
+    existing_columns = {
+        column["name"] for column in inspect(db.engine).get_columns(Log.__tablename__)
+    }
+    added_columns = []
+
+    with db.engine.begin() as connection:
+        for name in TYPED_LOG_COLUMNS:
+            if name in existing_columns:
+                continue
+
+            column_type = Log.__table__.c[name].type.compile(dialect=db.engine.dialect)
+            connection.execute(
+                text(f"ALTER TABLE {Log.__tablename__} ADD COLUMN {name} {column_type}")
+            )
+            added_columns.append(name)
+
+    return added_columns
+
+
+def backfill_log_records(batch_size: int = None) -> int:
+    """
+    Fill the timestamp and ip columns of the log records saved before they existed.
+
+    The records are walked in ID order and each batch is committed on its own, so the
+    backfill can be interrupted and resumed.
+
+    Parameters:
+        batch_size (int): Number of records updated by each transaction, BACKFILL_BATCH_SIZE if None.
+
+    Returns:
+        int: Number of records updated.
+    """
+    batch_size = batch_size or BACKFILL_BATCH_SIZE
+    table = Log.__table__
+    statement = (
+        update(table)
+        .where(table.c.id == bindparam("record_id"))
+        .values(timestamp=bindparam("record_timestamp"), ip=bindparam("record_ip"))
+    )
+
+    last_id = 0
+    updated = 0
+    date_cache = {}
+
+    while True:
+        rows = db.session.execute(
+            select(table.c.id, table.c.ip_address, table.c.date, table.c.hour)
+            .where(table.c.id > last_id, table.c.timestamp.is_(None))
+            .order_by(table.c.id)
+            .limit(batch_size)
+        ).all()
+
+        if not rows:
+            break
+
+        db.session.execute(
+            statement,
+            [
+                {
+                    "record_id": row.id,
+                    "record_timestamp": parse_log_timestamp(row.date, row.hour, date_cache),
+                    "record_ip": row.ip_address,
+                }
+                for row in rows
+            ],
+        )
+        db.session.commit()
+
+        last_id = rows[-1].id
+        updated += len(rows)
+
+    return updated
@@ -0,0 +1,420 @@
+"""
+Partition Service Module
+------------------------
+Responsible to manage the time partitions of the log_records table on PostgreSQL.
+
+With LOG_PARTITIONING set to month or day, each period of event timestamps is stored in its
+own partition, created by the ingestion transaction that first sees a record of that period,
+or ahead of time by the create-log-partitions command. Queries
+filtered by date only read the partitions of the range, and the retention drops whole
+partitions instead of deleting their rows. Records whose date could not be parsed are stored
+with PARTITION_FALLBACK_TIMESTAMP, since the partition key can not be null.
+
+Author: Álef Ádonis dos Santos Carlos
+Date: 10/01/2024
+"""
+
+from ..extensions import db
+from ..models.log_record_model import (
+    Log,
+    LOG_PARTITIONED,
+    LOG_PARTITIONING,
+    LOG_RECORD_COLUMNS,
+)
+from .rollup_service import ROLLUP_KEY_SEPARATOR, apply_rollup_deltas
+from .sketch_service import refresh_sketches
+from .version_service import bump_data_version
+from collections import Counter
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import column, func, table, text
+from sqlalchemy.exc import IntegrityError
+
+
+PARTITION_FALLBACK_TIMESTAMP = datetime(1970, 1, 1)
+PARTITION_NAME_PREFIX = f"{Log.__tablename__}_p"
+DEFAULT_PARTITION_NAME = f"{Log.__tablename__}_default"
+
+TIMESTAMP_INDEX = LOG_RECORD_COLUMNS.index("timestamp")
+
+
+def period_start(timestamp: datetime) -> datetime:
+    """
+    Find the start of the partition period holding a timestamp.
+
+    Parameters:
+        timestamp (datetime): The event timestamp.
+
+    Returns:
+        datetime: The first moment of its day or month.
+    """
+    if LOG_PARTITIONING == "day":
+        return datetime(timestamp.year, timestamp.month, timestamp.day)
+
+    return datetime(timestamp.year, timestamp.month, 1)
+
+
+def next_period_start(start: datetime) -> datetime:
+    """
+    Find the start of the partition period following the given one.
+
+    Parameters:
+        start (datetime): The start of a period.
+
+    Returns:
+        datetime: The start of the next day or month.
+    """
+    if LOG_PARTITIONING == "day":
+        return start + timedelta(days=1)
+
+    return period_start(start + timedelta(days=32))
+
+
+def partition_name(start: datetime) -> str:
+    """
+    Build the name of the partition of a period, e.g. log_records_p2022_03 or log_records_p2022_03_05.
+
+    Parameters:
+        start (datetime): The start of the period.
+
+    Returns:
+        str: The partition name.
+    """
+    if LOG_PARTITIONING == "day":
+        return f"{PARTITION_NAME_PREFIX}{start:%Y_%m_%d}"
+
+    return f"{PARTITION_NAME_PREFIX}{start:%Y_%m}"
+
+
+def partition_start(name: str) -> datetime:
+    """
+    Read the start of the period of a partition from its name.
+
+    Parameters:
+        name (str): The partition name.
+
+    Returns:
+        datetime or None: The start of the period, None if the name does not follow the convention.
+    """
+    period = name[len(PARTITION_NAME_PREFIX) :]
+
+    for date_format in ("%Y_%m_%d", "%Y_%m"):
+        try:
+            return datetime.strptime(period, date_format)
+        except ValueError:
+            continue
+
+    return None
+
+
+def list_partitions() -> list:
+    """
+    List the period partitions of the log_records table, the default partition excluded.
+
+    Returns:
+        List[tuple]: The name and the period start of each partition, oldest first.
+    """
+    names = db.session.execute(
+        text(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE parent.relname = :table_name"
+        ),
+        {"table_name": Log.__tablename__},
+    ).scalars()
+
+    partitions = [(name, partition_start(name)) for name in names]
+    return sorted(
+        (partition for partition in partitions if partition[1] is not None),
+        key=lambda partition: partition[1],
+    )
+
+
+def is_table_partitioned() -> bool:
+    """
+    Check if the existing log_records table was created partitioned.
+
+    Returns:
+        bool: True if the table is partitioned.
+    """
+    return bool(
+        db.session.execute(
+            text(
+                "SELECT 1 FROM pg_partitioned_table "
+                "JOIN pg_class ON pg_class.oid = pg_partitioned_table.partrelid "
+                "WHERE pg_class.relname = :table_name"
+            ),
+            {"table_name": Log.__tablename__},
+        ).scalar()
+    )
+
+
+def ensure_default_partition() -> bool:
+    """
+    Create the default partition, holding the records of periods without a partition.
+
+    Returns:
+        bool: True if the log records are partitioned, False if the existing table is a plain one.
+    """
+    if not is_table_partitioned():
+        current_app.logger.warning(
+            "LOG_PARTITIONING is set but %s is not partitioned, "
+            "it only applies to a table created by this version",
+            Log.__tablename__,
+        )
+        return False
+
+    with db.engine.begin() as connection:
+        connection.execute(
+            text(
+                f"CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION_NAME} "
+                f"PARTITION OF {Log.__tablename__} DEFAULT"
+            )
+        )
+
+    return True
+
+
+def find_missing_partitions(periods: set) -> set:
+    """
+    Find which of the given periods have no partition, reading the catalog.
+
+    Parameters:
+        periods (set): The starts of the periods.
+
+    Returns:
+        set: The starts of the periods without a partition.
+    """
+    names = {partition_name(start): start for start in periods}
+    existing = db.session.execute(
+        text("SELECT relname FROM pg_class WHERE relname = ANY(:names)"),
+        {"names": list(names)},
+    ).scalars()
+
+    return set(names.values()) - {names[name] for name in existing}
+
+
+def create_partition(start: datetime) -> bool:
+    """
+    Create the partition of a period if it does not exist, in the current transaction.
+
+    The creation is made in a savepoint. It fails if the default partition already holds records
+    of the period, which then stay there.
+
+    Parameters:
+        start (datetime): The start of the period.
+
+    Returns:
+        bool: True if the partition exists, False if it could not be created.
+    """
+    try:
+        with db.session.begin_nested():
+            db.session.execute(
+                text(
+                    f"CREATE TABLE IF NOT EXISTS {partition_name(start)} "
+                    f"PARTITION OF {Log.__tablename__} "
+                    f"FOR VALUES FROM ('{start:%Y-%m-%d}') TO ('{next_period_start(start):%Y-%m-%d}')"
+                )
+            )
+        return True
+    except IntegrityError:
+        if not find_missing_partitions({start}):
+            return True
+
+        current_app.logger.warning(
+            "The partition %s could not be created, the default partition holds records of its "
+            "period, which are stored there",
+            partition_name(start),
+        )
+        return False
+
+
+def ensure_partitions(periods: set) -> None:
+    """
+    Create the partitions of the given periods that do not exist yet, in the current transaction.
+
+    The table is first locked in ROW EXCLUSIVE mode, the one the inserts take anyway, so a
+    partition found in the catalog can not be dropped by another process before the rows are
+    inserted. The partitions are read from the catalog every time instead of being cached, since
+    another process may have dropped them. Creating a partition takes an ACCESS EXCLUSIVE lock
+    on log_records until the transaction commits, the create-log-partitions command creates them
+    ahead of the ingestion.
+
+    Parameters:
+        periods (set): The starts of the periods.
+
+    Returns:
+        None
+    """
+    db.session.execute(text(f"LOCK TABLE {Log.__tablename__} IN ROW EXCLUSIVE MODE"))
+
+    for start in sorted(find_missing_partitions(periods)):
+        create_partition(start)
+
+
+def create_partitions_between(start: datetime, end: datetime) -> list:
+    """
+    Create the partitions of the periods overlapping a date range ahead of the ingestion, each in its own transaction.
+
+    Parameters:
+        start (datetime): The start of the range.
+        end (datetime): The end of the range, excluded.
+
+    Returns:
+        List[str]: The names of the partitions created.
+    """
+    created = []
+    period = period_start(start)
+
+    while period < end:
+        try:
+            if find_missing_partitions({period}) and create_partition(period):
+                created.append(partition_name(period))
+            db.session.commit()
+        except:
+            db.session.rollback()
+            raise
+
+        period = next_period_start(period)
+
+    return created
+
+
+def prepare_partitioned_rows(rows: list) -> list:
+    """
+    Make the rows fit the partitioned table, before they are inserted.
+
+    Rows without a timestamp receive PARTITION_FALLBACK_TIMESTAMP, and the partitions of the
+    periods of the rows are created if they do not exist yet.
+
+    Parameters:
+        rows (List[tuple]): The rows, with values in the LOG_RECORD_COLUMNS order.
+
+    Returns:
+        List[tuple]: The rows, with a timestamp each.
+    """
+    if not LOG_PARTITIONED:
+        return rows
+
+    if any(row[TIMESTAMP_INDEX] is None for row in rows):
+        rows = [
+            row
+            if row[TIMESTAMP_INDEX] is not None
+            else row[:TIMESTAMP_INDEX] + (PARTITION_FALLBACK_TIMESTAMP,) + row[TIMESTAMP_INDEX + 1 :]
+            for row in rows
+        ]
+
+    ensure_partitions({period_start(row[TIMESTAMP_INDEX]) for row in rows})
+    return rows
+
+
+def partition_table(name: str):
+    """
+    Build a selectable over a single partition, so it is read without the default partition.
+
+    Parameters:
+        name (str): The partition name.
+
+    Returns:
+        TableClause: The partition, with the columns the rollups and sketches are counted on.
+    """
+    return table(
+        name,
+        column("software_name"),
+        column("version"),
+        column("ip_address"),
+        column("timestamp"),
+    )
+
+
+def count_partition_rollups(name: str) -> Counter:
+    """
+    Count the rollup counters of the records stored in a partition, grouping in the database.
+
+    Records of the period held by the default partition are not counted, since dropping the
+    partition does not remove them.
+
+    Parameters:
+        name (str): The partition name.
+
+    Returns:
+        Counter: The number of records per (dimension, key).
+    """
+    partition = partition_table(name).c
+    counters = Counter()
+
+    for software_name, version, count in db.session.query(
+        partition.software_name, partition.version, func.count()
+    ).group_by(partition.software_name, partition.version):
+        counters["software_version", software_name + ROLLUP_KEY_SEPARATOR + version] += count
+
+    for ip_address, count in db.session.query(partition.ip_address, func.count()).group_by(
+        partition.ip_address
+    ):
+        counters["ip", ip_address] += count
+
+    hour = func.date_trunc("hour", partition.timestamp)
+    for timestamp, count in db.session.query(hour, func.count()).group_by(hour):
+        counters["day", timestamp.strftime("%Y-%m-%d")] += count
+        counters["hour", timestamp.strftime("%Y-%m-%dT%H")] += count
+
+    return counters
+
+
+def find_partition_sketch_pairs(name: str) -> set:
+    """
+    Find the sketches the records stored in a partition belong to.
+
+    Parameters:
+        name (str): The partition name.
+
+    Returns:
+        set: The (software_name, day) pairs of the records of the partition.
+    """
+    partition = partition_table(name).c
+    day = func.date_trunc("day", partition.timestamp)
+
+    return {
+        (software_name, timestamp.strftime("%Y-%m-%d"))
+        for software_name, timestamp in db.session.query(partition.software_name, day).distinct()
+    }
+
+
+def drop_partitions_before(cutoff: datetime) -> list:
+    """
+    Drop the partitions whose whole period is before the cutoff, decrementing the rollup counters.
+
+    Each partition is dropped in its own transaction, together with the update of the counters
+    and of the sketches of its records. Records of the period held by the default partition are
+    kept, so the sketches of the days that still have records are recomputed from them, and only
+    the others are deleted.
+
+    Parameters:
+        cutoff (datetime): The records before this moment are expired.
+
+    Returns:
+        List[str]: The names of the partitions dropped.
+    """
+    dropped = []
+
+    for name, start in list_partitions():
+        end = next_period_start(start)
+        if end > cutoff:
+            continue
+
+        try:
+            deltas = count_partition_rollups(name)
+            sketch_pairs = find_partition_sketch_pairs(name)
+            db.session.execute(text(f"DROP TABLE {name}"))
+            apply_rollup_deltas(Counter({key: -count for key, count in deltas.items()}))
+            refresh_sketches(sketch_pairs)
+            bump_data_version()
+            db.session.commit()
+        except:
+            db.session.rollback()
+            raise
+
+        dropped.append(name)
+
+    return dropped
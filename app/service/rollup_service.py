@@ -0,0 +1,200 @@
+"""
+Rollup Service Module
+------------------------
+Responsible to keep the pre-aggregated log record counters up to date and to read them.
+
+The counters are incremented with upserts in the same transaction as the records they count,
+so the dashboards read a few hundred rows instead of scanning log_records.
+
+Author: Álef Ádonis dos Santos Carlos
+Date: 10/01/2024
+"""
+
+from ..extensions import db
+from ..models.log_record_model import Log, LOG_RECORD_COLUMNS
+from ..models.log_rollup_model import LogRollup
+from collections import Counter
+from sqlalchemy.dialects import postgresql, sqlite
+import os
+
+
+ROLLUP_DIMENSIONS = ("software_version", "day", "hour", "ip")
+ROLLUP_KEY_SEPARATOR = "\t"
+ROLLUP_REBUILD_BATCH_SIZE = int(os.environ.get("ROLLUP_REBUILD_BATCH_SIZE", 10000))
+
+IP_ADDRESS_INDEX = LOG_RECORD_COLUMNS.index("ip_address")
+SOFTWARE_NAME_INDEX = LOG_RECORD_COLUMNS.index("software_name")
+VERSION_INDEX = LOG_RECORD_COLUMNS.index("version")
+TIMESTAMP_INDEX = LOG_RECORD_COLUMNS.index("timestamp")
+
+
+def rollup_keys(software_name: str, version: str, timestamp, ip_address: str):
+    """
+    List the counters a log record contributes to.
+
+    Parameters:
+        software_name (str): The software name of the record.
+        version (str): The software version of the record.
+        timestamp (datetime or None): The moment of the event, records without it are not counted per day or hour.
+        ip_address (str): The IP address of the record.
+
+    Returns:
+        Iterator[tuple]: The (dimension, key) of each counter.
+    """
+    yield "software_version", software_name + ROLLUP_KEY_SEPARATOR + version
+    yield "ip", ip_address
+
+    if timestamp is not None:
+        yield "day", timestamp.strftime("%Y-%m-%d")
+        yield "hour", timestamp.strftime("%Y-%m-%dT%H")
+
+
+def count_rollups(rows: list) -> Counter:
+    """
+    Count how many of the given rows fall in each counter.
+
+    Parameters:
+        rows (List[tuple]): The rows, with values in the LOG_RECORD_COLUMNS order.
+
+    Returns:
+        Counter: The number of rows per (dimension, key).
+    """
+    counters = Counter()
+
+    for row in rows:
+        counters.update(
+            rollup_keys(
+                row[SOFTWARE_NAME_INDEX],
+                row[VERSION_INDEX],
+                row[TIMESTAMP_INDEX],
+                row[IP_ADDRESS_INDEX],
+            )
+        )
+
+    return counters
+
+
+def apply_rollup_deltas(deltas: Counter) -> None:
+    """
+    Add the given deltas to the counters in the current transaction, removing the counters that reach zero.
+
+    Parameters:
+        deltas (Counter): The amount to add to each (dimension, key), negative for deleted records.
+
+    Returns:
+        None
+    """
+    values = [
+        {"dimension": dimension, "key": key, "count": delta}
+        for (dimension, key), delta in sorted(deltas.items())
+        if delta
+    ]
+
+    if not values:
+        return
+
+    table = LogRollup.__table__
+    dialect = db.engine.dialect.name
+
+    if dialect in ("postgresql", "sqlite"):
+        insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+        statement = insert(table)
+        statement = statement.on_conflict_do_update(
+            index_elements=[table.c.dimension, table.c.key],
+            set_={"count": table.c.count + statement.excluded["count"]},
+        )
+        db.session.execute(statement, values)
+    else:
+        for value in values:
+            updated = db.session.execute(
+                table.update()
+                .where(table.c.dimension == value["dimension"], table.c.key == value["key"])
+                .values(count=table.c.count + value["count"])
+            ).rowcount
+
+            if not updated:
+                db.session.execute(table.insert(), value)
+
+    if any(value["count"] < 0 for value in values):
+        db.session.execute(table.delete().where(table.c.count <= 0))
+
+
+def clear_rollups() -> None:
+    """
+    Delete every counter in the current transaction.
+
+    Returns:
+        None
+    """
+    db.session.query(LogRollup).delete()
+
+
+def rebuild_rollups(batch_size: int = None) -> int:
+    """
+    Recompute every counter from the log records, to recover from inconsistencies.
+
+    Parameters:
+        batch_size (int): Number of records read at a time, ROLLUP_REBUILD_BATCH_SIZE if None.
+
+    Returns:
+        int: Number of counters written.
+    """
+    batch_size = batch_size or ROLLUP_REBUILD_BATCH_SIZE
+    counters = Counter()
+
+    records = db.session.query(
+        Log.software_name, Log.version, Log.timestamp, Log.ip_address
+    ).yield_per(batch_size)
+
+    for software_name, version, timestamp, ip_address in records:
+        counters.update(rollup_keys(software_name, version, timestamp, ip_address))
+
+    clear_rollups()
+    apply_rollup_deltas(counters)
+    db.session.commit()
+
+    return len(counters)
+
+
+def get_rollup(dimension: str, limit: int, order: str = None) -> list:
+    """
+    Retrieve the counters of a dimension.
+
+    Parameters:
+        dimension (str): One of ROLLUP_DIMENSIONS.
+        limit (int): The maximum number of counters returned.
+        order (str): "count" for the largest counters first or "key" for ascending keys. Days and hours
+            are ordered by key by default, the other dimensions by count.
+
+    Returns:
+        List[dict]: The counters, software_version keys split into software_name and version.
+
+    Raises:
+        ValueError: If the dimension or the order is invalid.
+    """
+    if dimension not in ROLLUP_DIMENSIONS:
+        raise ValueError(
+            f"Invalid dimension '{dimension}', expected one of {', '.join(ROLLUP_DIMENSIONS)}"
+        )
+
+    order = order or ("key" if dimension in ("day", "hour") else "count")
+
+    query = LogRollup.query.filter(LogRollup.dimension == dimension)
+    if order == "count":
+        query = query.order_by(LogRollup.count.desc(), LogRollup.key)
+    elif order == "key":
+        query = query.order_by(LogRollup.key)
+    else:
+        raise ValueError(f"Invalid order '{order}', expected count or key")
+
+    counters = []
+    for rollup in query.limit(limit):
+        if dimension == "software_version":
+            software_name, _, version = rollup.key.partition(ROLLUP_KEY_SEPARATOR)
+            counters.append(
+                {"software_name": software_name, "version": version, "count": rollup.count}
+            )
+        else:
+            counters.append({dimension: rollup.key, "count": rollup.count})
+
+    return counters
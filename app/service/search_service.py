@@ -0,0 +1,261 @@
+"""
+Search Service Module
+------------------------
+Responsible to maintain the full-text index over the title and description of the log records
+and to answer keyword searches with it.
+
+On PostgreSQL the index is a generated tsvector column with a GIN index, updated by the
+database itself. On SQLite it is an FTS5 table: deletes and updates are synced by triggers, and
+the bulk loader indexes the records it inserts with one statement per batch, which is several
+times faster than a trigger firing for every row.
+
+Author: Álef Ádonis dos Santos Carlos
+Date: 10/01/2024
+"""
+
+from ..extensions import db
+from ..models.log_record_model import Log
+from sqlalchemy import inspect, text
+import re
+
+
+SEARCH_LANGUAGE = "english"
+SEARCH_FTS_TABLE = "log_records_fts"
+HIGHLIGHT_START = "<mark>"
+HIGHLIGHT_STOP = "</mark>"
+
+POSTGRESQL_SEARCH_DDL = (
+    f"""
+    ALTER TABLE log_records ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        to_tsvector('{SEARCH_LANGUAGE}', coalesce(title, '') || ' ' || coalesce(description, ''))
+    ) STORED
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_log_records_search_vector ON log_records USING GIN (search_vector)",
+)
+
+SQLITE_SEARCH_DDL = (
+    "DROP TRIGGER IF EXISTS log_records_fts_insert",
+    f"""
+    CREATE TRIGGER IF NOT EXISTS log_records_fts_delete AFTER DELETE ON log_records BEGIN
+        INSERT INTO {SEARCH_FTS_TABLE} ({SEARCH_FTS_TABLE}, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS log_records_fts_update AFTER UPDATE OF title, description ON log_records BEGIN
+        INSERT INTO {SEARCH_FTS_TABLE} ({SEARCH_FTS_TABLE}, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+        INSERT INTO {SEARCH_FTS_TABLE} (rowid, title, description)
+        VALUES (new.id, new.title, new.description);
+    END
+    """,
+)
+
+
+def ensure_search_index() -> None:
+    """
+    Create the full-text index of the log records if it does not exist yet.
+
+    When the SQLite FTS5 table is created over an existing table it is filled with the records
+    already saved.
+
+    Returns:
+        None
+    """
+    dialect = db.engine.dialect.name
+
+    with db.engine.begin() as connection:
+        if dialect == "postgresql":
+            for statement in POSTGRESQL_SEARCH_DDL:
+                connection.execute(text(statement))
+
+        elif dialect == "sqlite":
+            fts_table_exists = inspect(connection).has_table(SEARCH_FTS_TABLE)
+
+            connection.execute(
+                text(
+                    f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_FTS_TABLE} USING fts5("
+                    "title, description, content='log_records', content_rowid='id')"
+                )
+            )
+            for statement in SQLITE_SEARCH_DDL:
+                connection.execute(text(statement))
+
+            if not fts_table_exists:
+                connection.execute(
+                    text(f"INSERT INTO {SEARCH_FTS_TABLE} ({SEARCH_FTS_TABLE}) VALUES ('rebuild')")
+                )
+
+
+def index_inserted_records(after_id: int) -> None:
+    """
+    Add the log records inserted after an ID to the SQLite FTS5 table, in the current transaction.
+
+    Does nothing on the other dialects, whose index is maintained by the database.
+
+    Parameters:
+        after_id (int): The highest ID saved before the records were inserted.
+
+    Returns:
+        None
+    """
+    if db.engine.dialect.name != "sqlite":
+        return
+
+    db.session.execute(
+        text(
+            f"INSERT INTO {SEARCH_FTS_TABLE} (rowid, title, description) "
+            f"SELECT id, title, description FROM {Log.__tablename__} WHERE id > :after_id"
+        ),
+        {"after_id": after_id},
+    )
+
+
+def build_fts5_query(search_text: str) -> str:
+    """
+    Turn free text into an FTS5 query matching every word, ignoring the FTS5 operators.
+
+    Parameters:
+        search_text (str): The text typed by the user.
+
+    Returns:
+        str: The FTS5 query.
+    """
+    words = re.findall(r"\w+", search_text)
+    return " ".join(f'"{word}"' for word in words)
+
+
+def search_postgresql(search_text: str, limit: int, offset: int) -> list:
+    """
+    Search the tsvector index, the highlights are only computed for the rows of the page.
+
+    Parameters:
+        search_text (str): The keywords to search, in web search syntax.
+        limit (int): The maximum number of matches returned.
+        offset (int): The number of best matches skipped.
+
+    Returns:
+        List[Row]: The id, rank and highlighted title and description of each match.
+    """
+    statement = text(
+        f"""
+        SELECT ranked.id, ranked.rank,
+               ts_headline('{SEARCH_LANGUAGE}', log_records.title, ranked.query, :options) AS title_highlight,
+               ts_headline('{SEARCH_LANGUAGE}', log_records.description, ranked.query, :options) AS description_highlight
+        FROM (
+            SELECT log_records.id, query, ts_rank(log_records.search_vector, query) AS rank
+            FROM log_records, websearch_to_tsquery('{SEARCH_LANGUAGE}', :search_text) AS query
+            WHERE log_records.search_vector @@ query
+            ORDER BY rank DESC, log_records.id
+            LIMIT :limit OFFSET :offset
+        ) AS ranked
+        JOIN log_records ON log_records.id = ranked.id
+        ORDER BY ranked.rank DESC, ranked.id
+        """
+    )
+    options = f"StartSel={HIGHLIGHT_START}, StopSel={HIGHLIGHT_STOP}, HighlightAll=TRUE"
+
+    return db.session.execute(
+        statement,
+        {"search_text": search_text, "options": options, "limit": limit, "offset": offset},
+    ).all()
+
+
+def search_sqlite(search_text: str, limit: int, offset: int) -> list:
+    """
+    Search the FTS5 table, ranking the matches with bm25.
+
+    Parameters:
+        search_text (str): The keywords to search.
+        limit (int): The maximum number of matches returned.
+        offset (int): The number of best matches skipped.
+
+    Returns:
+        List[Row]: The id, rank and highlighted title and description of each match.
+    """
+    fts_query = build_fts5_query(search_text)
+
+    if not fts_query:
+        return []
+
+    statement = text(
+        f"""
+        SELECT rowid AS id, -bm25({SEARCH_FTS_TABLE}) AS rank,
+               highlight({SEARCH_FTS_TABLE}, 0, :start, :stop) AS title_highlight,
+               highlight({SEARCH_FTS_TABLE}, 1, :start, :stop) AS description_highlight
+        FROM {SEARCH_FTS_TABLE}
+        WHERE {SEARCH_FTS_TABLE} MATCH :query
+        ORDER BY bm25({SEARCH_FTS_TABLE}), rowid
+        LIMIT :limit OFFSET :offset
+        """
+    )
+
+    return db.session.execute(
+        statement,
+        {
+            "query": fts_query,
+            "start": HIGHLIGHT_START,
+            "stop": HIGHLIGHT_STOP,
+            "limit": limit,
+            "offset": offset,
+        },
+    ).all()
+
+
+def search_logs(search_text: str, limit: int, page: int = 1) -> dict:
+    """
+    Search the log records whose title or description match the given keywords.
+
+    Parameters:
+        search_text (str): The keywords to search.
+        limit (int): The maximum number of log records in the page.
+        page (int): The number of the page, starting at 1.
+
+    Returns:
+        dict: Serialized log records of the page, best matches first, with their rank and highlighted
+            title and description, and the number of the next page, None if it is the last one.
+
+    Raises:
+        ValueError: If the search text is empty or the dialect has no full-text index.
+    """
+    if not search_text or not search_text.strip():
+        raise ValueError("The search text must not be empty")
+
+    if page < 1:
+        raise ValueError("The page must be greater than 0")
+
+    dialect = db.engine.dialect.name
+    offset = (page - 1) * limit
+
+    if dialect == "postgresql":
+        matches = search_postgresql(search_text, limit + 1, offset)
+    elif dialect == "sqlite":
+        matches = search_sqlite(search_text, limit + 1, offset)
+    else:
+        raise ValueError(f"Full-text search is not available for {dialect}")
+
+    next_page = page + 1 if len(matches) > limit else None
+    matches = matches[:limit]
+
+    logs = {
+        log.id: log
+        for log in Log.query.filter(Log.id.in_([match.id for match in matches]))
+    }
+
+    results = []
+    for match in matches:
+        log = logs.get(match.id)
+
+        if log is None:
+            continue
+
+        result = log.serialize()
+        result["rank"] = round(float(match.rank), 6)
+        result["highlights"] = {
+            "title": match.title_highlight,
+            "description": match.description_highlight,
+        }
+        results.append(result)
+
+    return {"data": results, "next_page": next_page}
@@ -0,0 +1,1057 @@
+"""
+Sketch Service Module
+------------------------
+Responsible to keep the approximate summaries of the log records of each software and day up to
+date and to answer distinct count and top-k questions from them.
+
+Each (software_name, day) has a HyperLogLog of its IP addresses and Space-Saving summaries of its
+IP addresses and log IDs, updated in the same transaction as the records they summarize. Both
+are mergeable, so a question over any range of days and softwares merges a few kilobytes per
+day instead of scanning log_records, in memory bounded by the sketch sizes.
+
+The error of the answers is set by SKETCH_HLL_PRECISION, the HyperLogLog relative standard
+error being 1.04 / sqrt(2 ** precision), and by SKETCH_TOP_CAPACITY, a count being overestimated
+by at most rows / capacity. The sketches can not forget a record, so the ones of the days whose
+records are deleted are recomputed from the remaining records.
+
+The IP addresses are hashed in bulk, with NumPy when it is installed, and each sketch changed
+by a transaction is serialized once, right before it commits. Sketches hashed with blake2b by
+older versions are recomputed from their records the next time their day is written, the
+rebuild-sketches command converts all of them at once.
+
+Author: Álef Ádonis dos Santos Carlos
+Date: 10/01/2024
+"""
+
+from ..extensions import db
+from ..models.log_record_model import Log, LOG_RECORD_COLUMNS
+from ..models.log_sketch_model import LogSketch
+from .log_query import parse_date
+from datetime import datetime, timedelta
+from json.encoder import encode_basestring_ascii as encode_json_string
+from sqlalchemy import tuple_
+from sqlalchemy.dialects import postgresql
+import hashlib
+import heapq
+import json
+import math
+import os
+import struct
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+SKETCHES_ENABLED = os.environ.get("SKETCHES_ENABLED", "1") == "1"
+SKETCH_HLL_PRECISION = int(os.environ.get("SKETCH_HLL_PRECISION", 12))
+SKETCH_TOP_CAPACITY = int(os.environ.get("SKETCH_TOP_CAPACITY", 64))
+SKETCH_REBUILD_BATCH_SIZE = int(os.environ.get("SKETCH_REBUILD_BATCH_SIZE", 10000))
+SKETCH_BUFFER_ROWS = int(os.environ.get("SKETCH_BUFFER_ROWS", 200000))
+SKETCH_LOOKUP_CHUNK_SIZE = 500
+DEFAULT_TOP_LIMIT = 10
+
+SKETCH_DIMENSIONS = {"ip": "top_ips", "log_id": "top_log_ids"}
+
+SOFTWARE_NAME_INDEX = LOG_RECORD_COLUMNS.index("software_name")
+TIMESTAMP_INDEX = LOG_RECORD_COLUMNS.index("timestamp")
+IP_ADDRESS_INDEX = LOG_RECORD_COLUMNS.index("ip_address")
+LOG_ID_INDEX = LOG_RECORD_COLUMNS.index("log_id")
+
+HLL_SPARSE_ENTRY = struct.Struct(">HB")
+HLL_LEGACY_ENCODINGS = (b"S", b"D")
+
+HASH_SEED = 0x9E3779B97F4A7C15
+HASH_MASK = (1 << 64) - 1
+
+SKETCH_JSON_DECODER = json.JSONDecoder()
+
+
+def mix_hash(value: int) -> int:
+    """
+    Mix the bits of a 64-bit integer with the splitmix64 finalizer.
+
+    Parameters:
+        value (int): The integer, from 0 to 2 ** 64 - 1.
+
+    Returns:
+        int: The mixed integer.
+    """
+    value = ((value ^ (value >> 30)) * 0xBF58476D1CE4E5B9) & HASH_MASK
+    value = ((value ^ (value >> 27)) * 0x94D049BB133111EB) & HASH_MASK
+    return value ^ (value >> 31)
+
+
+def hash_string(value: str) -> int:
+    """
+    Hash a string into 64 bits, mixing its UTF-8 bytes 8 at a time.
+
+    Parameters:
+        value (str): The string.
+
+    Returns:
+        int: The hash.
+    """
+    data = value.encode("utf-8")
+    hash_ = mix_hash(len(data) ^ HASH_SEED)
+
+    for offset in range(0, len(data), 8):
+        hash_ = mix_hash(hash_ ^ int.from_bytes(data[offset : offset + 8], "little"))
+
+    return hash_
+
+
+def hash_strings(values: list) -> list:
+    """
+    Hash many strings at once, as hash_string does, with vectorized NumPy operations if available.
+
+    Parameters:
+        values (List[str]): The strings.
+
+    Returns:
+        List[int]: The hash of each string.
+    """
+    if np is None or not values:
+        return [hash_string(value) for value in values]
+
+    encoded = [value.encode("utf-8") for value in values]
+    lengths = np.fromiter(map(len, encoded), dtype=np.uint64, count=len(encoded))
+    words = max(1, -(-int(lengths.max()) // 8))
+    matrix = np.array(encoded, dtype=f"S{words * 8}").view("<u8").reshape(len(encoded), words)
+    word_counts = (lengths + np.uint64(7)) // np.uint64(8)
+
+    def mix(array):
+        array = (array ^ (array >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        array = (array ^ (array >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return array ^ (array >> np.uint64(31))
+
+    hashes = mix(lengths ^ np.uint64(HASH_SEED))
+    for word in range(words):
+        mixed = mix(hashes ^ matrix[:, word])
+        hashes = np.where(word_counts > word, mixed, hashes)
+
+    return hashes.tolist()
+
+
+class HyperLogLog:
+    """
+    A HyperLogLog counting the distinct strings added to it, with 2 ** precision registers.
+
+    The registers set are kept in a dict, and serialized as (index, rank) pairs while that is
+    smaller than the dense array, so the sketch of a day with a handful of IP addresses takes a
+    few bytes.
+
+    Attributes:
+        - precision (int): Number of bits of the hash selecting the register, 4 to 16.
+        - registers (dict): The rank of each register set, by index.
+        - legacy_hash (bool): True for a sketch whose strings were hashed with blake2b.
+
+    Methods:
+        - add: Adds a string.
+        - add_hashes: Adds strings hashed by hash_strings.
+        - merge: Merges with another sketch, at the lower of their precisions.
+        - fold: Reduces the sketch to a lower precision.
+        - estimate: Estimates the number of distinct strings added.
+        - to_bytes: Serializes the sketch.
+        - from_bytes: Reads a serialized sketch.
+    """
+
+    def __init__(self, precision: int, registers: dict = None, legacy_hash: bool = False) -> None:
+        """
+        Initializes a HyperLogLog, empty unless registers are given.
+
+        Parameters:
+            - precision (int): Number of bits of the hash selecting the register, 4 to 16.
+            - registers (dict): The rank of each register set, by index.
+            - legacy_hash (bool): True for registers of strings hashed with blake2b.
+
+        Returns:
+            None
+
+        Raises:
+            ValueError: If the precision is out of range.
+        """
+        if not 4 <= precision <= 16:
+            raise ValueError(f"Invalid HyperLogLog precision {precision}, expected 4 to 16")
+
+        self.precision = precision
+        self.registers = registers if registers is not None else {}
+        self.legacy_hash = legacy_hash
+
+    @property
+    def relative_error(self) -> float:
+        """
+        The relative standard error of the estimate.
+        """
+        return 1.04 / math.sqrt(1 << self.precision)
+
+    def add(self, value: str) -> None:
+        """
+        Add a string to the sketch.
+
+        Parameters:
+            value (str): The string.
+
+        Returns:
+            None
+        """
+        if self.legacy_hash:
+            hash_ = int.from_bytes(
+                hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "little"
+            )
+        else:
+            hash_ = hash_string(value)
+
+        self.add_hashes((hash_,))
+
+    def add_hashes(self, hashes) -> None:
+        """
+        Add strings to the sketch from their hashes.
+
+        Parameters:
+            hashes (Iterable[int]): The hashes of the strings, as returned by hash_strings.
+
+        Returns:
+            None
+        """
+        registers = self.registers
+        remaining_bits = 64 - self.precision
+        low_mask = (1 << remaining_bits) - 1
+        first_rank = remaining_bits + 1
+
+        for hash_ in hashes:
+            index = hash_ >> remaining_bits
+            rank = first_rank - (hash_ & low_mask).bit_length()
+
+            if rank > registers.get(index, 0):
+                registers[index] = rank
+
+    def fold(self, precision: int) -> "HyperLogLog":
+        """
+        Reduce the sketch to a lower precision, as if the strings were added to a sketch of that precision.
+
+        Parameters:
+            precision (int): The new precision, the current one if higher.
+
+        Returns:
+            HyperLogLog: The reduced sketch, the same one if the precision is not lower.
+        """
+        if precision >= self.precision:
+            return self
+
+        shift = self.precision - precision
+        registers = {}
+
+        for index, rank in self.registers.items():
+            low_bits = index & ((1 << shift) - 1)
+            folded_rank = shift - low_bits.bit_length() + 1 if low_bits else shift + rank
+            folded_index = index >> shift
+
+            if folded_rank > registers.get(folded_index, 0):
+                registers[folded_index] = folded_rank
+
+        return HyperLogLog(precision, registers, self.legacy_hash)
+
+    def merge(self, other: "HyperLogLog") -> "HyperLogLog":
+        """
+        Merge with another sketch, at the lower of their precisions.
+
+        Parameters:
+            other (HyperLogLog): The other sketch.
+
+        Returns:
+            HyperLogLog: A sketch of the union of the strings of both.
+        """
+        precision = min(self.precision, other.precision)
+        registers = dict(self.fold(precision).registers)
+
+        for index, rank in other.fold(precision).registers.items():
+            if rank > registers.get(index, 0):
+                registers[index] = rank
+
+        return HyperLogLog(precision, registers, self.legacy_hash and other.legacy_hash)
+
+    def estimate(self) -> int:
+        """
+        Estimate the number of distinct strings added, with linear counting for small counts.
+
+        Returns:
+            int: The estimate.
+        """
+        size = 1 << self.precision
+        alpha = {16: 0.673, 32: 0.697, 64: 0.709}.get(size, 0.7213 / (1 + 1.079 / size))
+        zeros = size - len(self.registers)
+
+        estimate = alpha * size * size / (
+            zeros + sum(2.0 ** -rank for rank in self.registers.values())
+        )
+
+        if estimate <= 2.5 * size and zeros:
+            estimate = size * math.log(size / zeros)
+
+        return round(estimate)
+
+    def to_bytes(self) -> bytes:
+        """
+        Serialize the sketch, as its precision followed by the sparse pairs or the dense registers.
+
+        The encoding is "s" or "d", in upper case for a sketch hashed with blake2b.
+
+        Returns:
+            bytes: The serialized sketch.
+        """
+        size = 1 << self.precision
+        sparse_encoding, dense_encoding = HLL_LEGACY_ENCODINGS if self.legacy_hash else (b"s", b"d")
+
+        if len(self.registers) * HLL_SPARSE_ENTRY.size < size:
+            pairs = sorted(self.registers.items())
+            return bytes((self.precision,)) + sparse_encoding + b"".join(
+                HLL_SPARSE_ENTRY.pack(index, rank) for index, rank in pairs
+            )
+
+        dense = bytearray(size)
+        for index, rank in self.registers.items():
+            dense[index] = rank
+
+        return bytes((self.precision,)) + dense_encoding + bytes(dense)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "HyperLogLog":
+        """
+        Read a sketch serialized by to_bytes.
+
+        Parameters:
+            data (bytes): The serialized sketch.
+
+        Returns:
+            HyperLogLog: The sketch.
+        """
+        precision, encoding, payload = data[0], data[1:2], data[2:]
+
+        if encoding in (b"s", b"S"):
+            registers = dict(HLL_SPARSE_ENTRY.iter_unpack(payload))
+        else:
+            registers = {index: rank for index, rank in enumerate(payload) if rank}
+
+        return cls(precision, registers, encoding in HLL_LEGACY_ENCODINGS)
+
+
+class SpaceSaving:
+    """
+    A Space-Saving summary of the most frequent strings, holding at most capacity counters.
+
+    Each counter overestimates the count of its string by at most its error, and a string
+    without a counter was seen at most min_count times. The summaries are merged following
+    Agarwal et al., Mergeable Summaries, which keeps both guarantees.
+
+    Attributes:
+        - capacity (int): Maximum number of counters kept.
+        - total (int): Number of strings counted.
+        - counters (dict): The count and the error of each string kept.
+
+    Methods:
+        - min_count: Upper bound of the count of the strings without a counter.
+        - update: Counts a batch of strings.
+        - merge: Merges with another summary.
+        - top: Lists the most frequent strings.
+        - to_bytes: Serializes the summary.
+        - from_bytes: Reads a serialized summary.
+    """
+
+    def __init__(self, capacity: int, total: int = 0, counters: dict = None) -> None:
+        """
+        Initializes a SpaceSaving summary, empty unless counters are given.
+
+        Parameters:
+            - capacity (int): Maximum number of counters kept.
+            - total (int): Number of strings counted.
+            - counters (dict): The count and the error of each string kept.
+
+        Returns:
+            None
+        """
+        self.capacity = max(1, capacity)
+        self.total = total
+        self.counters = counters if counters is not None else {}
+
+    def min_count(self) -> int:
+        """
+        Upper bound of the count of the strings without a counter.
+
+        Returns:
+            int: The lowest count kept if the summary is full, zero otherwise.
+        """
+        if len(self.counters) < self.capacity:
+            return 0
+
+        return min(count for count, _ in self.counters.values())
+
+    def _merged(self, counters: dict, missing_count: int, total: int) -> "SpaceSaving":
+        own_missing_count = self.min_count()
+        merged = {}
+
+        for key in self.counters.keys() | counters.keys():
+            count, error = self.counters.get(key, (own_missing_count, own_missing_count))
+            other_count, other_error = counters.get(key, (missing_count, missing_count))
+            merged[key] = (count + other_count, error + other_error)
+
+        if len(merged) > self.capacity:
+            merged = dict(
+                heapq.nlargest(self.capacity, merged.items(), key=lambda item: item[1][0])
+            )
+
+        return SpaceSaving(self.capacity, self.total + total, merged)
+
+    def update(self, counts: dict) -> "SpaceSaving":
+        """
+        Count a batch of strings.
+
+        Parameters:
+            counts (dict): The exact number of occurrences of each string of the batch.
+
+        Returns:
+            SpaceSaving: The updated summary.
+        """
+        counters = {key: (count, 0) for key, count in counts.items()}
+
+        if not self.counters and len(counters) <= self.capacity:
+            return SpaceSaving(self.capacity, self.total + sum(counts.values()), counters)
+
+        return self._merged(counters, 0, sum(counts.values()))
+
+    def merge(self, other: "SpaceSaving") -> "SpaceSaving":
+        """
+        Merge with another summary, keeping the capacity of this one.
+
+        Parameters:
+            other (SpaceSaving): The other summary.
+
+        Returns:
+            SpaceSaving: A summary of the strings counted by both.
+        """
+        return self._merged(other.counters, other.min_count(), other.total)
+
+    def top(self, limit: int) -> list:
+        """
+        List the most frequent strings.
+
+        Parameters:
+            limit (int): Maximum number of strings listed.
+
+        Returns:
+            List[tuple]: The string, its estimated count and the error of the estimate, the
+                highest counts first.
+        """
+        counters = sorted(self.counters.items(), key=lambda item: (-item[1][0], item[0]))
+        return [(key, count, error) for key, (count, error) in counters[:limit]]
+
+    def to_bytes(self) -> bytes:
+        """
+        Serialize the summary as JSON, formatted directly instead of through json.dumps.
+
+        Returns:
+            bytes: The serialized summary.
+        """
+        counters = ",".join(
+            [
+                "[%s,%d,%d]" % (encode_json_string(key), count, error)
+                for key, (count, error) in self.counters.items()
+            ]
+        )
+        return (
+            '{"capacity":%d,"total":%d,"counters":[%s]}' % (self.capacity, self.total, counters)
+        ).encode("utf-8")
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "SpaceSaving":
+        """
+        Read a summary serialized by to_bytes.
+
+        Parameters:
+            data (bytes): The serialized summary.
+
+        Returns:
+            SpaceSaving: The summary.
+        """
+        payload = SKETCH_JSON_DECODER.decode(data.decode("utf-8"))
+        return cls(
+            payload["capacity"],
+            payload["total"],
+            {key: (count, error) for key, count, error in payload["counters"]},
+        )
+
+
+def summarize_records(records, summaries: dict = None) -> dict:
+    """
+    Group the IP addresses and log IDs of records by software and day.
+
+    Parameters:
+        records (Iterable[tuple]): The software_name, timestamp, ip_address and log_id of each
+            record, records without a timestamp are left out.
+        summaries (dict): Summaries to add the records to, new ones if None.
+
+    Returns:
+        dict: The number of records and the number of occurrences of each IP address and log
+            ID, by (software_name, day).
+    """
+    summaries = summaries if summaries is not None else {}
+    days = {}
+
+    for software_name, timestamp, ip_address, log_id in records:
+        if timestamp is None:
+            continue
+
+        date = timestamp.date()
+        day = days.get(date)
+        if day is None:
+            day = days[date] = date.isoformat()
+
+        summary = summaries.get((software_name, day))
+        if summary is None:
+            summary = summaries[software_name, day] = [0, {}, {}]
+
+        summary[0] += 1
+        ip_counts = summary[1]
+        ip_counts[ip_address] = ip_counts.get(ip_address, 0) + 1
+        log_id_counts = summary[2]
+        log_id_counts[log_id] = log_id_counts.get(log_id, 0) + 1
+
+    return summaries
+
+
+def summarize_stored_records(pairs) -> dict:
+    """
+    Group the IP addresses and log IDs of the saved records of the given softwares and days.
+
+    Parameters:
+        pairs (Iterable[tuple]): The (software_name, day) pairs.
+
+    Returns:
+        dict: The summaries of the pairs that have records, as returned by summarize_records.
+    """
+    summaries = {}
+
+    for software_name, day in sorted(pairs):
+        start, end = day_range(day)
+        summarize_records(
+            db.session.query(Log.software_name, Log.timestamp, Log.ip_address, Log.log_id)
+            .filter(
+                Log.software_name == software_name,
+                Log.timestamp >= start,
+                Log.timestamp < end,
+            )
+            .yield_per(SKETCH_REBUILD_BATCH_SIZE),
+            summaries,
+        )
+
+    return summaries
+
+
+def new_sketch() -> list:
+    """
+    Create the empty sketches of a software and day.
+
+    Returns:
+        list: The number of records, HyperLogLog of IP addresses and Space-Saving summaries of
+            IP addresses and log IDs.
+    """
+    return [
+        0,
+        HyperLogLog(SKETCH_HLL_PRECISION),
+        SpaceSaving(SKETCH_TOP_CAPACITY),
+        SpaceSaving(SKETCH_TOP_CAPACITY),
+    ]
+
+
+def load_sketches(pairs: list) -> dict:
+    """
+    Read the sketches of the given softwares and days, locking them on PostgreSQL.
+
+    Parameters:
+        pairs (List[tuple]): The (software_name, day) pairs.
+
+    Returns:
+        dict: The number of records, HyperLogLog and Space-Saving summaries of IP addresses and
+            log IDs of each pair that has sketches.
+    """
+    key_columns = tuple_(LogSketch.software_name, LogSketch.day)
+    sketches = {}
+
+    for index in range(0, len(pairs), SKETCH_LOOKUP_CHUNK_SIZE):
+        query = db.session.query(
+            LogSketch.software_name,
+            LogSketch.day,
+            LogSketch.rows,
+            LogSketch.distinct_ips,
+            LogSketch.top_ips,
+            LogSketch.top_log_ids,
+        ).filter(key_columns.in_(pairs[index : index + SKETCH_LOOKUP_CHUNK_SIZE]))
+
+        if db.engine.dialect.name == "postgresql":
+            query = query.with_for_update()
+
+        for software_name, day, rows, distinct_ips, top_ips, top_log_ids in query:
+            sketches[software_name, day] = [
+                rows,
+                HyperLogLog.from_bytes(distinct_ips),
+                SpaceSaving.from_bytes(top_ips),
+                SpaceSaving.from_bytes(top_log_ids),
+            ]
+
+    return sketches
+
+
+def apply_sketch_summaries(summaries: dict, sketches: dict) -> None:
+    """
+    Add record summaries to sketches held in memory, reading the missing ones from the database.
+
+    The IP addresses of all the summaries are hashed in a single hash_strings call. A stored
+    sketch hashed with blake2b is recomputed from the saved records instead, which already hold
+    the summarized ones.
+
+    Parameters:
+        summaries (dict): The summaries returned by summarize_records.
+        sketches (dict): The sketches of each (software_name, day), as returned by
+            load_sketches, updated in place.
+
+    Returns:
+        None
+    """
+    if not summaries:
+        return
+
+    loaded = load_sketches(sorted(pair for pair in summaries if pair not in sketches))
+    legacy_pairs = [pair for pair, sketch in loaded.items() if sketch[1].legacy_hash]
+
+    if legacy_pairs:
+        summaries = {**summaries, **summarize_stored_records(legacy_pairs)}
+        loaded.update((pair, new_sketch()) for pair in legacy_pairs)
+
+    for pair in summaries:
+        if pair not in sketches:
+            sketches[pair] = loaded.get(pair) or new_sketch()
+
+    hashes = hash_strings(
+        [ip_address for _, ip_counts, _ in summaries.values() for ip_address in ip_counts]
+    )
+    offset = 0
+
+    for pair, (rows, ip_counts, log_id_counts) in summaries.items():
+        sketch = sketches[pair]
+
+        sketch[0] += rows
+        sketch[1].add_hashes(hashes[offset : offset + len(ip_counts)])
+        sketch[2] = sketch[2].update(ip_counts)
+        sketch[3] = sketch[3].update(log_id_counts)
+        offset += len(ip_counts)
+
+
+def write_sketches(sketches: dict) -> None:
+    """
+    Serialize sketches and save them in the current transaction, replacing the stored ones.
+
+    On SQLite the upsert is executed by the driver directly.
+
+    Parameters:
+        sketches (dict): The sketches of each (software_name, day), as returned by load_sketches.
+
+    Returns:
+        None
+    """
+    if not sketches:
+        return
+
+    columns = ("software_name", "day", "rows", "distinct_ips", "top_ips", "top_log_ids")
+    values = [
+        (
+            software_name,
+            day,
+            rows,
+            distinct_ips.to_bytes(),
+            top_ips.to_bytes(),
+            top_log_ids.to_bytes(),
+        )
+        for (software_name, day), (rows, distinct_ips, top_ips, top_log_ids) in sorted(
+            sketches.items()
+        )
+    ]
+
+    table = LogSketch.__table__
+    dialect = db.engine.dialect.name
+
+    if dialect == "sqlite":
+        quote = db.engine.dialect.identifier_preparer.quote
+        db.session.connection().exec_driver_sql(
+            f"INSERT INTO {table.name} ({', '.join(quote(column) for column in columns)}) "
+            f"VALUES ({', '.join('?' for _ in columns)}) "
+            "ON CONFLICT (software_name, day) DO UPDATE SET "
+            + ", ".join(f"{quote(column)} = excluded.{quote(column)}" for column in columns[2:]),
+            values,
+        )
+        return
+
+    values = [dict(zip(columns, value)) for value in values]
+
+    if dialect == "postgresql":
+        statement = postgresql.insert(table)
+        statement = statement.on_conflict_do_update(
+            index_elements=[table.c.software_name, table.c.day],
+            set_={column: statement.excluded[column] for column in columns[2:]},
+        )
+        db.session.execute(statement, values)
+    else:
+        for value in values:
+            db.session.execute(
+                table.delete().where(
+                    table.c.software_name == value["software_name"], table.c.day == value["day"]
+                )
+            )
+        db.session.execute(table.insert(), values)
+
+
+def write_sketch_summaries(summaries: dict) -> None:
+    """
+    Add record summaries to the stored sketches in the current transaction.
+
+    Parameters:
+        summaries (dict): The summaries returned by summarize_records.
+
+    Returns:
+        None
+    """
+    sketches = {}
+    apply_sketch_summaries(summaries, sketches)
+    write_sketches(sketches)
+
+
+class SketchBuffer:
+    """
+    Accumulates the summaries of the rows inserted by an extraction until they are written.
+
+    Whenever the buffer holds SKETCH_BUFFER_ROWS rows, to bound its memory, the summaries are
+    added to the sketches held in memory. The sketches changed are serialized and written once
+    per flush, before each commit, so they stay in the transaction of the records, however many
+    batches a software and day is found in.
+
+    Attributes:
+        - summaries (dict): The summaries not added to the sketches yet, by (software_name, day).
+        - rows (int): Number of rows summarized since the summaries were last added.
+        - sketches (dict): The sketches changed since the last flush, by (software_name, day).
+
+    Methods:
+        - add: Summarizes inserted rows.
+        - apply: Adds the summaries to the sketches held in memory.
+        - flush: Writes the changed sketches.
+    """
+
+    def __init__(self) -> None:
+        """
+        Initializes an empty SketchBuffer.
+
+        Returns:
+            None
+        """
+        self.summaries = {}
+        self.rows = 0
+        self.sketches = {}
+
+    def add(self, rows: list) -> None:
+        """
+        Summarize inserted rows, adding the summaries to the sketches if the buffer is full.
+
+        Parameters:
+            rows (List[tuple]): The rows, with values in the LOG_RECORD_COLUMNS order.
+
+        Returns:
+            None
+        """
+        if not SKETCHES_ENABLED or not rows:
+            return
+
+        records = (
+            (row[SOFTWARE_NAME_INDEX], row[TIMESTAMP_INDEX], row[IP_ADDRESS_INDEX], row[LOG_ID_INDEX])
+            for row in rows
+        )
+        summarize_records(records, self.summaries)
+        self.rows += len(rows)
+
+        if self.rows >= SKETCH_BUFFER_ROWS:
+            self.apply()
+
+    def apply(self) -> None:
+        """
+        Add the summaries to the sketches held in memory and empty them.
+
+        Returns:
+            None
+        """
+        apply_sketch_summaries(self.summaries, self.sketches)
+        self.summaries = {}
+        self.rows = 0
+
+    def flush(self) -> None:
+        """
+        Write the sketches changed since the last flush in the current transaction.
+
+        Returns:
+            None
+        """
+        self.apply()
+        write_sketches(self.sketches)
+        self.sketches = {}
+
+
+def day_range(day: str) -> tuple:
+    """
+    Find the first moment of a day and of the next one.
+
+    Parameters:
+        day (str): The day, as yyyy-mm-dd.
+
+    Returns:
+        tuple: The start of the day and the start of the next day.
+    """
+    start = datetime.strptime(day, "%Y-%m-%d")
+    return start, start + timedelta(days=1)
+
+
+def refresh_sketches(pairs: set) -> None:
+    """
+    Recompute the sketches of the given softwares and days from their remaining records, in
+    the current transaction, after records were deleted.
+
+    Parameters:
+        pairs (set): The (software_name, day) pairs whose records changed.
+
+    Returns:
+        None
+    """
+    if not SKETCHES_ENABLED or not pairs:
+        return
+
+    table = LogSketch.__table__
+
+    for software_name, day in sorted(pairs):
+        db.session.execute(
+            table.delete().where(table.c.software_name == software_name, table.c.day == day)
+        )
+
+    write_sketch_summaries(summarize_stored_records(pairs))
+
+
+def sketch_pair(software_name: str, timestamp) -> tuple:
+    """
+    Find the sketch a record belongs to.
+
+    Parameters:
+        software_name (str): The software name of the record.
+        timestamp (datetime or None): The moment of the event.
+
+    Returns:
+        tuple or None: The (software_name, day), None for a record without timestamp.
+    """
+    if timestamp is None:
+        return None
+
+    return software_name, timestamp.strftime("%Y-%m-%d")
+
+
+def clear_sketches() -> None:
+    """
+    Delete every sketch in the current transaction.
+
+    Returns:
+        None
+    """
+    db.session.query(LogSketch).delete()
+
+
+def rebuild_sketches(batch_size: int = None) -> int:
+    """
+    Recompute every sketch from the log records, with the current precision and capacity.
+
+    Parameters:
+        batch_size (int): Number of records read at a time, SKETCH_REBUILD_BATCH_SIZE if None.
+
+    Returns:
+        int: Number of sketches written.
+    """
+    batch_size = batch_size or SKETCH_REBUILD_BATCH_SIZE
+    clear_sketches()
+
+    records = db.session.query(
+        Log.software_name, Log.timestamp, Log.ip_address, Log.log_id
+    ).order_by(Log.timestamp).yield_per(batch_size)
+
+    written = set()
+    batch = []
+    for record in records:
+        batch.append(record)
+
+        if len(batch) >= batch_size:
+            summaries = summarize_records(batch)
+            write_sketch_summaries(summaries)
+            written.update(summaries)
+            batch = []
+
+    summaries = summarize_records(batch)
+    write_sketch_summaries(summaries)
+    written.update(summaries)
+
+    db.session.commit()
+    return len(written)
+
+
+def parse_sketch_filters(args) -> dict:
+    """
+    Extract the sketch filters from the request arguments.
+
+    Parameters:
+        args (MultiDict): The request query arguments.
+
+    Returns:
+        dict: The software_name given, and the date_from and date_to converted to yyyy-mm-dd.
+
+    Raises:
+        ValueError: If a date filter is invalid.
+    """
+    filters = {}
+
+    if args.get("software_name"):
+        filters["software_name"] = args["software_name"]
+
+    for name in ("date_from", "date_to"):
+        if args.get(name):
+            filters[name] = parse_date(args[name]).isoformat()
+
+    return filters
+
+
+def parse_top_limit(value) -> int:
+    """
+    Validate the requested number of most frequent values.
+
+    Parameters:
+        value (str or None): The limit argument of the request.
+
+    Returns:
+        int: The number of values, DEFAULT_TOP_LIMIT if no limit was given.
+
+    Raises:
+        ValueError: If the limit is not an integer between 1 and SKETCH_TOP_CAPACITY.
+    """
+    if value in (None, ""):
+        return DEFAULT_TOP_LIMIT
+
+    try:
+        limit = int(value)
+    except ValueError:
+        raise ValueError(f"Invalid limit '{value}'")
+
+    if not 1 <= limit <= SKETCH_TOP_CAPACITY:
+        raise ValueError(f"The limit must be between 1 and {SKETCH_TOP_CAPACITY}")
+
+    return limit
+
+
+def query_sketches(column, filters: dict):
+    """
+    Read one kind of sketch of the softwares and days matching the filters.
+
+    Parameters:
+        column: The LogSketch column of the sketch.
+        filters (dict): The filters returned by parse_sketch_filters.
+
+    Returns:
+        Query: The number of records and the serialized sketch of each matching software and day.
+    """
+    query = db.session.query(LogSketch.rows, column)
+
+    if "software_name" in filters:
+        query = query.filter(LogSketch.software_name == filters["software_name"])
+    if "date_from" in filters:
+        query = query.filter(LogSketch.day >= filters["date_from"])
+    if "date_to" in filters:
+        query = query.filter(LogSketch.day <= filters["date_to"])
+
+    return query.yield_per(SKETCH_LOOKUP_CHUNK_SIZE)
+
+
+def count_distinct_ips(filters: dict) -> dict:
+    """
+    Estimate the number of distinct IP addresses of the records matching the filters.
+
+    Parameters:
+        filters (dict): The filters returned by parse_sketch_filters.
+
+    Returns:
+        dict: The estimate, its relative standard error, the number of records and the number
+            of sketches merged.
+    """
+    merged = HyperLogLog(SKETCH_HLL_PRECISION)
+    rows = 0
+    sketches = 0
+
+    for sketch_rows, data in query_sketches(LogSketch.distinct_ips, filters):
+        merged = merged.merge(HyperLogLog.from_bytes(data))
+        rows += sketch_rows
+        sketches += 1
+
+    return {
+        "distinct_ips": merged.estimate(),
+        "relative_error": round(merged.relative_error, 6),
+        "rows": rows,
+        "sketches": sketches,
+    }
+
+
+def get_top_values(dimension: str, filters: dict, limit: int) -> dict:
+    """
+    Find the most frequent values of a dimension among the records matching the filters.
+
+    Every merge of the summaries raises the bound of the values not listed, which ends up
+    close to rows / SKETCH_TOP_CAPACITY. A value is only known to be frequent when its
+    min_count is above max_unlisted_count, without heavy hitters every listed count is about
+    that bound and says nothing about the value.
+
+    Parameters:
+        dimension (str): One of SKETCH_DIMENSIONS.
+        filters (dict): The filters returned by parse_sketch_filters.
+        limit (int): Maximum number of values, at most SKETCH_TOP_CAPACITY.
+
+    Returns:
+        dict: The values with their estimated count and the lowest count they may have, the
+            bound of the count of the values not listed, the number of records and the number
+            of sketches merged.
+
+    Raises:
+        ValueError: If the dimension or the limit is invalid.
+    """
+    if dimension not in SKETCH_DIMENSIONS:
+        raise ValueError(
+            f"Invalid dimension '{dimension}', expected one of {', '.join(SKETCH_DIMENSIONS)}"
+        )
+
+    if limit < 1 or limit > SKETCH_TOP_CAPACITY:
+        raise ValueError(f"The limit must be between 1 and {SKETCH_TOP_CAPACITY}")
+
+    merged = SpaceSaving(SKETCH_TOP_CAPACITY)
+    rows = 0
+    sketches = 0
+
+    column = getattr(LogSketch, SKETCH_DIMENSIONS[dimension])
+    for sketch_rows, data in query_sketches(column, filters):
+        merged = merged.merge(SpaceSaving.from_bytes(data))
+        rows += sketch_rows
+        sketches += 1
+
+    return {
+        "data": [
+            {dimension: value, "count": count, "min_count": count - error}
+            for value, count, error in merged.top(limit)
+        ],
+        "max_unlisted_count": merged.min_count(),
+        "rows": rows,
+        "sketches": sketches,
+    }
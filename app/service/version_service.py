@@ -0,0 +1,162 @@
+"""
+Version Service Module
+------------------------
+Responsible to maintain the version of the log records data and to derive the HTTP validators
+of the read endpoints from it.
+
+Every transaction inserting or deleting log records increments the version, so the ETag and
+Last-Modified of a response can be checked against a single primary key lookup instead of
+running the query again, and the response cache and the analytics engine of every process
+notice the change. The row of a table is locked from its increment to the commit, so the
+writing transactions are serialized on it and increment it right before committing.
+
+Author: Álef Ádonis dos Santos Carlos
+Date: 10/01/2024
+"""
+
+from ..extensions import db
+from ..models.data_version_model import DataVersion
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql, sqlite
+from typing import Optional
+
+
+LOG_RECORDS_VERSION = "log_records"
+
+
+def bump_data_version(name: str = LOG_RECORDS_VERSION) -> int:
+    """
+    Increment the version of a table in the current transaction, creating it if needed.
+
+    Parameters:
+        name (str): The name of the versioned table.
+
+    Returns:
+        int: The new version, visible to the other transactions once committed.
+    """
+    table = DataVersion.__table__
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    dialect = db.engine.dialect.name
+
+    if dialect in ("postgresql", "sqlite"):
+        insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+        statement = insert(table).values(name=name, version=1, updated_at=now)
+        db.session.execute(
+            statement.on_conflict_do_update(
+                index_elements=[table.c.name],
+                set_={"version": table.c.version + 1, "updated_at": now},
+            )
+        )
+        return read_version_number(name)
+
+    updated = db.session.execute(
+        table.update()
+        .where(table.c.name == name)
+        .values(version=table.c.version + 1, updated_at=now)
+    ).rowcount
+
+    if not updated:
+        db.session.execute(table.insert().values(name=name, version=1, updated_at=now))
+
+    return read_version_number(name)
+
+
+def read_version_number(name: str = LOG_RECORDS_VERSION) -> int:
+    """
+    Read the version number of a table from the database, bypassing the session identity map.
+
+    Parameters:
+        name (str): The name of the versioned table.
+
+    Returns:
+        int: The version, 0 if the data of the table never changed.
+    """
+    table = DataVersion.__table__
+    version = db.session.execute(
+        select(table.c.version).where(table.c.name == name)
+    ).scalar()
+
+    return version or 0
+
+
+def get_data_version(name: str = LOG_RECORDS_VERSION) -> Optional[DataVersion]:
+    """
+    Read the version of a table.
+
+    Parameters:
+        name (str): The name of the versioned table.
+
+    Returns:
+        DataVersion or None: The version, None if the data of the table never changed.
+    """
+    return db.session.get(DataVersion, name)
+
+
+def data_version_number(data_version: Optional[DataVersion]) -> int:
+    """
+    Find the number the response cache and the analytics engine key a data version on.
+
+    Parameters:
+        data_version (DataVersion or None): The data version read before the query.
+
+    Returns:
+        int: The version, 0 if the data never changed.
+    """
+    return data_version.version if data_version is not None else 0
+
+
+def ensure_data_version(name: str = LOG_RECORDS_VERSION) -> None:
+    """
+    Create the version of a table if it does not exist, so the data saved before the versions
+    were maintained is served with validators too.
+
+    Parameters:
+        name (str): The name of the versioned table.
+
+    Returns:
+        None
+    """
+    if get_data_version(name) is None:
+        bump_data_version(name)
+        db.session.commit()
+
+
+def build_entity_tag(data_version: DataVersion) -> str:
+    """
+    Build the strong entity tag of the responses computed from a data version.
+
+    The moment of the change is part of the tag, so a version number reused after the table
+    was recreated does not match the tags of the old data.
+
+    Parameters:
+        data_version (DataVersion): The data version.
+
+    Returns:
+        str: The opaque tag, without quotes.
+    """
+    return f"{data_version.version}-{data_version.updated_at:%Y%m%d%H%M%S%f}"
+
+
+def last_modified_at(data_version: DataVersion, now: datetime = None) -> Optional[datetime]:
+    """
+    Find the Last-Modified moment of the responses computed from a data version.
+
+    HTTP dates have a resolution of one second, so a change made in the current second could
+    not be told apart from the next one. The moment is only given once that second is over.
+
+    Parameters:
+        data_version (DataVersion): The data version.
+        now (datetime): The current moment in UTC, the clock if None.
+
+    Returns:
+        datetime or None: The moment of the change truncated to the second, as an aware UTC
+            datetime, None if it is too recent.
+    """
+    now = now or datetime.now(timezone.utc).replace(tzinfo=None)
+    modified_at = data_version.updated_at.replace(microsecond=0)
+
+    if modified_at + timedelta(seconds=1) > now:
+        return None
+
+    return modified_at.replace(tzinfo=timezone.utc)
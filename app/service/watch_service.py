@@ -0,0 +1,191 @@
+"""
+Watch Service Module
+------------------------
+Responsible to ingest the log lines appended to the files of LOG_PATH continuously.
+
+The directory is polled every WATCH_INTERVAL seconds with a stat of each file, which works on
+every platform and does not open the files. Files whose inode, size or modification time
+changed are extracted through the usual manifest, parse and save path, so only their new
+complete lines are read and the offsets survive a restart. The changes are grouped: an
+extraction starts once WATCH_COMMIT_BYTES were appended or WATCH_COMMIT_SECONDS passed since
+the first pending change, instead of a transaction per appended line.
+
+Author: Álef Ádonis dos Santos Carlos
+Date: 10/01/2024
+"""
+
+from .log_service import (
+    DIR_PATH,
+    ExtractionInProgressError,
+    extract_log_records_from_files,
+    extraction_lock,
+    save_records_in_database,
+)
+from flask import current_app
+from typing import Callable
+import os
+import threading
+import time
+
+
+WATCH_INTERVAL = float(os.environ.get("WATCH_INTERVAL", 1))
+WATCH_COMMIT_BYTES = int(os.environ.get("WATCH_COMMIT_BYTES", 1024 * 1024))
+WATCH_COMMIT_SECONDS = float(os.environ.get("WATCH_COMMIT_SECONDS", 5))
+
+
+class LogWatcher:
+    """
+    Polls a log directory and extracts the files that changed, grouping the changes.
+
+    Attributes:
+        - path (str): The watched directory, LOG_PATH, the one the extraction and its manifest read.
+        - interval (float): Number of seconds between two polls.
+        - commit_bytes (int): Number of appended bytes that starts an extraction.
+        - commit_seconds (float): Maximum number of seconds a change waits for its extraction.
+        - pending (set): The names of the files changed since the last extraction.
+        - pending_bytes (int): Number of bytes appended to them, the whole size of new or rewritten files.
+
+    Methods:
+        - poll: Compares the files with the previous poll and records the changes.
+        - is_due: Checks if the pending changes have to be extracted.
+        - flush: Extracts and saves the pending changes.
+        - run: Polls and flushes until stopped.
+    """
+
+    def __init__(
+        self,
+        interval: float = None,
+        commit_bytes: int = None,
+        commit_seconds: float = None,
+    ) -> None:
+        """
+        Initializes a LogWatcher without pending changes.
+
+        Parameters:
+            - interval (float): Number of seconds between two polls, WATCH_INTERVAL if None.
+            - commit_bytes (int): Number of appended bytes that starts an extraction, WATCH_COMMIT_BYTES if None.
+            - commit_seconds (float): Maximum wait of a change, WATCH_COMMIT_SECONDS if None.
+
+        Returns:
+            None
+        """
+        self.path = DIR_PATH
+        self.interval = interval if interval is not None else WATCH_INTERVAL
+        self.commit_bytes = commit_bytes if commit_bytes is not None else WATCH_COMMIT_BYTES
+        self.commit_seconds = commit_seconds if commit_seconds is not None else WATCH_COMMIT_SECONDS
+        self.pending = set()
+        self.pending_bytes = 0
+        self._pending_since = None
+        self._seen = {}
+
+    def poll(self) -> int:
+        """
+        Stat the files of the directory and record the ones changed since the previous poll.
+
+        The first poll records every file, the ones the manifest already covers are skipped by
+        the extraction without being opened.
+
+        Returns:
+            int: Number of files found changed.
+        """
+        seen = {}
+        changed = 0
+
+        with os.scandir(self.path) as entries:
+            for entry in entries:
+                try:
+                    if not entry.is_file():
+                        continue
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+
+                signature = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+                seen[entry.name] = signature
+                previous = self._seen.get(entry.name)
+
+                if previous == signature:
+                    continue
+
+                if previous is not None and previous[0] == stat.st_ino and previous[1] <= stat.st_size:
+                    self.pending_bytes += stat.st_size - previous[1]
+                else:
+                    self.pending_bytes += stat.st_size
+
+                self.pending.add(entry.name)
+                changed += 1
+
+        self._seen = seen
+
+        if self.pending and self._pending_since is None:
+            self._pending_since = time.monotonic()
+
+        return changed
+
+    def is_due(self) -> bool:
+        """
+        Check if the pending changes are large or old enough to be extracted.
+
+        Returns:
+            bool: True if there are pending changes and the size or the time threshold is reached.
+        """
+        if not self.pending:
+            return False
+
+        return (
+            self.pending_bytes >= self.commit_bytes
+            or time.monotonic() - self._pending_since >= self.commit_seconds
+        )
+
+    def flush(self) -> dict:
+        """
+        Extract and save the new lines of the pending files.
+
+        The pending changes are only cleared once they are saved, a failed extraction is tried
+        again by the next flush, like one skipped because another extraction was running.
+
+        Returns:
+            dict or None: The result of save_records_in_database, None if there was nothing new
+                or another extraction was running.
+        """
+        file_names = sorted(self.pending)
+
+        try:
+            with extraction_lock():
+                extraction = extract_log_records_from_files(file_names)
+                result = save_records_in_database(extraction) if extraction else None
+        except ExtractionInProgressError:
+            return None
+
+        self.pending.difference_update(file_names)
+        self.pending_bytes = 0
+        self._pending_since = time.monotonic() if self.pending else None
+        return result
+
+    def run(self, stop: threading.Event = None, on_flush: Callable = None) -> None:
+        """
+        Poll the directory and flush the pending changes when they are due, until stopped.
+
+        Parameters:
+            stop (threading.Event): Stops the loop once set, it runs until interrupted if None.
+            on_flush (Callable): Called with the files and the result of each flush that saved records.
+
+        Returns:
+            None
+        """
+        stop = stop or threading.Event()
+
+        while not stop.is_set():
+            try:
+                self.poll()
+
+                if self.is_due():
+                    file_names = sorted(self.pending)
+                    result = self.flush()
+
+                    if result is not None and on_flush is not None:
+                        on_flush(file_names, result)
+            except Exception:
+                current_app.logger.exception("Failed to ingest the changes of %s", self.path)
+
+            stop.wait(self.interval)
@@ -0,0 +1,19 @@
+"""
+WSGI Module
+------------------------
+Responsible to expose the application to a production WSGI server, e.g.
+`gunicorn --config gunicorn.conf.py app.wsgi:app`.
+
+Each serving process creates its own application and warms it up before it accepts
+requests. The tables are expected to exist, gunicorn.conf.py creates them once before the
+workers start.
+
+Author: Álef Ádonis dos Santos Carlos
+Date: 10/01/2024
+"""
+
+from .app import create_app, warm_up
+
+
+app = create_app()
+warm_up(app)
@@ -0,0 +1,8 @@
+"""
+Benchmarks Package
+------------------------
+Synthetic log generator and benchmark suite of the ingestion and query paths.
+
+Author: Álef Ádonis dos Santos Carlos
+Date: 10/01/2024
+"""
@@ -0,0 +1,197 @@
+"""
+Log Generator Module
+------------------------
+Responsible to write synthetic AccessLogs files for the benchmarks.
+
+The lines follow the ip;date;hour;software;version;log_id;title;description layout of the
+files in app/Logs, with software names, versions and words sampled from them, so the value
+distributions stay close to the real ones at any size.
+
+Usage:
+    python -m benchmarks.generate_logs --lines 1000000 --files 20 --duplicate-ratio 0.01 /tmp/logs
+
+Author: Álef Ádonis dos Santos Carlos
+Date: 10/01/2024
+"""
+
+from typing import NamedTuple
+import argparse
+import os
+import random
+
+
+SAMPLE_LOGS_PATH = os.path.join(os.path.dirname(__file__), os.pardir, "app", "Logs")
+MONTHS = ("Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec")
+RECENT_LINES_KEPT = 1000
+WRITE_BUFFER_LINES = 10000
+
+
+class Vocabulary(NamedTuple):
+    """
+    The values the synthetic lines are sampled from.
+
+    Attributes:
+        - software (List[tuple]): The (software_name, version) pairs.
+        - title_words (List[List[str]]): The words found at each position of the titles.
+        - description_words (List[str]): The words of the descriptions.
+    """
+
+    software: list
+    title_words: list
+    description_words: list
+
+
+def load_vocabulary(sample_path: str = SAMPLE_LOGS_PATH) -> Vocabulary:
+    """
+    Collect the values of the sample log files.
+
+    Parameters:
+        sample_path (str): The directory holding the sample log files.
+
+    Returns:
+        Vocabulary: The values found.
+    """
+    software = set()
+    title_words = [set(), set(), set()]
+    description_words = set()
+
+    for file_ in sorted(os.listdir(sample_path)):
+        with open(os.path.join(sample_path, file_), encoding="utf-8") as file:
+            for line in file:
+                record = line.rstrip("\n").split(";")
+                software.add((record[3], record[4]))
+
+                for index, word in enumerate(record[6].split()[:3]):
+                    title_words[index].add(word)
+
+                description_words.update(record[7].split())
+
+    return Vocabulary(
+        software=sorted(software),
+        title_words=[sorted(words) for words in title_words],
+        description_words=sorted(description_words),
+    )
+
+
+def generate_line(generator: random.Random, vocabulary: Vocabulary) -> str:
+    """
+    Generate a single log line, without the line break.
+
+    Parameters:
+        generator (random.Random): The random generator.
+        vocabulary (Vocabulary): The values to sample from.
+
+    Returns:
+        str: The log line.
+    """
+    software_name, version = generator.choice(vocabulary.software)
+    ip_address = ".".join(str(generator.randint(1, 254)) for _ in range(4))
+    date = f"{generator.randint(1, 28):02d}-{generator.choice(MONTHS)}-2022"
+    hour = (
+        f"{generator.randint(0, 23)}:{generator.randint(0, 59):02d}:"
+        f"{generator.randint(0, 59):02d}.000"
+    )
+    log_id = f"{generator.randint(100000000, 999999999)}-{generator.choice('0123456789X')}"
+    title = " ".join(generator.choice(words) for words in vocabulary.title_words).capitalize()
+    description = " ".join(
+        generator.choices(vocabulary.description_words, k=generator.randint(8, 20))
+    )
+
+    return ";".join(
+        (ip_address, date, hour, software_name, version, log_id, title, description)
+    )
+
+
+def generate_log_files(
+    directory: str,
+    lines: int,
+    files: int = 10,
+    duplicate_ratio: float = 0.0,
+    seed: int = 0,
+    vocabulary: Vocabulary = None,
+) -> list:
+    """
+    Write synthetic log files, spreading the lines evenly between them.
+
+    Duplicated lines repeat one of the last lines written to the same file, so they share its
+    log_id and origin file like a line read twice would.
+
+    Parameters:
+        directory (str): The directory the files are written to, created if missing.
+        lines (int): The total number of lines.
+        files (int): The number of files.
+        duplicate_ratio (float): The fraction of lines repeating a previous line, from 0 to 1.
+        seed (int): The seed of the random generator, the same seed writes the same files.
+        vocabulary (Vocabulary): The values to sample from, loaded from app/Logs if None.
+
+    Returns:
+        List[str]: The paths of the files written.
+
+    Raises:
+        ValueError: If the number of lines or files or the duplicate ratio is invalid.
+    """
+    if lines < 1 or files < 1:
+        raise ValueError("The number of lines and files must be positive")
+
+    if not 0 <= duplicate_ratio < 1:
+        raise ValueError("The duplicate ratio must be between 0 and 1")
+
+    vocabulary = vocabulary or load_vocabulary()
+    generator = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+
+    paths = []
+    for file_index in range(files):
+        file_lines = lines // files + (1 if file_index < lines % files else 0)
+        path = os.path.join(directory, f"AccessLogs ({file_index + 1}).log")
+        recent_lines = []
+        buffer = []
+
+        with open(path, "w", encoding="utf-8") as file:
+            for _ in range(file_lines):
+                if recent_lines and generator.random() < duplicate_ratio:
+                    line = generator.choice(recent_lines)
+                else:
+                    line = generate_line(generator, vocabulary)
+
+                    if len(recent_lines) < RECENT_LINES_KEPT:
+                        recent_lines.append(line)
+                    else:
+                        recent_lines[generator.randrange(RECENT_LINES_KEPT)] = line
+
+                buffer.append(line)
+                if len(buffer) >= WRITE_BUFFER_LINES:
+                    file.write("\n".join(buffer) + "\n")
+                    buffer = []
+
+            if buffer:
+                file.write("\n".join(buffer) + "\n")
+
+        paths.append(path)
+
+    return paths
+
+
+def main(argv: list = None) -> None:
+    parser = argparse.ArgumentParser(description="Write synthetic AccessLogs files.")
+    parser.add_argument("directory", help="Directory the files are written to.")
+    parser.add_argument("--lines", type=int, default=10000, help="Total number of lines.")
+    parser.add_argument("--files", type=int, default=10, help="Number of files.")
+    parser.add_argument(
+        "--duplicate-ratio", type=float, default=0.0, help="Fraction of repeated lines."
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the random generator.")
+    arguments = parser.parse_args(argv)
+
+    paths = generate_log_files(
+        arguments.directory,
+        arguments.lines,
+        arguments.files,
+        arguments.duplicate_ratio,
+        arguments.seed,
+    )
+    print(f"{arguments.lines} lines written to {len(paths)} files in {arguments.directory}")
+
+
+if __name__ == "__main__":
+    main()
@@ -28,6 +28,7 @@ const API_URL = process.env.REACT_APP_API_URL || "http://127.0.0.1:8080";
  */
 const App = () => {
   const [extractedLog, setExtractedLog] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
   const [loading, setLoading] = useState(false);
 
   /**
@@ -40,12 +41,29 @@ const App = () => {
   const retrieveLogs = useCallback(async () => {
     try {
       const savedLogs = await getSavedLogs();
-      setExtractedLog(savedLogs);
+      setExtractedLog(savedLogs.data);
+      setNextCursor(savedLogs.next_cursor);
     } catch (error) {
       toast.info("Error retrieving logs");
     }
   }, []);
 
+  /**
+   * Retrieves the next page of logs and appends it to the loaded ones.
+   *
+   * @async
+   * @function
+   */
+  const loadMoreLogs = async () => {
+    try {
+      const savedLogs = await getSavedLogs(nextCursor);
+      setExtractedLog((logs) => logs.concat(savedLogs.data));
+      setNextCursor(savedLogs.next_cursor);
+    } catch (error) {
+      toast.info("Error retrieving logs");
+    }
+  };
+
   useEffect(() => {
     retrieveLogs();
   }, [retrieveLogs]);
@@ -62,7 +80,7 @@ const App = () => {
       const res = await axios.post(`${API_URL}/logs/extract`);
 
       if (res.status === 200) {
-        setExtractedLog(res.data.data);
+        await retrieveLogs();
         toast.success("Logs Extracted!");
         setLoading(false);
       }
@@ -91,17 +109,20 @@ const App = () => {
   };
 
   /**
-   * Retrieves saved logs from the backend server.
+   * Retrieves a page of saved logs from the backend server.
    *
    * @async
    * @function
-   * @returns {Array} An array of log records.
+   * @param {string} [cursor] - The cursor returned with the previous page.
+   * @returns {Object} The log records of the page and the cursor of the next page.
    * @throws {Error} Throws an error if there is an issue getting logs.
    */
-  async function getSavedLogs() {
+  async function getSavedLogs(cursor) {
     try {
-      const res = await axios.get(`${API_URL}/logs`);
-      return res.data.data;
+      const res = await axios.get(`${API_URL}/logs`, {
+        params: { limit: 1000, cursor: cursor || undefined },
+      });
+      return res.data;
     } catch (error) {
       throw new Error("Error getting the Log Files!");
     }
@@ -123,7 +144,11 @@ const App = () => {
       ) : !extractedLog.length ? (
         <ExtractionSection extractionFunction={handleExtraction} />
       ) : (
-        <LogTable logs={extractedLog} reloadContent={retrieveLogs} />
+        <LogTable
+          logs={extractedLog}
+          reloadContent={retrieveLogs}
+          loadMore={nextCursor ? loadMoreLogs : null}
+        />
       )}
 
       <ToastContainer
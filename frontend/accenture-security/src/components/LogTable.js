@@ -7,6 +7,7 @@
  * @param {Object} props - The properties passed to the component.
  * @param {Array} props.logs - An array of log records to be displayed in the table.
  * @param {Function} props.reloadContent - The function to reload the content when the reload button is clicked.
+ * @param {Function} [props.loadMore] - The function to load the next page of records, null if there is none.
  *
  * @example
  * // Example usage of LogTable component:
@@ -53,10 +54,11 @@ const logColumns = [
  * @param {Object} props - The properties passed to the component.
  * @param {Array} props.logs - An array of log records to be displayed in the table.
  * @param {Function} props.reloadContent - The function to reload the content when the reload button is clicked.
+ * @param {Function} [props.loadMore] - The function to load the next page of records, null if there is none.
  *
  * @returns {JSX.Element} JSX element representing the LogTable component.
  */
-const LogTable = ({ logs, reloadContent }) => {
+const LogTable = ({ logs, reloadContent, loadMore }) => {
   return (
     <Box
       sx={{
@@ -79,6 +81,16 @@ const LogTable = ({ logs, reloadContent }) => {
         </Typography>
 
         <div style={{ marginLeft: "auto" }}>
+          {loadMore && (
+            <Button
+              variant="outlined"
+              style={{ height: "32px", marginRight: "10px" }}
+              title="Load more log records"
+              onClick={() => loadMore()}
+            >
+              Load more
+            </Button>
+          )}
           <Button
             variant="outlined"
             style={{
@@ -0,0 +1,152 @@
+"""
+Test Configuration Module
+------------------------
+Responsible to configure the application on a temporary SQLite database and log folder,
+before the modules reading their configuration from the environment are imported.
+
+Author: Álef Ádonis dos Santos Carlos
+Date: 10/01/2024
+"""
+
+import os
+import shutil
+import tempfile
+
+
+TEST_DIR = tempfile.mkdtemp(prefix="log-api-tests-")
+TEST_LOG_PATH = os.path.join(TEST_DIR, "Logs")
+os.makedirs(TEST_LOG_PATH)
+
+os.environ["DB_URL"] = "sqlite:///" + os.path.join(TEST_DIR, "logs.sqlite")
+os.environ["LOG_PATH"] = TEST_LOG_PATH
+os.environ["DEDUP_BLOOM_MIN_CAPACITY"] = "1000"
+
+import pytest
+from app.app import create_app, create_tables
+from app.service.cache_service import response_cache
+from app.service.log_parser import parse_log_text_rows
+from app.service.log_service import (
+    delete_all_log_records_from_database,
+    extract_log_records_from_files,
+    save_records_in_database,
+)
+
+
+def build_log_lines(count: int, first: int = 0, date: str = "05-Mar-2022") -> list:
+    """
+    Build log lines in the format of the access logs, with a distinct log_id each.
+
+    Parameters:
+        count (int): Number of lines.
+        first (int): The number of the first line, used in its log_id.
+        date (str): The date of the lines.
+
+    Returns:
+        List[str]: The lines, without line breaks.
+    """
+    return [
+        f"10.0.{number // 256 % 256}.{number % 256};{date};3:{number // 60 % 60:02d}:"
+        f"{number % 60:02d}.000;Tres-Zap;0.52;{number}-3;Title {number};Description {number}"
+        for number in range(first, first + count)
+    ]
+
+
+def build_log_rows(
+    count: int, first: int = 0, date: str = "05-Mar-2022", file_name: str = "access.log"
+) -> list:
+    """
+    Build the rows of log lines in the format of the access logs, as the parser returns them.
+
+    Parameters:
+        count (int): Number of rows.
+        first (int): The number of the first line, used in its log_id.
+        date (str): The date of the rows.
+        file_name (str): The origin_file of the rows.
+
+    Returns:
+        List[tuple]: The rows, with values in the LOG_RECORD_COLUMNS order.
+    """
+    text = "\n".join(build_log_lines(count, first, date)) + "\n"
+    return parse_log_text_rows(text, file_name, 0, len(text))
+
+
+@pytest.fixture(scope="session")
+def app():
+    """
+    The application, with its tables created on the temporary database.
+    """
+    app = create_app()
+    create_tables(app)
+    yield app
+    shutil.rmtree(TEST_DIR, ignore_errors=True)
+
+
+@pytest.fixture(autouse=True)
+def app_context(app):
+    """
+    An application context over an empty database, log folder and response cache.
+    """
+    with app.app_context():
+        delete_all_log_records_from_database()
+        response_cache.local.clear()
+
+        for file_name in os.listdir(TEST_LOG_PATH):
+            os.remove(os.path.join(TEST_LOG_PATH, file_name))
+
+        yield
+
+
+@pytest.fixture
+def client(app):
+    """
+    A test client of the application.
+    """
+    return app.test_client()
+
+
+@pytest.fixture
+def log_lines():
+    """
+    The build_log_lines function.
+    """
+    return build_log_lines
+
+
+@pytest.fixture
+def log_rows():
+    """
+    The build_log_rows function.
+    """
+    return build_log_rows
+
+
+@pytest.fixture
+def write_log():
+    """
+    A function writing a log file in the log folder, returning its path.
+    """
+
+    def write(file_name: str, data: bytes, mode: str = "wb", opener=open) -> str:
+        filepath = os.path.join(TEST_LOG_PATH, file_name)
+        with opener(filepath, mode) as file:
+            file.write(data)
+        return filepath
+
+    return write
+
+
+@pytest.fixture
+def ingest():
+    """
+    A function extracting the new lines of the log folder and saving them, returning the
+    summary of save_records_in_database or None if there was nothing new.
+    """
+
+    def run(**kwargs):
+        extraction = extract_log_records_from_files()
+        if extraction is None:
+            return None
+
+        return save_records_in_database(extraction, **kwargs)
+
+    return run
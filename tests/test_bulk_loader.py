@@ -0,0 +1,91 @@
+"""
+Bulk Loader Tests
+------------------------
+Responsible to test the bulk insert path of the log records and the throughput it reports.
+
+The COPY statement itself needs PostgreSQL, so its buffer is tested on its own.
+
+Author: Álef Ádonis dos Santos Carlos
+Date: 10/01/2024
+"""
+
+import pytest
+from app.extensions import db
+from app.models.log_record_model import Log, LOG_RECORD_COLUMNS
+from app.service.bulk_loader import (
+    bind_row_values,
+    build_copy_buffer,
+    bulk_insert_records,
+    supports_copy,
+)
+from sqlalchemy import func
+
+
+IP_INDEX = LOG_RECORD_COLUMNS.index("ip")
+
+
+def count_logs() -> int:
+    return db.session.query(func.count(Log.id)).scalar()
+
+
+def test_copy_buffer_escapes_the_text_format():
+    buffer = build_copy_buffer(
+        [("a\tb", "line\nbreak", None, "back\\slash", 7), ("plain", "\r", "", "x", 0)],
+        ("one", "two", "three", "four", "five"),
+    )
+
+    assert buffer.read() == (
+        "a\\tb\tline\\nbreak\t\\N\tback\\\\slash\t7\n" "plain\t\\r\t\tx\t0\n"
+    )
+
+
+def test_copy_is_only_used_on_postgresql():
+    assert not supports_copy()
+
+
+def test_rows_are_inserted_in_several_statements(log_rows):
+    rows = log_rows(7)
+
+    assert bulk_insert_records(rows, batch_size=3) == 7
+    db.session.commit()
+
+    saved = Log.query.order_by(Log.id).all()
+    assert [log.log_id for log in saved] == [row[5] for row in rows]
+    assert [log.timestamp for log in saved] == [row[9] for row in rows]
+    assert [log.ip for log in saved] == [row[IP_INDEX] for row in rows]
+
+
+def test_rows_are_left_in_the_open_transaction(log_rows):
+    bulk_insert_records(log_rows(5), batch_size=2)
+    assert count_logs() == 5
+
+    db.session.rollback()
+
+    assert count_logs() == 0
+
+
+def test_invalid_ip_is_saved_as_null(log_rows):
+    row = log_rows(1)[0]
+    row = row[:IP_INDEX] + ("not-an-ip",)
+
+    assert bind_row_values([row], Log.__table__, LOG_RECORD_COLUMNS)[0][IP_INDEX] is None
+
+    bulk_insert_records([row])
+    db.session.commit()
+
+    log = Log.query.one()
+    assert log.ip is None
+    assert log.ip_address == row[0]
+
+
+def test_extraction_reports_its_throughput(write_log, log_lines, ingest):
+    write_log("access.log", "\n".join(log_lines(50)).encode() + b"\n")
+
+    summary = ingest()
+
+    assert summary["rows"] == summary["inserted"] == 50
+    assert summary["seconds"] > 0
+    assert summary["rows_per_second"] == pytest.approx(
+        summary["rows"] / summary["seconds"], rel=0.01
+    )
+    assert len(summary["data"]) == 6
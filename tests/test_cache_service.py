@@ -0,0 +1,117 @@
+"""
+Cache Service Tests
+------------------------
+Responsible to test the response cache and its invalidation by the data version.
+
+Author: Álef Ádonis dos Santos Carlos
+Date: 10/01/2024
+"""
+
+from app.service.cache_service import (
+    LRUCache,
+    MemoryCacheBackend,
+    ResponseCache,
+    create_shared_backend,
+    response_cache,
+)
+from app.service.log_service import (
+    delete_log_record_by_id,
+    get_all_logs_from_database,
+    get_log_by_id,
+)
+from app.service.version_service import read_version_number
+
+
+def test_lru_evicts_the_least_recently_used():
+    cache = LRUCache(max_entries=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.evictions == 1
+    assert (cache.hits, cache.misses) == (3, 1)
+
+
+def test_lru_expires_old_entries():
+    cache = LRUCache(max_entries=10, ttl=-1)
+    cache.set("a", 1)
+
+    assert cache.get("a") is None
+    assert cache.expirations == 1
+    assert len(cache) == 0
+
+
+def test_new_version_invalidates_older_entries():
+    cache = ResponseCache(LRUCache(max_entries=10, ttl=60))
+    cache.set("key", "old", version=1)
+
+    assert cache.get("key", 1) == "old"
+    assert cache.get("key", 2) is None
+    assert len(cache.local) == 0
+
+    cache.set("key", "stale", version=1)
+    assert cache.get("key", 1) is None
+
+
+def test_disabled_cache_stores_nothing():
+    cache = ResponseCache(LRUCache(max_entries=10, ttl=60), enabled=False)
+    cache.set("key", "value", version=1)
+
+    assert cache.get("key", 1) is None
+    assert len(cache.local) == 0
+
+
+def test_shared_backend_fills_the_local_cache():
+    shared = MemoryCacheBackend()
+    writer = ResponseCache(LRUCache(max_entries=10, ttl=60), shared=shared)
+    reader = ResponseCache(LRUCache(max_entries=10, ttl=60), shared=shared)
+    writer.set("key", {"id": "1"}, version=3)
+
+    assert reader.get("key", 3) == {"id": "1"}
+    assert reader.shared_hits == 1
+    assert len(reader.local) == 1
+    assert reader.get("key", 4) is None
+    assert reader.shared_misses == 1
+
+
+def test_memory_backend_expires_values():
+    backend = MemoryCacheBackend()
+    backend.set("kept", "1")
+    backend.set("expired", "2", ex=-1)
+
+    assert backend.get("kept") == "1"
+    assert backend.get("expired") is None
+    assert create_shared_backend("") is None
+    assert isinstance(create_shared_backend("memory"), MemoryCacheBackend)
+
+
+def test_deleted_record_is_not_served_from_the_cache(write_log, log_lines, ingest):
+    write_log("access.log", ("\n".join(log_lines(3)) + "\n").encode())
+    ingest()
+    first_id = get_all_logs_from_database(limit=1)["data"][0]["id"]
+
+    assert get_log_by_id(first_id) is not None
+    assert get_log_by_id(first_id) is not None
+    hits = response_cache.local.hits
+
+    delete_log_record_by_id(first_id)
+
+    assert get_log_by_id(first_id) is None
+    assert response_cache.local.hits == hits
+    assert response_cache.version == read_version_number()
+
+
+def test_extraction_invalidates_cached_pages(write_log, log_lines, ingest):
+    write_log("access.log", ("\n".join(log_lines(3)) + "\n").encode())
+    ingest()
+
+    assert len(get_all_logs_from_database(limit=10)["data"]) == 3
+
+    write_log("access.log", ("\n".join(log_lines(2, first=3)) + "\n").encode(), mode="ab")
+    ingest()
+
+    assert len(get_all_logs_from_database(limit=10)["data"]) == 5
@@ -0,0 +1,107 @@
+"""
+Dedup Service Tests
+------------------------
+Responsible to test that duplicated log records are skipped, including when the Bloom filter
+does not know the saved ones.
+
+Author: Álef Ádonis dos Santos Carlos
+Date: 10/01/2024
+"""
+
+from app.extensions import db
+from app.models.log_record_model import Log
+from app.service import dedup_service
+from app.service.dedup_service import (
+    BloomFilter,
+    dedup_key,
+    find_saved_keys,
+    get_bloom_filter,
+    insert_new_records,
+)
+from app.service.log_parser import parse_log_text_rows
+from app.service.manifest_service import clear_manifest
+from sqlalchemy import func
+
+
+def parse_rows(lines: list, file_name: str = "access.log") -> list:
+    text = "\n".join(lines) + "\n"
+    return parse_log_text_rows(text, file_name, 0, len(text))
+
+
+def count_logs() -> int:
+    return db.session.query(func.count(Log.id)).scalar()
+
+
+def test_duplicated_rows_in_a_batch_are_inserted_once(log_lines):
+    rows = parse_rows(log_lines(3) + log_lines(2))
+
+    inserted_rows, skipped = insert_new_records(rows)
+    db.session.commit()
+
+    assert (len(inserted_rows), skipped) == (3, 2)
+    assert count_logs() == 3
+
+
+def test_saved_rows_are_skipped(log_lines):
+    insert_new_records(parse_rows(log_lines(3)))
+    db.session.commit()
+
+    inserted_rows, skipped = insert_new_records(parse_rows(log_lines(5)))
+    db.session.commit()
+
+    assert [row[5] for row in inserted_rows] == ["3-3", "4-3"]
+    assert skipped == 3
+    assert count_logs() == 5
+
+
+def test_same_log_id_in_another_file_is_not_a_duplicate(log_lines):
+    insert_new_records(parse_rows(log_lines(3), "first.log"))
+    inserted_rows, skipped = insert_new_records(parse_rows(log_lines(3), "second.log"))
+    db.session.commit()
+
+    assert (len(inserted_rows), skipped) == (3, 0)
+    assert count_logs() == 6
+
+
+def test_rows_saved_by_another_process_fall_back_to_the_checked_path(log_lines):
+    rows = parse_rows(log_lines(4))
+    insert_new_records(rows[:2])
+    db.session.commit()
+
+    dedup_service.bloom_filter = BloomFilter(1000, 0.01)
+    assert not any(get_bloom_filter().might_contain(dedup_key(row)) for row in rows)
+
+    inserted_rows, skipped = insert_new_records(rows)
+    db.session.commit()
+
+    assert [row[5] for row in inserted_rows] == ["2-3", "3-3"]
+    assert skipped == 2
+    assert count_logs() == 4
+    assert all(get_bloom_filter().might_contain(dedup_key(row)) for row in inserted_rows)
+
+
+def test_bloom_filter_is_rebuilt_from_the_saved_records(log_lines):
+    rows = parse_rows(log_lines(3))
+    insert_new_records(rows)
+    db.session.commit()
+
+    dedup_service.reset_bloom_filter()
+
+    assert all(get_bloom_filter().might_contain(dedup_key(row)) for row in rows)
+    assert find_saved_keys(rows) == {dedup_key(row) for row in rows}
+    assert insert_new_records(rows) == ([], 3)
+
+
+def test_extracting_a_copy_of_a_file_skips_its_records(write_log, log_lines, ingest):
+    lines = "\n".join(log_lines(5)).encode() + b"\n"
+    write_log("access.log", lines)
+    ingest()
+
+    dedup_service.reset_bloom_filter()
+    clear_manifest()
+    db.session.commit()
+
+    summary = ingest()
+
+    assert (summary["rows"], summary["inserted"], summary["skipped"]) == (5, 0, 5)
+    assert count_logs() == 5
@@ -0,0 +1,116 @@
+"""
+Delete Logs Tests
+------------------------
+Responsible to test the filtered deletion in batches and the deletion of every log record.
+
+Author: Álef Ádonis dos Santos Carlos
+Date: 10/01/2024
+"""
+
+import pytest
+import time
+from app.extensions import db
+from app.models.ingestion_manifest_model import IngestionManifest
+from app.models.log_record_model import Log
+from app.models.log_rollup_model import LogRollup
+from app.service.job_service import JOB_FINISHED_STATUSES, JOB_SUCCEEDED
+from app.service.log_query import parse_log_filters
+from app.service.log_service import (
+    delete_all_log_records_from_database,
+    delete_log_records_in_batches,
+)
+from app.service.rollup_service import get_rollup
+from sqlalchemy import func
+
+
+def count_logs() -> int:
+    return db.session.query(func.count(Log.id)).scalar()
+
+
+@pytest.fixture
+def saved_records(write_log, log_lines, ingest):
+    lines = log_lines(5) + log_lines(4, first=5, date="06-Mar-2022")
+    write_log("access.log", ("\n".join(lines) + "\n").encode())
+    ingest()
+
+
+@pytest.mark.parametrize("batch_size, batches", [(2, 3), (5, 1), (100, 1)])
+def test_filtered_delete_runs_in_batches(saved_records, batch_size, batches):
+    progress = []
+    result = delete_log_records_in_batches(
+        parse_log_filters({"date_from": "2022-03-05", "date_to": "2022-03-05"}),
+        batch_size=batch_size,
+        progress=lambda deleted, upper_id: progress.append(deleted),
+    )
+
+    assert result["data"] == 5
+    assert result["batches"] == batches
+    assert sum(progress) == 5
+    assert sorted(log.log_id for log in Log.query) == ["5-3", "6-3", "7-3", "8-3"]
+    assert get_rollup("day", limit=10) == [{"day": "2022-03-06", "count": 4}]
+
+
+def test_filtered_delete_without_matches_deletes_nothing(saved_records):
+    result = delete_log_records_in_batches(parse_log_filters({"software_name": "Other"}))
+
+    assert (result["data"], result["batches"]) == (0, 0)
+    assert count_logs() == 9
+
+
+def test_failed_progress_keeps_the_committed_batches(saved_records):
+    def stop(deleted, upper_id):
+        raise RuntimeError("cancelled")
+
+    with pytest.raises(RuntimeError):
+        delete_log_records_in_batches(
+            parse_log_filters({"date_to": "2022-03-05"}), batch_size=2, progress=stop
+        )
+
+    assert count_logs() == 7
+
+
+def test_filtered_delete_keeps_the_manifest(saved_records, ingest):
+    delete_log_records_in_batches(parse_log_filters({"date_to": "2022-03-05"}))
+
+    assert ingest() is None
+    assert count_logs() == 4
+
+
+def test_delete_all_clears_the_counters_and_the_manifest(saved_records, ingest):
+    assert delete_all_log_records_from_database() == 9
+    assert count_logs() == 0
+    assert LogRollup.query.count() == 0
+    assert IngestionManifest.query.count() == 0
+
+    assert ingest()["inserted"] == 9
+
+
+def test_http_delete(client, saved_records):
+    response = client.delete("/logs?date_from=2022-03-06")
+
+    assert response.status_code == 200
+    assert response.json["data"] == 4
+    assert client.delete("/logs?date_from=someday").status_code == 400
+
+    response = client.delete("/logs")
+
+    assert response.status_code == 200
+    assert response.json["data"] == 5
+    assert count_logs() == 0
+
+
+def test_http_delete_job(client, saved_records):
+    response = client.delete("/logs?date_from=2022-03-06&async=true")
+
+    assert response.status_code == 202
+    location = response.headers["Location"]
+
+    deadline = time.monotonic() + 10
+    job = client.get(location).json["data"]
+    while job["status"] not in JOB_FINISHED_STATUSES and time.monotonic() < deadline:
+        time.sleep(0.05)
+        job = client.get(location).json["data"]
+
+    assert job["status"] == JOB_SUCCEEDED
+    db.session.rollback()
+    assert count_logs() == 5
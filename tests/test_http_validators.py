@@ -0,0 +1,122 @@
+"""
+HTTP Validators Tests
+------------------------
+Responsible to test the ETag and Last-Modified of the log record responses, the conditional
+requests answered with 304, and that the cached responses follow the data version.
+
+Author: Álef Ádonis dos Santos Carlos
+Date: 10/01/2024
+"""
+
+import pytest
+from app.extensions import db
+from app.models.log_record_model import Log
+from app.service.log_service import delete_log_record_by_id
+from app.service.version_service import get_data_version
+from datetime import timedelta
+
+
+def age_data_version(seconds: int) -> None:
+    data_version = get_data_version()
+    data_version.updated_at -= timedelta(seconds=seconds)
+    db.session.commit()
+
+
+@pytest.fixture
+def saved_logs(write_log, log_lines, ingest):
+    write_log("access.log", "\n".join(log_lines(3)).encode() + b"\n")
+    ingest()
+    return [log.id for log in Log.query.order_by(Log.id)]
+
+
+def test_page_carries_validators(client, saved_logs):
+    age_data_version(5)
+    response = client.get("/logs?limit=2")
+
+    assert response.status_code == 200
+    assert response.headers["ETag"]
+    assert response.headers["Last-Modified"]
+    assert response.headers["Cache-Control"] == "no-cache"
+
+
+def test_change_in_the_current_second_has_no_modification_date(client, saved_logs):
+    response = client.get("/logs?limit=2")
+
+    assert response.headers["ETag"]
+    assert "Last-Modified" not in response.headers
+
+
+@pytest.mark.parametrize("url", ["/logs?limit=2", "/log/{id}", "/log/999999"])
+def test_matching_entity_tag_is_not_modified(client, saved_logs, url):
+    url = url.format(id=saved_logs[0])
+    etag = client.get(url).headers["ETag"]
+
+    response = client.get(url, headers={"If-None-Match": etag})
+
+    assert response.status_code == 304
+    assert response.data == b""
+    assert response.headers["ETag"] == etag
+
+
+def test_weak_comparison_matches_the_entity_tag(client, saved_logs):
+    etag = client.get("/logs?limit=2").headers["ETag"]
+
+    response = client.get("/logs?limit=2", headers={"If-None-Match": f"W/{etag}, \"other\""})
+
+    assert response.status_code == 304
+
+
+def test_unmodified_date_is_not_modified(client, saved_logs):
+    age_data_version(5)
+    last_modified = client.get("/logs?limit=2").headers["Last-Modified"]
+
+    response = client.get("/logs?limit=2", headers={"If-Modified-Since": last_modified})
+
+    assert response.status_code == 304
+
+
+def test_entity_tag_takes_precedence_over_the_date(client, saved_logs):
+    age_data_version(5)
+    last_modified = client.get("/logs?limit=2").headers["Last-Modified"]
+
+    response = client.get(
+        "/logs?limit=2",
+        headers={"If-None-Match": '"stale"', "If-Modified-Since": last_modified},
+    )
+
+    assert response.status_code == 200
+
+
+def test_new_records_change_the_entity_tag(client, saved_logs, write_log, log_lines, ingest):
+    etag = client.get("/logs").headers["ETag"]
+    page = client.get("/logs").json
+
+    write_log("access.log", "\n".join(log_lines(2, first=3)).encode() + b"\n", mode="ab")
+    ingest()
+    response = client.get("/logs", headers={"If-None-Match": etag})
+
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert len(response.json["data"]) == len(page["data"]) + 2
+
+
+def test_deleted_record_invalidates_the_cached_responses(client, saved_logs):
+    page_etag = client.get("/logs?limit=2").headers["ETag"]
+    log_id = saved_logs[0]
+    assert client.get(f"/log/{log_id}").status_code == 200
+
+    delete_log_record_by_id(str(log_id))
+
+    page = client.get("/logs?limit=2", headers={"If-None-Match": page_etag})
+    assert page.status_code == 200
+    assert [int(log["id"]) for log in page.json["data"]] == saved_logs[1:3]
+    assert client.get(f"/log/{log_id}").status_code == 404
+
+
+def test_cached_page_is_served_for_the_same_version(client, saved_logs):
+    client.get("/logs?limit=2")
+    hits = client.get("/cache/stats").json["data"]["hits"]
+
+    client.get("/logs?limit=2")
+
+    assert client.get("/cache/stats").json["data"]["hits"] == hits + 1
@@ -0,0 +1,228 @@
+"""
+Log Parser Tests
+------------------------
+Responsible to test the bytes-level memory-mapped parser, the streaming of compressed log files
+into chunks of complete lines, and their decompression and parsing inside the parser workers.
+
+Author: Álef Ádonis dos Santos Carlos
+Date: 10/01/2024
+"""
+
+import bz2
+import gzip
+import lzma
+import os
+import pytest
+from app.models.log_record_model import Log
+from app.service import log_parser
+from app.service.log_parser import (
+    detect_compression,
+    iter_compressed_log_chunks,
+    iter_log_text_chunks,
+    parse_compressed_log_columns,
+    parse_compressed_log_rows,
+    parse_log_chunk_mmap,
+    parse_log_text_rows,
+)
+from app.service.log_service import extract_log_records_from_files, save_records_in_database
+from app.service.manifest_service import load_manifest
+
+
+COMPRESSIONS = {"gzip": gzip.compress, "bz2": bz2.compress, "xz": lzma.compress}
+
+
+@pytest.fixture
+def small_chunks(monkeypatch):
+    """
+    Decompress in blocks of 512 bytes cut into chunks of about 1 KB.
+    """
+    monkeypatch.setattr(log_parser, "DECOMPRESSION_BLOCK_SIZE", 512)
+    monkeypatch.setattr(log_parser, "PARSER_CHUNK_SIZE", 1024)
+
+
+def log_text(log_lines, count: int, first: int = 0) -> bytes:
+    return "\n".join(log_lines(count, first)).encode() + b"\n"
+
+
+@pytest.mark.parametrize("compression", COMPRESSIONS)
+def test_compressed_file_is_cut_into_chunks_of_complete_lines(
+    write_log, log_lines, small_chunks, compression
+):
+    data = log_text(log_lines, 100)
+    filepath = write_log("access.log.compressed", COMPRESSIONS[compression](data))
+
+    chunks = list(iter_compressed_log_chunks(filepath, compression, 0))
+
+    assert detect_compression(filepath) == compression
+    assert len(chunks) > 1
+    assert "".join(text for text, _, _ in chunks).encode() == data
+    assert all(text.endswith("\n") for text, _, _ in chunks)
+    assert [start for _, start, _ in chunks] == [0] + [end for _, _, end in chunks[:-1]]
+    assert chunks[-1][2] == len(data)
+
+
+@pytest.mark.parametrize("compression", COMPRESSIONS)
+def test_compressed_file_is_parsed_with_its_uncompressed_end(
+    write_log, log_lines, small_chunks, compression
+):
+    first_lines = log_text(log_lines, 10)
+    data = first_lines + log_text(log_lines, 90, first=10)
+    filepath = write_log("access.log.compressed", COMPRESSIONS[compression](data))
+
+    rows, end = parse_compressed_log_rows(filepath, compression, len(first_lines))
+    (line_count, columns, timestamps), columns_end = parse_compressed_log_columns(
+        filepath, compression, len(first_lines)
+    )
+
+    assert end == columns_end == len(data)
+    assert [row[5] for row in rows] == [f"{number}-3" for number in range(10, 100)]
+    assert line_count == len(timestamps) == 90
+    assert list(columns[5]) == [row[5] for row in rows]
+    assert timestamps == [row[9] for row in rows]
+
+
+def test_compressed_file_without_complete_lines_ends_at_its_start(write_log, log_lines):
+    filepath = write_log("access.log.gz", gzip.compress(log_lines(1)[0][:20].encode()))
+
+    assert parse_compressed_log_rows(filepath, "gzip", 0) == ([], 0)
+
+
+def test_compressed_file_is_read_from_an_uncompressed_offset(write_log, log_lines, small_chunks):
+    first_lines = log_text(log_lines, 10)
+    filepath = write_log(
+        "access.log.gz", gzip.compress(first_lines + log_text(log_lines, 5, first=10))
+    )
+
+    chunks = list(iter_compressed_log_chunks(filepath, "gzip", len(first_lines)))
+    rows = [
+        row for text, start, end in chunks for row in parse_log_text_rows(text, filepath, start, end)
+    ]
+
+    assert chunks[0][1] == len(first_lines)
+    assert [row[5] for row in rows] == [f"{number}-3" for number in range(10, 15)]
+
+
+def test_compressed_file_leaves_out_its_partial_last_line(write_log, log_lines):
+    lines = log_lines(3)
+    data = ("\n".join(lines[:2]) + "\n" + lines[2]).encode()
+    filepath = write_log("access.log.gz", gzip.compress(data))
+
+    chunks = list(iter_compressed_log_chunks(filepath, "gzip", 0))
+
+    assert chunks == [
+        ("\n".join(lines[:2]) + "\n", 0, data.rindex(b"\n") + 1)
+    ]
+
+
+def test_cut_short_compressed_file_is_read_up_to_its_last_complete_line(
+    write_log, log_lines, small_chunks
+):
+    data = log_text(log_lines, 200)
+    compressed = gzip.compress(data)
+    filepath = write_log("access.log.gz", compressed[: len(compressed) // 2])
+
+    text = "".join(text for text, _, _ in iter_compressed_log_chunks(filepath, "gzip", 0))
+
+    assert text
+    assert text.endswith("\n")
+    assert data.startswith(text.encode())
+    assert len(text) < len(data)
+
+
+def test_corrupted_compressed_file_is_rejected(write_log, log_lines):
+    compressed = bytearray(gzip.compress(log_text(log_lines, 50)))
+    compressed[20:40] = b"\xff" * 20
+    filepath = write_log("access.log.gz", bytes(compressed))
+
+    with pytest.raises(ValueError):
+        list(iter_compressed_log_chunks(filepath, "gzip", 0))
+
+
+def test_uploaded_stream_keeps_its_last_line_without_newline(log_lines):
+    lines = log_lines(20)
+    data = "\n".join(lines).encode()
+    blocks = [data[index : index + 100] for index in range(0, len(data), 100)]
+
+    for stream in (blocks, [gzip.compress(data)]):
+        chunks = list(iter_log_text_chunks(stream, chunk_size=256))
+
+        assert "".join(text for text, _, _ in chunks) == data.decode()
+        assert chunks[-1][2] == len(data)
+
+
+@pytest.mark.parametrize("parser_mode", ["thread", "mmap", "process"])
+def test_compressed_files_are_parsed_by_the_workers(
+    write_log, log_lines, small_chunks, parser_mode
+):
+    files = {}
+    for number, (compression, compress) in enumerate(COMPRESSIONS.items()):
+        data = log_text(log_lines, 50, first=number * 50)
+        files[f"access-{compression}.log"] = len(data)
+        write_log(f"access-{compression}.log", compress(data))
+
+    extraction = extract_log_records_from_files()
+    extraction.parser_mode = parser_mode
+    batches = []
+    summary = save_records_in_database(
+        extraction, progress=lambda batch, inserted, skipped: batches.append(batch)
+    )
+
+    assert summary["inserted"] == 150
+    assert sorted(batch.plan.file_name for batch in batches) == sorted(files)
+    assert all(batch.completes_plan and len(batch.rows) == 50 for batch in batches)
+    assert all(batch.plan.end == files[batch.plan.file_name] for batch in batches)
+    assert sorted(log.log_id for log in Log.query) == sorted(
+        f"{number}-3" for number in range(150)
+    )
+
+    manifest = load_manifest()
+    assert {name: manifest[name].offset for name in files} == files
+
+
+def test_appended_compressed_member_is_read_from_the_saved_offset(write_log, log_lines, ingest):
+    write_log("access.log.gz", gzip.compress(log_text(log_lines, 5)))
+    ingest()
+
+    write_log("access.log.gz", gzip.compress(log_text(log_lines, 3, first=5)), mode="ab")
+    summary = ingest()
+
+    assert (summary["rows"], summary["inserted"], summary["skipped"]) == (3, 3, 0)
+    assert ingest() is None
+
+
+def test_compressed_file_without_complete_lines_is_completed(write_log, log_lines, ingest):
+    write_log("access.log.gz", gzip.compress(log_lines(1)[0][:20].encode()))
+
+    assert ingest()["inserted"] == 0
+    assert load_manifest()["access.log.gz"].offset == 0
+    assert ingest() is None
+
+
+def test_memory_mapped_parser_matches_the_text_parser(write_log, log_lines):
+    lines = log_lines(5) + [
+        "10.0.0.1;05-Mar-2022;13:03:04.5;Zoolab;1.2;7-7;Título;descrição, ünïcode",
+        "10.0.0.2;bad-date;25:99:99.000;Zoolab;1.2;8-8;Title;Description;extra field",
+        "not-an-ip;05-Mar-2022;3:03:04.000;;;9-9;;",
+    ]
+    data = "\n".join(lines).encode() + b"\n"
+    filepath = write_log("access.log", data)
+    first_line_end = data.index(b"\n") + 1
+
+    rows = parse_log_chunk_mmap(filepath, first_line_end, len(data))
+
+    assert rows == parse_log_text_rows(data[first_line_end:].decode(), filepath, 0, len(data))
+    assert len(rows) == 7
+    assert rows[4][6:8] == ("Título", "descrição, ünïcode")
+    assert rows[4][9].microsecond == 500000
+    assert rows[5][7] == "Description"
+    assert rows[5][9] is None
+
+
+def test_memory_mapped_parser_rejects_malformed_lines(write_log, log_lines):
+    data = "\n".join(log_lines(2)) + "\n1.1.1.1;05-Mar-2022\n"
+    filepath = write_log("access.log", data.encode())
+
+    with pytest.raises(ValueError):
+        parse_log_chunk_mmap(filepath, 0, os.path.getsize(filepath))
+
+    assert parse_log_chunk_mmap(filepath, 10, 10) == []
@@ -0,0 +1,124 @@
+"""
+Manifest Service Tests
+------------------------
+Responsible to test the incremental planning of the extractions from the ingestion manifest.
+
+Author: Álef Ádonis dos Santos Carlos
+Date: 10/01/2024
+"""
+
+import os
+from app.models.log_record_model import Log
+from app.service.manifest_service import FINGERPRINT_SIZE, load_manifest, plan_file_read
+
+
+def saved_log_ids() -> list:
+    return [log.log_id for log in Log.query.order_by(Log.id)]
+
+
+def test_unchanged_file_is_not_planned(write_log, log_lines, ingest):
+    filepath = write_log("access.log", "\n".join(log_lines(3)).encode() + b"\n")
+
+    assert ingest()["inserted"] == 3
+    assert plan_file_read(filepath, load_manifest()["access.log"]) is None
+    assert ingest() is None
+
+
+def test_appended_lines_are_read_from_the_saved_offset(write_log, log_lines, ingest):
+    first_lines = "\n".join(log_lines(3)).encode() + b"\n"
+    filepath = write_log("access.log", first_lines)
+    ingest()
+
+    write_log("access.log", "\n".join(log_lines(2, first=3)).encode() + b"\n", mode="ab")
+    plan = plan_file_read(filepath, load_manifest()["access.log"])
+
+    assert plan.start == len(first_lines)
+    assert plan.end == os.path.getsize(filepath)
+    assert ingest()["inserted"] == 2
+    assert saved_log_ids() == [f"{number}-3" for number in range(5)]
+
+
+def test_partial_last_line_waits_until_it_is_complete(write_log, log_lines, ingest):
+    lines = log_lines(3)
+    complete_lines = "\n".join(lines[:2]).encode() + b"\n"
+    filepath = write_log("access.log", complete_lines + lines[2][:20].encode())
+
+    plan = plan_file_read(filepath, None)
+    assert (plan.start, plan.end) == (0, len(complete_lines))
+    assert ingest()["inserted"] == 2
+    assert load_manifest()["access.log"].offset == len(complete_lines)
+
+    write_log("access.log", lines[2][20:].encode() + b"\n", mode="ab")
+
+    assert ingest()["inserted"] == 1
+    assert saved_log_ids() == [f"{number}-3" for number in range(3)]
+
+
+def test_file_without_complete_lines_is_not_parsed(write_log, log_lines, ingest):
+    filepath = write_log("access.log", log_lines(1)[0][:20].encode())
+
+    plan = plan_file_read(filepath, None)
+    assert (plan.start, plan.end) == (0, 0)
+    assert ingest() is None
+    assert load_manifest()["access.log"].offset == 0
+
+
+def test_truncated_file_is_read_from_the_start(write_log, log_lines, ingest):
+    filepath = write_log("access.log", "\n".join(log_lines(5)).encode() + b"\n")
+    ingest()
+
+    write_log("access.log", "\n".join(log_lines(2, first=100)).encode() + b"\n")
+    plan = plan_file_read(filepath, load_manifest()["access.log"])
+
+    assert plan.start == 0
+    assert ingest()["inserted"] == 2
+
+
+def test_rotated_file_is_read_from_the_start(write_log, log_lines, ingest):
+    lines = "\n".join(log_lines(3)).encode() + b"\n"
+    filepath = write_log("access.log", lines)
+    ingest()
+
+    os.rename(filepath, filepath + ".old")
+    rotated_lines = "\n".join(log_lines(4, first=100)).encode() + b"\n"
+    write_log("access.log", rotated_lines)
+    os.remove(filepath + ".old")
+    plan = plan_file_read(filepath, load_manifest()["access.log"])
+
+    assert (plan.start, plan.end) == (0, len(rotated_lines))
+    assert ingest()["inserted"] == 4
+
+
+def test_rewritten_file_with_a_different_beginning_is_read_from_the_start(
+    write_log, log_lines, ingest
+):
+    lines = "\n".join(log_lines(3)).encode() + b"\n"
+    filepath = write_log("access.log", lines)
+    ingest()
+
+    rewritten_lines = "\n".join(log_lines(6, first=100)).encode() + b"\n"
+    with open(filepath, "r+b") as file:
+        file.write(rewritten_lines)
+
+    entry = load_manifest()["access.log"]
+    assert entry.inode == os.stat(filepath).st_ino
+    assert plan_file_read(filepath, entry).start == 0
+    assert ingest()["inserted"] == 6
+
+
+def test_fingerprint_is_kept_once_the_offset_passes_the_fingerprinted_bytes(
+    write_log, log_lines, ingest
+):
+    lines = log_lines(200)
+    first_lines = "\n".join(lines[:100]).encode() + b"\n"
+    assert len(first_lines) > FINGERPRINT_SIZE
+
+    filepath = write_log("access.log", first_lines)
+    ingest()
+    entry = load_manifest()["access.log"]
+
+    write_log("access.log", "\n".join(lines[100:]).encode() + b"\n", mode="ab")
+    plan = plan_file_read(filepath, entry)
+
+    assert plan.start == len(first_lines)
+    assert plan.fingerprint == entry.fingerprint
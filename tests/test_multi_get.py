@@ -0,0 +1,81 @@
+"""
+Multi Get Tests
+------------------------
+Responsible to test the retrieval of many log records by ID in a single request.
+
+Author: Álef Ádonis dos Santos Carlos
+Date: 10/01/2024
+"""
+
+import pytest
+from app.models.log_record_model import Log
+from app.service import log_service
+from app.service.cache_service import response_cache
+from app.service.log_service import get_logs_by_ids
+
+
+@pytest.fixture
+def saved_ids(write_log, log_lines, ingest):
+    write_log("access.log", ("\n".join(log_lines(5)) + "\n").encode())
+    ingest()
+    return [log.id for log in Log.query.order_by(Log.id)]
+
+
+def test_records_follow_the_order_of_the_ids(saved_ids):
+    ids = [saved_ids[3], saved_ids[0], saved_ids[3]]
+    result = get_logs_by_ids(ids)
+
+    assert [log["log_id"] for log in result["data"]] == ["3-3", "0-3", "3-3"]
+    assert result["not_found"] == []
+
+
+def test_missing_ids_are_null_and_listed(saved_ids):
+    missing = saved_ids[-1] + 1
+    result = get_logs_by_ids([missing, str(saved_ids[1]), missing])
+
+    assert result["data"][0] is None
+    assert result["data"][1]["log_id"] == "1-3"
+    assert result["data"][2] is None
+    assert result["not_found"] == [str(missing)]
+
+
+def test_ids_are_read_in_chunks_and_cached(monkeypatch, saved_ids):
+    monkeypatch.setattr(log_service, "MULTI_GET_CHUNK_SIZE", 2)
+
+    assert len(get_logs_by_ids(saved_ids)["data"]) == 5
+
+    hits = response_cache.local.hits
+    assert [log["log_id"] for log in get_logs_by_ids(saved_ids)["data"]] == [
+        f"{number}-3" for number in range(5)
+    ]
+    assert response_cache.local.hits == hits + 5
+
+
+@pytest.mark.parametrize(
+    "ids, message",
+    [
+        (None, "The ids must be a list"),
+        ("1,2", "The ids must be a list"),
+        ([1, "x"], "The ids must be integers"),
+        ([1, None], "The ids must be integers"),
+        ([1, 2, 3], "At most 2 ids can be retrieved at once"),
+    ],
+)
+def test_invalid_ids_are_rejected(monkeypatch, ids, message):
+    monkeypatch.setattr(log_service, "MULTI_GET_MAX_IDS", 2)
+
+    with pytest.raises(ValueError, match=message):
+        get_logs_by_ids(ids)
+
+
+def test_http_batch(client, saved_ids):
+    response = client.post("/logs/batch", json={"ids": [saved_ids[2], 0]})
+
+    assert response.status_code == 200
+    assert response.json["data"][0]["log_id"] == "2-3"
+    assert response.json["not_found"] == ["0"]
+
+    for body in ({"ids": ["x"]}, [1, 2], {}):
+        assert client.post("/logs/batch", json=body).status_code == 400
+
+    assert client.post("/logs/batch", data="not json").status_code == 400
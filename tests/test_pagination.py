@@ -0,0 +1,163 @@
+"""
+Pagination Tests
+------------------------
+Responsible to test the keyset pagination of the log records and the validation of its arguments.
+
+Author: Álef Ádonis dos Santos Carlos
+Date: 10/01/2024
+"""
+
+import pytest
+from app.extensions import db
+from app.models.log_record_model import Log
+from app.service.log_query import (
+    DEFAULT_PAGE_SIZE,
+    MAX_PAGE_SIZE,
+    decode_cursor,
+    encode_cursor,
+    parse_log_filters,
+    parse_page_size,
+)
+from app.service.log_service import delete_log_record_by_id, get_all_logs_from_database
+
+
+def read_all_pages(limit: int, filters: dict = None) -> list:
+    pages = []
+    cursor = None
+
+    while True:
+        page = get_all_logs_from_database(filters=filters, limit=limit, cursor=cursor)
+        pages.append([log["log_id"] for log in page["data"]])
+        cursor = page["next_cursor"]
+
+        if cursor is None:
+            return pages
+
+
+def test_cursor_round_trip():
+    assert decode_cursor(encode_cursor(42)) == 42
+    assert decode_cursor(None) == 0
+    assert decode_cursor("") == 0
+
+
+@pytest.mark.parametrize("cursor", ["not a cursor", encode_cursor("x")[:-2], "eyJpZCI6ICJ4In0="])
+def test_invalid_cursor_is_rejected(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+
+@pytest.mark.parametrize(
+    "value, limit",
+    [
+        (None, DEFAULT_PAGE_SIZE),
+        ("", DEFAULT_PAGE_SIZE),
+        ("1", 1),
+        (str(MAX_PAGE_SIZE), MAX_PAGE_SIZE),
+    ],
+)
+def test_page_size_bounds(value, limit):
+    assert parse_page_size(value) == limit
+
+
+@pytest.mark.parametrize("value", ["0", "-1", str(MAX_PAGE_SIZE + 1), "ten"])
+def test_invalid_page_size_is_rejected(value):
+    with pytest.raises(ValueError):
+        parse_page_size(value)
+
+
+@pytest.mark.parametrize("count, limit", [(6, 3), (7, 3), (2, 3), (3, 1)])
+def test_pages_cover_every_record_once(write_log, log_lines, ingest, count, limit):
+    write_log("access.log", "\n".join(log_lines(count)).encode() + b"\n")
+    ingest()
+
+    pages = read_all_pages(limit)
+
+    log_ids = [log_id for page in pages for log_id in page]
+
+    assert log_ids == [f"{number}-3" for number in range(count)]
+    assert all(len(page) == limit for page in pages[:-1])
+    assert 1 <= len(pages[-1]) <= limit
+
+
+def test_exact_multiple_of_the_limit_has_no_empty_last_page(write_log, log_lines, ingest):
+    write_log("access.log", "\n".join(log_lines(6)).encode() + b"\n")
+    ingest()
+
+    first_page = get_all_logs_from_database(limit=3)
+    last_page = get_all_logs_from_database(limit=3, cursor=first_page["next_cursor"])
+
+    assert first_page["next_cursor"] == encode_cursor(int(first_page["data"][-1]["id"]))
+    assert len(last_page["data"]) == 3
+    assert last_page["next_cursor"] is None
+
+
+def test_empty_table_has_a_single_empty_page():
+    assert get_all_logs_from_database(limit=3) == {"data": [], "next_cursor": None}
+
+
+def test_cursor_survives_deleted_records(write_log, log_lines, ingest):
+    write_log("access.log", "\n".join(log_lines(6)).encode() + b"\n")
+    ingest()
+
+    first_page = get_all_logs_from_database(limit=2)
+    ids = [log.id for log in Log.query.order_by(Log.id)]
+    delete_log_record_by_id(str(ids[2]))
+
+    second_page = get_all_logs_from_database(limit=2, cursor=first_page["next_cursor"])
+
+    assert [int(log["id"]) for log in second_page["data"]] == ids[3:5]
+
+
+def test_cursor_past_the_last_record_gives_an_empty_page(write_log, log_lines, ingest):
+    write_log("access.log", "\n".join(log_lines(3)).encode() + b"\n")
+    ingest()
+    last_id = max(log.id for log in Log.query)
+
+    assert get_all_logs_from_database(limit=3, cursor=encode_cursor(last_id)) == {
+        "data": [],
+        "next_cursor": None,
+    }
+
+
+def test_filters_apply_to_every_page(write_log, log_lines, ingest):
+    write_log(
+        "access.log",
+        "\n".join(log_lines(4) + log_lines(4, first=10, date="06-Mar-2022")).encode() + b"\n",
+    )
+    ingest()
+
+    pages = read_all_pages(3, parse_log_filters({"date_from": "2022-03-06"}))
+
+    assert pages == [["10-3", "11-3", "12-3"], ["13-3"]]
+
+
+def test_ip_filter_matches_the_records_without_ip(write_log, log_lines, ingest):
+    lines = log_lines(3) + ["not-an-ip;05-Mar-2022;3:00:09.000;Tres-Zap;0.52;9-3;Title;Text"]
+    write_log("access.log", "\n".join(lines).encode() + b"\n")
+    ingest()
+    db.session.query(Log).filter(Log.log_id == "1-3").update({Log.ip: None})
+    db.session.commit()
+
+    def matching(ip_address: str) -> list:
+        return read_all_pages(10, parse_log_filters({"ip_address": ip_address}))
+
+    assert matching("10.0.0.0") == [["0-3"]]
+    assert matching("10.0.0.1") == [["1-3"]]
+    assert matching("not-an-ip") == [["9-3"]]
+    assert matching("10.0.0.9") == [[]]
+
+
+def test_invalid_arguments_are_bad_requests(client):
+    assert client.get("/logs?limit=0").status_code == 400
+    assert client.get("/logs?cursor=not-a-cursor").status_code == 400
+
+
+def test_http_pages_follow_the_cursor(client, write_log, log_lines, ingest):
+    write_log("access.log", "\n".join(log_lines(5)).encode() + b"\n")
+    ingest()
+
+    first_page = client.get("/logs?limit=2").json
+    second_page = client.get(f"/logs?limit=2&cursor={first_page['next_cursor']}").json
+
+    assert [log["log_id"] for log in second_page["data"]] == ["2-3", "3-3"]
+    assert second_page["next_cursor"] is not None
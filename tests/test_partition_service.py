@@ -0,0 +1,125 @@
+"""
+Partition Service Tests
+------------------------
+Responsible to test how the log records are routed to the partitions of their periods.
+
+The partitions themselves are PostgreSQL tables, so their creation is recorded instead of run.
+
+Author: Álef Ádonis dos Santos Carlos
+Date: 10/01/2024
+"""
+
+import pytest
+from app.service import partition_service
+from app.service.log_parser import parse_log_text_rows
+from app.service.partition_service import (
+    PARTITION_FALLBACK_TIMESTAMP,
+    TIMESTAMP_INDEX,
+    next_period_start,
+    partition_name,
+    partition_start,
+    period_start,
+    prepare_partitioned_rows,
+)
+from datetime import datetime
+
+
+@pytest.fixture(params=["month", "day"])
+def partitioning(request, monkeypatch):
+    """
+    Partition the log records by the parametrized period, recording the partitions ensured.
+    """
+    ensured_periods = []
+    monkeypatch.setattr(partition_service, "LOG_PARTITIONING", request.param)
+    monkeypatch.setattr(partition_service, "LOG_PARTITIONED", True)
+    monkeypatch.setattr(partition_service, "ensure_partitions", ensured_periods.append)
+    return request.param, ensured_periods
+
+
+@pytest.mark.parametrize(
+    "timestamp, month, day",
+    [
+        (datetime(2022, 3, 5, 3, 3, 4), datetime(2022, 3, 1), datetime(2022, 3, 5)),
+        (datetime(2022, 12, 31, 23, 59, 59), datetime(2022, 12, 1), datetime(2022, 12, 31)),
+        (datetime(2024, 2, 29), datetime(2024, 2, 1), datetime(2024, 2, 29)),
+    ],
+)
+def test_period_start(partitioning, timestamp, month, day):
+    assert period_start(timestamp) == (month if partitioning[0] == "month" else day)
+
+
+@pytest.mark.parametrize(
+    "partitioning_period, start, next_start",
+    [
+        ("month", datetime(2022, 1, 1), datetime(2022, 2, 1)),
+        ("month", datetime(2022, 12, 1), datetime(2023, 1, 1)),
+        ("month", datetime(2024, 2, 1), datetime(2024, 3, 1)),
+        ("day", datetime(2022, 1, 1), datetime(2022, 1, 2)),
+        ("day", datetime(2022, 12, 31), datetime(2023, 1, 1)),
+        ("day", datetime(2024, 2, 29), datetime(2024, 3, 1)),
+    ],
+)
+def test_next_period_start(monkeypatch, partitioning_period, start, next_start):
+    monkeypatch.setattr(partition_service, "LOG_PARTITIONING", partitioning_period)
+
+    assert next_period_start(start) == next_start
+
+
+def test_partition_name_round_trip(partitioning):
+    start = period_start(datetime(2022, 3, 5, 12))
+    name = partition_name(start)
+
+    assert name == (
+        "log_records_p2022_03" if partitioning[0] == "month" else "log_records_p2022_03_05"
+    )
+    assert partition_start(name) == start
+
+
+@pytest.mark.parametrize("name", ["log_records_default", "log_records_p2022", "log_records_pxx_03"])
+def test_partition_start_ignores_other_tables(name):
+    assert partition_start(name) is None
+
+
+def test_rows_are_routed_to_the_partitions_of_their_periods(partitioning, log_lines):
+    lines = (
+        log_lines(2)
+        + log_lines(2, first=2, date="06-Mar-2022")
+        + log_lines(1, first=4, date="01-Apr-2022")
+    )
+    text = "\n".join(lines) + "\n"
+    rows = parse_log_text_rows(text, "access.log", 0, len(text))
+    partitioning_period, ensured_periods = partitioning
+
+    assert prepare_partitioned_rows(rows) is rows
+
+    if partitioning_period == "month":
+        assert ensured_periods == [{datetime(2022, 3, 1), datetime(2022, 4, 1)}]
+    else:
+        assert ensured_periods == [
+            {datetime(2022, 3, 5), datetime(2022, 3, 6), datetime(2022, 4, 1)}
+        ]
+
+
+def test_rows_without_timestamp_receive_the_fallback_timestamp(partitioning, log_lines):
+    text = "\n".join(log_lines(2)) + "\n"
+    rows = parse_log_text_rows(text, "access.log", 0, len(text))
+    rows[1] = rows[1][:TIMESTAMP_INDEX] + (None,) + rows[1][TIMESTAMP_INDEX + 1 :]
+
+    prepared_rows = prepare_partitioned_rows(rows)
+
+    assert prepared_rows[0] == rows[0]
+    assert prepared_rows[1][TIMESTAMP_INDEX] == PARTITION_FALLBACK_TIMESTAMP
+    assert prepared_rows[1][:TIMESTAMP_INDEX] == rows[1][:TIMESTAMP_INDEX]
+    assert partitioning[1] == [
+        {period_start(rows[0][TIMESTAMP_INDEX]), period_start(PARTITION_FALLBACK_TIMESTAMP)}
+    ]
+
+
+def test_rows_are_left_alone_without_partitioning(monkeypatch, log_lines):
+    monkeypatch.setattr(partition_service, "LOG_PARTITIONED", False)
+    monkeypatch.setattr(partition_service, "ensure_partitions", pytest.fail)
+    text = "\n".join(log_lines(2)) + "\n"
+    rows = parse_log_text_rows(text, "access.log", 0, len(text))
+    rows[0] = rows[0][:TIMESTAMP_INDEX] + (None,) + rows[0][TIMESTAMP_INDEX + 1 :]
+
+    assert prepare_partitioned_rows(rows) is rows
@@ -0,0 +1,86 @@
+"""
+Rollup Service Tests
+------------------------
+Responsible to test that the rollup counters follow the inserted and deleted log records.
+
+Author: Álef Ádonis dos Santos Carlos
+Date: 10/01/2024
+"""
+
+import pytest
+from app.models.log_record_model import Log
+from app.models.log_rollup_model import LogRollup
+from app.service.log_service import delete_log_record_by_id
+from app.service.rollup_service import ROLLUP_DIMENSIONS, get_rollup, rebuild_rollups
+
+
+def read_rollups() -> dict:
+    return {(rollup.dimension, rollup.key): rollup.count for rollup in LogRollup.query}
+
+
+@pytest.fixture
+def saved_records(write_log, log_lines, ingest):
+    lines = log_lines(3) + log_lines(2, first=3, date="06-Mar-2022")
+    write_log("access.log", ("\n".join(lines) + "\n").encode())
+    ingest()
+
+
+def test_extraction_increments_the_counters(saved_records):
+    assert get_rollup("software_version", limit=10) == [
+        {"software_name": "Tres-Zap", "version": "0.52", "count": 5}
+    ]
+    assert get_rollup("day", limit=10) == [
+        {"day": "2022-03-05", "count": 3},
+        {"day": "2022-03-06", "count": 2},
+    ]
+    assert get_rollup("hour", limit=10) == [
+        {"hour": "2022-03-05T03", "count": 3},
+        {"hour": "2022-03-06T03", "count": 2},
+    ]
+    assert get_rollup("ip", limit=2, order="key") == [
+        {"ip": "10.0.0.0", "count": 1},
+        {"ip": "10.0.0.1", "count": 1},
+    ]
+
+
+def test_appended_lines_add_to_the_counters(saved_records, write_log, log_lines, ingest):
+    write_log("access.log", ("\n".join(log_lines(1, first=5)) + "\n").encode(), mode="ab")
+    ingest()
+
+    assert get_rollup("day", limit=10)[0] == {"day": "2022-03-05", "count": 4}
+
+
+def test_delete_decrements_the_counters_and_drops_empty_ones(saved_records):
+    for log_id in ("3-3", "4-3"):
+        delete_log_record_by_id(str(Log.query.filter_by(log_id=log_id).one().id))
+
+    rollups = read_rollups()
+
+    assert rollups[("software_version", "Tres-Zap\t0.52")] == 3
+    assert ("day", "2022-03-06") not in rollups
+    assert ("hour", "2022-03-06T03") not in rollups
+    assert ("ip", "10.0.0.3") not in rollups
+    assert rollups[("day", "2022-03-05")] == 3
+
+
+def test_rebuild_matches_the_incremental_counters(saved_records):
+    delete_log_record_by_id(str(Log.query.filter_by(log_id="0-3").one().id))
+    incremental = read_rollups()
+
+    assert rebuild_rollups(batch_size=2) == len(incremental)
+    assert read_rollups() == incremental
+
+
+@pytest.mark.parametrize("dimension, order", [("country", None), ("day", "size")])
+def test_invalid_dimension_or_order_is_rejected(dimension, order):
+    with pytest.raises(ValueError):
+        get_rollup(dimension, limit=10, order=order)
+
+
+def test_http_stats(client, saved_records):
+    response = client.get("/logs/stats/day?order=count&limit=1")
+
+    assert response.status_code == 200
+    assert response.json["data"] == [{"day": "2022-03-05", "count": 3}]
+    assert client.get("/logs/stats/country").status_code == 400
+    assert all(client.get(f"/logs/stats/{name}").status_code == 200 for name in ROLLUP_DIMENSIONS)
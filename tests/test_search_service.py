@@ -0,0 +1,86 @@
+"""
+Search Service Tests
+------------------------
+Responsible to test the full-text search of the log records and the highlights of its matches.
+
+Author: Álef Ádonis dos Santos Carlos
+Date: 10/01/2024
+"""
+
+import pytest
+from app.models.log_record_model import Log
+from app.service.log_service import delete_log_record_by_id
+from app.service.search_service import build_fts5_query, search_logs
+
+
+RECORDS = [
+    ("Disk failure", "The backup disk stopped responding"),
+    ("Login", "User signed in from a new device"),
+    ("Disk full", "Disk usage reached the disk quota"),
+    ("Logout", "User signed out"),
+]
+
+
+@pytest.fixture
+def saved_records(write_log, ingest):
+    lines = [
+        f"10.0.0.{number};05-Mar-2022;3:00:0{number}.000;Tres-Zap;0.52;{number}-3;{title};{text}"
+        for number, (title, text) in enumerate(RECORDS)
+    ]
+    write_log("access.log", ("\n".join(lines) + "\n").encode())
+    ingest()
+
+
+def test_fts5_query_quotes_every_word():
+    assert build_fts5_query('disk OR "full" NEAR(x*)') == '"disk" "OR" "full" "NEAR" "x"'
+    assert build_fts5_query("  --  ") == ""
+
+
+def test_search_ranks_and_highlights_the_matches(saved_records):
+    results = search_logs("disk", limit=10)
+
+    assert [log["log_id"] for log in results["data"]] == ["2-3", "0-3"]
+    assert results["data"][0]["rank"] >= results["data"][1]["rank"]
+    assert results["data"][0]["highlights"] == {
+        "title": "<mark>Disk</mark> full",
+        "description": "<mark>Disk</mark> usage reached the <mark>disk</mark> quota",
+    }
+    assert results["next_page"] is None
+
+
+def test_search_matches_every_word(saved_records):
+    results = search_logs("user signed out", limit=10)
+
+    assert [log["log_id"] for log in results["data"]] == ["3-3"]
+
+
+def test_search_pages(saved_records):
+    first_page = search_logs("signed", limit=1)
+    second_page = search_logs("signed", limit=1, page=2)
+
+    assert first_page["next_page"] == 2
+    assert second_page["next_page"] is None
+    assert {first_page["data"][0]["log_id"], second_page["data"][0]["log_id"]} == {"1-3", "3-3"}
+
+
+def test_deleted_records_leave_the_index(saved_records):
+    record = Log.query.filter_by(log_id="0-3").one()
+    delete_log_record_by_id(str(record.id))
+
+    assert [log["log_id"] for log in search_logs("disk", limit=10)["data"]] == ["2-3"]
+
+
+@pytest.mark.parametrize("search_text, page", [("", 1), ("   ", 1), ("disk", 0)])
+def test_invalid_searches_are_rejected(search_text, page):
+    with pytest.raises(ValueError):
+        search_logs(search_text, limit=10, page=page)
+
+
+def test_http_search(client, saved_records):
+    response = client.get("/logs/search?q=disk&limit=1")
+
+    assert response.status_code == 200
+    assert response.json["data"][0]["highlights"]["title"] == "<mark>Disk</mark> full"
+    assert response.json["next_page"] == 2
+    assert client.get("/logs/search?q=").status_code == 400
+    assert client.get("/logs/search?q=disk&page=first").status_code == 400
@@ -0,0 +1,128 @@
+"""
+Sketch Service Tests
+------------------------
+Responsible to test the HyperLogLog and Space-Saving sketches, their maintenance by the
+ingestion and deletion, and the endpoints reading them.
+
+Author: Álef Ádonis dos Santos Carlos
+Date: 10/01/2024
+"""
+
+import pytest
+from app.models.log_record_model import Log
+from app.service import sketch_service
+from app.service.log_service import delete_log_record_by_id
+from app.service.sketch_service import (
+    SKETCH_TOP_CAPACITY,
+    HyperLogLog,
+    SpaceSaving,
+    hash_string,
+    hash_strings,
+    parse_top_limit,
+)
+
+
+def with_ip(lines: list, ip_address: str) -> list:
+    return [ip_address + line[line.index(";") :] for line in lines]
+
+
+def test_bulk_hashes_match_the_single_hash(monkeypatch):
+    values = ["", "a", "10.0.0.1", "12345678", "123456789", "ünïcode", "x" * 40]
+    expected = [hash_string(value) for value in values]
+
+    assert hash_strings(values) == expected
+
+    monkeypatch.setattr(sketch_service, "np", None)
+    assert hash_strings(values) == expected
+
+
+def test_distinct_count_is_within_the_error():
+    sketch = HyperLogLog(12)
+    values = [
+        f"10.{number // 65536}.{number // 256 % 256}.{number % 256}" for number in range(20000)
+    ]
+    sketch.add_hashes(hash_strings(values + values[:5000]))
+
+    assert abs(sketch.estimate() - 20000) <= 20000 * sketch.relative_error * 3
+    assert HyperLogLog.from_bytes(sketch.to_bytes()).estimate() == sketch.estimate()
+
+
+def test_merged_distinct_count_counts_shared_values_once():
+    first, second = HyperLogLog(12), HyperLogLog(12)
+    first.add_hashes(hash_strings([f"a{number}" for number in range(3000)]))
+    second.add_hashes(hash_strings([f"a{number}" for number in range(2000, 5000)]))
+
+    merged = first.merge(second)
+
+    assert abs(merged.estimate() - 5000) <= 5000 * merged.relative_error * 3
+
+
+def test_small_sketch_is_exact_and_compact():
+    sketch = HyperLogLog(12)
+    sketch.add_hashes(hash_strings(["10.0.0.1", "10.0.0.2", "10.0.0.1"]))
+
+    assert sketch.estimate() == 2
+    assert len(sketch.to_bytes()) < 32
+
+
+def test_space_saving_is_exact_under_its_capacity():
+    summary = SpaceSaving(4).update({"a": 5, "b": 2}).update({"a": 1, "c": 3})
+
+    assert summary.top(10) == [("a", 6, 0), ("c", 3, 0), ("b", 2, 0)]
+    assert summary.min_count() == 0
+    assert SpaceSaving.from_bytes(summary.to_bytes()).top(10) == summary.top(10)
+
+
+def test_space_saving_keeps_the_heavy_hitters_with_bounded_errors():
+    summary = SpaceSaving(8)
+    for batch in range(20):
+        counts = {f"rare-{batch}-{number}": 1 for number in range(20)}
+        counts["heavy"] = 10
+        summary = summary.merge(SpaceSaving(8).update(counts))
+
+    (value, count, error), *_ = summary.top(1)
+
+    assert value == "heavy"
+    assert count - error <= 200 <= count
+    assert summary.total == 20 * 30
+    assert len(summary.counters) == 8
+
+
+@pytest.mark.parametrize(
+    "value, limit",
+    [(None, 10), ("", 10), ("1", 1), (str(SKETCH_TOP_CAPACITY), SKETCH_TOP_CAPACITY)],
+)
+def test_top_limit_bounds(value, limit):
+    assert parse_top_limit(value) == limit
+
+
+@pytest.mark.parametrize("value", ["abc", "1.5", "0", str(SKETCH_TOP_CAPACITY + 1)])
+def test_invalid_top_limit_is_a_bad_request(client, value):
+    response = client.get(f"/logs/sketches/top/ip?limit={value}")
+
+    assert response.status_code == 400
+    assert "limit" in response.json["message"]
+
+
+def test_ingested_records_are_sketched(client, write_log, log_lines, ingest):
+    lines = log_lines(40) + with_ip(log_lines(30, first=100), "192.168.0.7")
+    write_log("access.log", "\n".join(lines).encode() + b"\n")
+    ingest()
+
+    distinct = client.get("/logs/sketches/distinct-ips?software_name=Tres-Zap").json["data"]
+    top = client.get("/logs/sketches/top/ip?limit=3&date_from=2022-03-05").json
+
+    assert (distinct["distinct_ips"], distinct["rows"], distinct["sketches"]) == (41, 70, 1)
+    assert top["data"][0] == {"ip": "192.168.0.7", "count": 30, "min_count": 30}
+    assert top["rows"] == 70
+    assert client.get("/logs/sketches/top/ip?date_from=2022-03-06").json["rows"] == 0
+
+
+def test_deleted_records_are_removed_from_the_sketches(client, write_log, log_lines, ingest):
+    write_log("access.log", "\n".join(log_lines(3)).encode() + b"\n")
+    ingest()
+
+    delete_log_record_by_id(str(Log.query.order_by(Log.id).first().id))
+    distinct = client.get("/logs/sketches/distinct-ips").json["data"]
+
+    assert (distinct["distinct_ips"], distinct["rows"]) == (2, 2)
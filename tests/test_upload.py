@@ -0,0 +1,90 @@
+"""
+Upload Tests
+------------------------
+Responsible to test the streamed upload of log files, plain or compressed.
+
+Author: Álef Ádonis dos Santos Carlos
+Date: 10/01/2024
+"""
+
+import bz2
+import gzip
+import io
+import lzma
+import pytest
+from app.extensions import db
+from app.models.log_record_model import Log
+from app.service import log_service
+from app.service.log_service import save_uploaded_log_file
+from sqlalchemy import func
+
+
+def count_logs() -> int:
+    return db.session.query(func.count(Log.id)).scalar()
+
+
+@pytest.fixture
+def small_blocks(monkeypatch):
+    """
+    Reads the uploads in small blocks and parses them in small chunks, so a short file spans many.
+    """
+    monkeypatch.setattr(log_service, "UPLOAD_READ_SIZE", 100)
+    monkeypatch.setattr(log_service, "UPLOAD_CHUNK_SIZE", 500)
+    monkeypatch.setattr(log_service, "UPLOAD_BATCHES_PER_COMMIT", 2)
+
+
+@pytest.mark.parametrize(
+    "compress",
+    [bytes, gzip.compress, bz2.compress, lzma.compress],
+    ids=["plain", "gz", "bz2", "xz"],
+)
+def test_upload_saves_every_line(small_blocks, log_lines, compress):
+    data = ("\n".join(log_lines(50)) + "\n").encode()
+
+    result = save_uploaded_log_file(io.BytesIO(compress(data)), "upload.log")
+
+    assert (result["file"], result["bytes"], result["inserted"]) == ("upload.log", len(data), 50)
+    assert sorted(int(log.log_id.split("-")[0]) for log in Log.query) == list(range(50))
+    assert {log.origin_file for log in Log.query} == {"upload.log"}
+
+
+def test_last_line_without_line_break_is_saved(small_blocks, log_lines):
+    data = "\n".join(log_lines(10)).encode()
+
+    assert save_uploaded_log_file(io.BytesIO(data), "upload.log")["inserted"] == 10
+
+
+def test_upload_sent_again_is_skipped(small_blocks, log_lines):
+    data = ("\n".join(log_lines(20)) + "\n").encode()
+    save_uploaded_log_file(io.BytesIO(data), "upload.log")
+
+    result = save_uploaded_log_file(io.BytesIO(data), "upload.log")
+
+    assert (result["inserted"], result["skipped"]) == (0, 20)
+    assert count_logs() == 20
+
+
+def test_truncated_compression_is_rejected(small_blocks, log_lines):
+    data = gzip.compress(("\n".join(log_lines(50)) + "\n").encode())
+
+    with pytest.raises(ValueError):
+        save_uploaded_log_file(io.BytesIO(data[: len(data) // 2]), "upload.log.gz")
+
+
+@pytest.mark.parametrize(
+    "file_name", [None, "", "  ", "logs/upload.log", "..\\upload.log", "x" * 81]
+)
+def test_invalid_file_names_are_rejected(file_name):
+    with pytest.raises(ValueError):
+        save_uploaded_log_file(io.BytesIO(b""), file_name)
+
+
+def test_http_upload(client, log_lines):
+    data = gzip.compress(("\n".join(log_lines(5)) + "\n").encode())
+
+    response = client.post("/logs/upload?name=upload.log.gz", data=data)
+
+    assert response.status_code == 200
+    assert response.json["inserted"] == 5
+    assert client.post("/logs/upload", data=data).status_code == 400
+    assert client.post("/logs/upload?name=broken.gz", data=data[:-8]).status_code == 400
@@ -0,0 +1,127 @@
+"""
+Watch Service Tests
+------------------------
+Responsible to test the polling of the log folder and the grouping of its changes in extractions.
+
+Author: Álef Ádonis dos Santos Carlos
+Date: 10/01/2024
+"""
+
+import pytest
+import threading
+from app.extensions import db
+from app.models.log_record_model import Log
+from app.service import watch_service
+from app.service.log_service import DIR_PATH
+from app.service.watch_service import LogWatcher
+from sqlalchemy import func
+
+
+def count_logs() -> int:
+    return db.session.query(func.count(Log.id)).scalar()
+
+
+def encode(lines: list) -> bytes:
+    return ("\n".join(lines) + "\n").encode()
+
+
+def test_watches_the_folder_the_extraction_reads():
+    assert LogWatcher().path == DIR_PATH
+
+
+def test_poll_records_new_and_appended_files(write_log, log_lines):
+    watcher = LogWatcher(commit_bytes=10**9, commit_seconds=3600)
+    first = encode(log_lines(3))
+    write_log("access.log", first)
+
+    assert watcher.poll() == 1
+    assert watcher.pending == {"access.log"}
+    assert watcher.pending_bytes == len(first)
+    assert watcher.poll() == 0
+
+    appended = encode(log_lines(2, first=3))
+    write_log("access.log", appended, mode="ab")
+
+    assert watcher.poll() == 1
+    assert watcher.pending_bytes == len(first) + len(appended)
+
+
+def test_is_due_on_size_or_age(write_log, log_lines):
+    write_log("access.log", encode(log_lines(3)))
+
+    by_size = LogWatcher(commit_bytes=1, commit_seconds=3600)
+    by_size.poll()
+    assert by_size.is_due()
+
+    waiting = LogWatcher(commit_bytes=10**9, commit_seconds=3600)
+    assert not waiting.is_due()
+    waiting.poll()
+    assert not waiting.is_due()
+
+    by_age = LogWatcher(commit_bytes=10**9, commit_seconds=0)
+    by_age.poll()
+    assert by_age.is_due()
+
+
+def test_flush_saves_only_the_new_lines(write_log, log_lines):
+    watcher = LogWatcher(commit_bytes=1, commit_seconds=3600)
+    write_log("access.log", encode(log_lines(3)))
+    watcher.poll()
+
+    result = watcher.flush()
+
+    assert result["inserted"] == 3
+    assert not watcher.pending
+    assert watcher.pending_bytes == 0
+
+    write_log("access.log", encode(log_lines(2, first=3)), mode="ab")
+    watcher.poll()
+
+    assert watcher.flush()["inserted"] == 2
+    assert count_logs() == 5
+
+
+def test_flush_keeps_the_changes_of_a_failed_extraction(monkeypatch, write_log, log_lines):
+    watcher = LogWatcher(commit_bytes=1, commit_seconds=3600)
+    write_log("access.log", encode(log_lines(3)))
+    watcher.poll()
+
+    def fail(extraction):
+        raise RuntimeError("database unavailable")
+
+    monkeypatch.setattr(watch_service, "save_records_in_database", fail)
+    with pytest.raises(RuntimeError):
+        watcher.flush()
+
+    assert watcher.pending == {"access.log"}
+    monkeypatch.undo()
+
+    assert watcher.flush()["inserted"] == 3
+
+
+def test_run_reports_flushes_and_logs_errors(app, monkeypatch, write_log, log_lines):
+    watcher = LogWatcher(interval=0, commit_bytes=1, commit_seconds=3600)
+    write_log("access.log", encode(log_lines(3)))
+    stop = threading.Event()
+    flushes = []
+    errors = []
+
+    def report(file_names, result):
+        flushes.append((file_names, result["inserted"]))
+        stop.set()
+
+    monkeypatch.setattr(app.logger, "exception", lambda *args: errors.append(args))
+    watcher.run(stop=stop, on_flush=report)
+
+    assert flushes == [(["access.log"], 3)]
+    assert not errors
+
+    def fail():
+        stop.set()
+        raise OSError("folder unavailable")
+
+    stop.clear()
+    monkeypatch.setattr(watcher, "poll", fail)
+    watcher.run(stop=stop)
+
+    assert errors == [("Failed to ingest the changes of %s", DIR_PATH)]